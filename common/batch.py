@@ -0,0 +1,256 @@
+"""
+Batched bitboards: N independent positions held as NumPy uint64 arrays (black
+and white discs, plus the side to move of each one), with move generation,
+flipping and end of game detection done for all of them in vectorized passes.
+The main use is playing thousands of random games at once.
+
+Running it as a script compares the random playouts of a batch against a loop
+of randomplayer.make_move over common.board.Board:
+    python -m common.batch [-n boards] [-g loop games] [-s seed]
+
+This module needs NumPy, only common.tuning (which uses its fills) imports it.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from common import bitboard
+
+# directions of the fills: (shift, whether it shifts left, mask of the discs a line can run through)
+_INNER_COLS = np.uint64(bitboard.INNER_COLS)
+_ALL = np.uint64(bitboard.FULL)
+_DIRECTIONS = [(np.uint64(1), True, _INNER_COLS), (np.uint64(1), False, _INNER_COLS),
+               (np.uint64(8), True, _ALL), (np.uint64(8), False, _ALL),
+               (np.uint64(9), True, _INNER_COLS), (np.uint64(9), False, _INNER_COLS),
+               (np.uint64(7), True, _INNER_COLS), (np.uint64(7), False, _INNER_COLS)]
+
+_ZERO = np.uint64(0)
+_ONE = np.uint64(1)
+
+
+def _shifter(shift, left):
+    return (lambda bits: bits << shift) if left else (lambda bits: bits >> shift)
+
+
+def legal_moves_mask(own, opp):
+    """
+    common.bitboard.legal_mask over arrays of positions
+    :param own: numpy uint64 array
+    :param opp: numpy uint64 array
+    :return: numpy uint64 array
+    """
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+    for shift, left, mask in _DIRECTIONS:
+        opp_masked = opp & mask
+        step = _shifter(shift, left)
+        t = opp_masked & step(own)
+        for _ in range(5):
+            t |= opp_masked & step(t)
+        moves |= step(t)
+    return moves & empty
+
+
+def flips_masks(moves, own, opp):
+    """
+    common.bitboard.flips_mask over arrays of positions
+    :param moves: numpy uint64 array with a single bit set (or none, which flips nothing)
+    :param own: numpy uint64 array
+    :param opp: numpy uint64 array
+    :return: numpy uint64 array
+    """
+    flips = np.zeros_like(own)
+    for shift, left, mask in _DIRECTIONS:
+        opp_masked = opp & mask
+        step = _shifter(shift, left)
+        # the run of opponent discs next to the move, kept if an own disc closes it
+        t = opp_masked & step(moves)
+        for _ in range(5):
+            t |= opp_masked & step(t)
+        flips |= np.where(step(t) & own != _ZERO, t, _ZERO)
+    return flips
+
+
+def neighbours(bits):
+    """
+    common.patterns._neighbours over an array of positions
+    :param bits: numpy uint64 array
+    :return: numpy uint64 array
+    """
+    one, seven, eight, nine = np.uint64(1), np.uint64(7), np.uint64(8), np.uint64(9)
+    east, west = bits & np.uint64(0x7F7F7F7F7F7F7F7F), bits & np.uint64(0xFEFEFEFEFEFEFEFE)
+    return ((bits << eight) | (bits >> eight) | (east << one) | (east << nine) | (east >> seven)
+            | (west >> one) | (west >> nine) | (west << seven))
+
+
+_POPCOUNT_BYTES = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int64)
+
+
+def popcount(bits):
+    """
+    Number of discs of each bitboard
+    :param bits: numpy uint64 array
+    :return: numpy int64 array
+    """
+    return _POPCOUNT_BYTES[np.ascontiguousarray(bits).view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def random_bits(masks, rng):
+    """
+    Picks one of the set bits of each mask, uniformly
+    :param masks: numpy uint64 array
+    :param rng: numpy.random.Generator
+    :return: numpy uint64 array with a single bit set (0 where the mask is empty)
+    """
+    counts = popcount(masks)
+    # the k-th set bit: the lowest bit after clearing the lowest k times
+    picks = (rng.random(len(masks)) * counts).astype(np.int64)
+    for i in range(int(picks.max(initial=0))):
+        masks = np.where(picks > i, masks & (masks - _ONE), masks)
+    return masks & (~masks + _ONE)
+
+
+class BatchBoard(object):
+    """
+    N positions, each with its side to move. Boards whose game is over are kept
+    as they are by play(), so a batch can run until every game ends
+    """
+
+    def __init__(self, black, white, black_to_move=None):
+        """
+        :param black: numpy uint64 array with the black discs of each board
+        :param white: numpy uint64 array with the white discs of each board
+        :param black_to_move: numpy bool array (None: black moves on every board)
+        """
+        self.black = np.asarray(black, dtype=np.uint64)
+        self.white = np.asarray(white, dtype=np.uint64)
+        self.black_to_move = np.ones(len(self.black), dtype=bool) if black_to_move is None \
+            else np.asarray(black_to_move, dtype=bool)
+        self.finished = np.zeros(len(self.black), dtype=bool)
+
+    def __len__(self):
+        return len(self.black)
+
+    def own_and_opponent(self):
+        """
+        Returns the discs of the side to move and of its opponent on each board
+        :return: (numpy uint64 array, numpy uint64 array)
+        """
+        return (np.where(self.black_to_move, self.black, self.white),
+                np.where(self.black_to_move, self.white, self.black))
+
+    def legal_masks(self):
+        """
+        Returns the legal moves of the side to move on each board
+        :return: numpy uint64 array (0 where it has to pass or the game is over)
+        """
+        own, opp = self.own_and_opponent()
+        return np.where(self.finished, _ZERO, legal_moves_mask(own, opp))
+
+    def play(self, moves):
+        """
+        Plays a move on each board: a single bit of its legal moves, or 0 to pass
+        (only legal without moves). A pass when the opponent can't move either
+        finishes the game of the board
+        :param moves: numpy uint64 array
+        :return:
+        """
+        own, opp = self.own_and_opponent()
+        flips = flips_masks(moves, own, opp)
+        new_own, new_opp = own | flips | moves, opp & ~flips
+
+        passing = (moves == _ZERO) & ~self.finished
+        if passing.any():
+            # the game is over when the opponent can't move either
+            stuck = passing & (legal_moves_mask(opp, own) == _ZERO)
+            self.finished |= stuck
+
+        self.black = np.where(self.black_to_move, new_own, new_opp)
+        self.white = np.where(self.black_to_move, new_opp, new_own)
+        self.black_to_move = np.where(self.finished, self.black_to_move, ~self.black_to_move)
+
+    def disc_difference(self):
+        """
+        Returns black minus white discs of each board
+        :return: numpy int64 array
+        """
+        return popcount(self.black) - popcount(self.white)
+
+    def random_playout(self, rng):
+        """
+        Plays random moves on every board until all the games are over
+        :param rng: numpy.random.Generator
+        :return: numpy int64 array, the final black minus white discs of each board
+        """
+        while not self.finished.all():
+            self.play(random_bits(self.legal_masks(), rng))
+        return self.disc_difference()
+
+
+def initial(n):
+    """
+    Returns a batch of n boards in the initial position, black to move
+    :param n:
+    :return: BatchBoard
+    """
+    start = bitboard.BitBoard()
+    return BatchBoard(np.full(n, start.black, dtype=np.uint64), np.full(n, start.white, dtype=np.uint64))
+
+
+def from_boards(boards, colors):
+    """
+    Returns a batch with the given positions
+    :param boards: list of common.bitboard.BitBoard
+    :param colors: list with the color to move on each board
+    :return: BatchBoard
+    """
+    return BatchBoard(np.array([b.black for b in boards], dtype=np.uint64),
+                      np.array([b.white for b in boards], dtype=np.uint64),
+                      np.array([color == bitboard.BitBoard.BLACK for color in colors], dtype=bool))
+
+
+def loop_playouts(games, seed):
+    """
+    Plays random games one move at a time with randomplayer.make_move, the reference of the benchmark
+    :param games: number of games
+    :param seed:
+    :return: list of black minus white discs of each game
+    """
+    from common import board
+    from randomplayer.randomplayer import make_move
+
+    random.seed(seed)
+    results = []
+    for _ in range(games):
+        a_board = board.Board()
+        color, names = a_board.BLACK, {a_board.BLACK: 'black', a_board.WHITE: 'white'}
+        while not a_board.is_endgame():
+            move = make_move(a_board, names[color])
+            if move != (-1, -1):
+                a_board.process_move(move, color)
+            color = a_board.opponent(color)
+        results.append(a_board.piece_count[a_board.BLACK] - a_board.piece_count[a_board.WHITE])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares batched random playouts against a loop of single boards.')
+    parser.add_argument('-n', '--boards', type=int, default=10000, help='Boards of the batch.')
+    parser.add_argument('-g', '--games', type=int, default=100, help='Games of the loop.')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='Seed of the random moves.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = loop_playouts(args.games, args.seed)
+    loop_rate = args.games / (time.perf_counter() - start)
+    print('loop:  %d games, %.1f games/s, black wins %.1f%%' % (
+        args.games, loop_rate, 100.0 * sum(r > 0 for r in results) / args.games))
+
+    start = time.perf_counter()
+    diffs = initial(args.boards).random_playout(np.random.default_rng(args.seed))
+    batch_rate = args.boards / (time.perf_counter() - start)
+    print('batch: %d games, %.1f games/s, black wins %.1f%%' % (
+        args.boards, batch_rate, 100.0 * np.mean(diffs > 0)))
+    print('speedup: %.0fx' % (batch_rate / loop_rate))
@@ -0,0 +1,252 @@
+"""
+Search benchmark: runs the search of each player over a fixed set of positions
+at fixed depths and records, for every search, the nodes expanded, the prunings,
+the time, the nodes per second, the effective branching factor and the chosen move.
+
+The results are written as JSON and compared with a baseline (a previous output):
+the command fails when the throughput (nodes/s) of a player drops by more than
+the threshold. Node counts and moves that changed are reported, as they mean the
+search itself changed and its throughput is no longer comparable:
+    python -m common.benchmark [-p player ...] [-o results.json] [-b baseline.json] [-t threshold] [-s]
+
+The positions are versioned: changing them must increase POSITIONS_VERSION, and
+results of different versions are never compared.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+
+from common import bitboard
+from common.time_manager import TimeManager
+
+POSITIONS_VERSION = 1
+
+# name -> (board, color to move)
+POSITIONS = {
+    'opening': ('\n'.join([
+        '........',
+        '........',
+        '..W.W...',
+        '..WWBB..',
+        '..WWWB..',
+        '....BB..',
+        '........',
+        '........',
+    ]), 'black'),
+    'midgame': ('\n'.join([
+        '....W...',
+        '..BBBB..',
+        'WWBBBBWW',
+        '..BBWBW.',
+        '..BBBW..',
+        '.B.BWWB.',
+        '...BWWBB',
+        '...B.W..',
+    ]), 'black'),
+    # 16 empties: one more than the endgame solvers take, so the depth limited search runs
+    'endgame': ('\n'.join([
+        '....WBW.',
+        '.WBBBB.B',
+        'WWWBWBBB',
+        '.WWWWBBB',
+        '..WBBBBB',
+        '.W.BWBBW',
+        'W..WBBWW',
+        '..WWWWWW',
+    ]), 'black'),
+}
+
+# the searches have no time limit, only the depth stops them
+NO_TIME_LIMIT = 10 ** 15
+
+
+def search_min_max(a_board, color, depth):
+    from player_min_max.min_max import MinMax
+    player = MinMax(a_board, color)
+    return player.next_move_min_max(depth), player.node_expands_counter, 0
+
+
+def search_alpha_beta(a_board, color, depth):
+    from player_alpha_beta.alpha_beta import AlphaBeta
+    player = AlphaBeta(a_board, color)
+    return player.next_move_alfa_beta(depth), player.node_expands_counter, player.pruning_counter
+
+
+def search_alpha_beta_v2(a_board, color, depth):
+    from player_alpha_beta_v2.alpha_beta import AlphaBeta
+    player = AlphaBeta(a_board, color, TimeManager(NO_TIME_LIMIT))
+    return player.next_move_alfa_beta(depth), player.node_expands_counter, player.pruning_counter
+
+
+def search_alpha_beta_v3(mode):
+    def search(a_board, color, depth):
+        from player_alpha_beta_v3.alpha_beta import AlphaBeta
+        player = AlphaBeta(a_board, color, mode, TimeManager(NO_TIME_LIMIT))
+        if mode == AlphaBeta.PVS:
+            move = player.next_move_pvs(depth)
+        else:
+            move = player.next_move_alfa_beta(depth)
+        return move, player.node_expands_counter, player.pruning_counter
+    return search
+
+
+# player -> (search function (board, color name, depth) -> (move, nodes, prunings), depths)
+# (the parallel mode of v3 is left out: its processes make the node counts and times depend on the machine)
+PLAYERS = {
+    'player_min_max': (search_min_max, [2, 3, 4]),
+    'player_alpha_beta': (search_alpha_beta, [4, 5, 6]),
+    'player_alpha_beta_v2': (search_alpha_beta_v2, [4, 5, 6]),
+    'player_alpha_beta_v3': (search_alpha_beta_v3('alfa_beta'), [4, 5, 6]),
+    'player_alpha_beta_v3:pvs': (search_alpha_beta_v3('pvs'), [4, 5, 6, 7]),
+}
+
+# default files, next to the module
+RESULTS_FILE = 'benchmark.json'
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# largest drop of throughput accepted, as a fraction of the baseline
+DEFAULT_THRESHOLD = 0.1
+
+
+def effective_branching_factor(nodes, depth):
+    """
+    Returns the branching factor of a uniform tree with the same nodes and depth
+    :param nodes: nodes expanded
+    :param depth: depth of the search
+    :return: float
+    """
+    if nodes <= 0 or depth <= 0:
+        return 0.0
+    return nodes ** (1.0 / depth)
+
+
+def measure(search, string, color, depth, repeat):
+    """
+    Runs a search on a fresh board, keeping the fastest of the repetitions
+    (the node count and the move don't change between them)
+    :param search: search function of PLAYERS
+    :param string: board
+    :param color: 'black' or 'white'
+    :param depth: depth of the search
+    :param repeat: number of runs
+    :return: dict with the result of the search
+    """
+    best_time = None
+    for _ in range(repeat):
+        a_board = bitboard.from_string(string)
+        # the players print the result of each move
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            move, nodes, prunings = search(a_board, color, depth)
+            duration = time.perf_counter() - start
+        best_time = duration if best_time is None else min(best_time, duration)
+
+    return {'nodes': nodes, 'prunings': prunings, 'time': best_time,
+            'nps': nodes / best_time if best_time > 0 else 0.0,
+            'ebf': effective_branching_factor(nodes, depth), 'move': list(move)}
+
+
+def run(players, repeat=1):
+    """
+    Runs the benchmark
+    :param players: names of PLAYERS
+    :param repeat: runs of each search
+    :return: dict ready to be written as JSON
+    """
+    results = []
+    for player in players:
+        search, depths = PLAYERS[player]
+        for position, (string, color) in POSITIONS.items():
+            for depth in depths:
+                result = {'player': player, 'position': position, 'depth': depth}
+                result.update(measure(search, string, color, depth, repeat))
+                results.append(result)
+                print('%-26s %-8s depth %d: %9d nodes %7d prunings %8.3fs %9.0f nodes/s ebf %5.2f move %d,%d' % (
+                    player, position, depth, result['nodes'], result['prunings'], result['time'], result['nps'],
+                    result['ebf'], result['move'][0], result['move'][1]))
+
+    return {'positions_version': POSITIONS_VERSION, 'python': platform.python_version(),
+            'machine': platform.machine(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}
+
+
+def throughput(results):
+    """
+    Returns the nodes per second of each player over all its searches
+    (the long searches weigh more than the short ones, which are noisy)
+    :param results: list of dict of run()
+    :return: dict player -> nodes/s
+    """
+    nodes, times = {}, {}
+    for result in results:
+        nodes[result['player']] = nodes.get(result['player'], 0) + result['nodes']
+        times[result['player']] = times.get(result['player'], 0.0) + result['time']
+    return {player: nodes[player] / times[player] for player in nodes if times[player] > 0}
+
+
+def compare(current, baseline, threshold):
+    """
+    Compares the results with the baseline, on the searches present in both
+    :param current: dict of run()
+    :param baseline: dict of run() of a previous execution
+    :param threshold: largest drop of throughput accepted (fraction of the baseline)
+    :return: bool whether no player is slower than the threshold allows
+    """
+    if baseline.get('positions_version') != current['positions_version']:
+        print('The baseline has positions version %s, not %d: not compared' % (
+            baseline.get('positions_version'), current['positions_version']))
+        return True
+
+    key = lambda r: (r['player'], r['position'], r['depth'])
+    previous = {key(result): result for result in baseline['results']}
+    common = [result for result in current['results'] if key(result) in previous]
+
+    for result in common:
+        old = previous[key(result)]
+        if result['nodes'] != old['nodes'] or result['move'] != old['move']:
+            print('%-26s %-8s depth %d: search changed, nodes %d -> %d, move %s -> %s' % (
+                result['player'], result['position'], result['depth'], old['nodes'], result['nodes'],
+                ','.join(map(str, old['move'])), ','.join(map(str, result['move']))))
+
+    ok = True
+    old_throughput = throughput([previous[key(result)] for result in common])
+    for player, nps in sorted(throughput(common).items()):
+        change = nps / old_throughput[player] - 1 if old_throughput.get(player) else 0.0
+        slower = change < -threshold
+        ok = ok and not slower
+        print('%-26s %9.0f nodes/s (baseline %9.0f, %+.1f%%)%s' % (
+            player, nps, old_throughput.get(player, 0), change * 100, ' SLOWER' if slower else ''))
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the searches of the players on fixed positions.')
+    parser.add_argument('-p', '--players', type=str, nargs='+', choices=sorted(PLAYERS), default=list(PLAYERS),
+                        metavar='player', help='Players benchmarked: %s (default: all)' % ', '.join(PLAYERS))
+    parser.add_argument('-n', '--repeat', type=int, default=3,
+                        help='Runs of each search, the fastest one is kept.')
+    parser.add_argument('-o', '--output', type=str, default=RESULTS_FILE, help='File to save the results.')
+    parser.add_argument('-b', '--baseline', type=str, default=BASELINE_FILE, help='Results to compare with.')
+    parser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Largest drop of throughput accepted, as a fraction (default=%.2f).' % DEFAULT_THRESHOLD)
+    parser.add_argument('-s', '--save-baseline', action='store_true',
+                        help='Saves the results as the new baseline instead of comparing with it.')
+    args = parser.parse_args()
+
+    output = run(args.players, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(output, f, indent=2)
+        print('Baseline saved to %s' % args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(0 if compare(output, baseline, args.threshold) else 1)
+    else:
+        print('No baseline at %s, save one with --save-baseline' % args.baseline)
@@ -0,0 +1,484 @@
+from common import profiler
+from common import zobrist
+
+
+def from_file(path_to_file):
+    """
+    Generates a bitboard from the string representation
+    contained in the file
+    :param path_to_file:
+    :return: BitBoard object
+    """
+    return from_string(open(path_to_file).read())
+
+
+def from_string(string):
+    """
+    Generates a bitboard from the string representation
+    :param string:
+    :return: BitBoard object
+    """
+    b = BitBoard()
+
+    # squares are read in board order (row by row) and reversed so that
+    # the first character becomes the least significant bit (index 0)
+    squares = ''.join(string.split())[:64].ljust(64, BitBoard.EMPTY)[::-1]
+    b.black = int(squares.translate(_BLACK_BITS), 2)
+    b.white = int(squares.translate(_WHITE_BITS), 2)
+
+    # resets piece_count according to the parsed discs
+    black_count, white_count = _popcount(b.black), _popcount(b.white)
+    b.piece_count = {b.BLACK: black_count, b.WHITE: white_count, b.EMPTY: 64 - black_count - white_count}
+
+    b.hash = b.compute_hash()
+    return b
+
+
+def _popcount(bits):
+    """
+    Returns the number of set bits in the given integer
+    :param bits: int
+    :return: int
+    """
+    return bin(bits).count('1')
+
+
+if hasattr(int, 'bit_count'):
+    _popcount = int.bit_count  # python 3.10+, several times faster
+
+
+# square index is row * 8 + col, so bit 0 is the top-left tile (x=0, y=0)
+# and bit 63 the bottom-right tile (x=7, y=7)
+FULL = 0xFFFFFFFFFFFFFFFF
+INNER_COLS = 0x7E7E7E7E7E7E7E7E  # clears both side columns, so horizontal fills don't wrap rows
+
+# translation tables used to (de)serialize the string representation in one pass
+_BLACK_BITS = str.maketrans({'B': '1', 'W': '0', '.': '0'})
+_WHITE_BITS = str.maketrans({'B': '0', 'W': '1', '.': '0'})
+_DIGIT_TILES = str.maketrans({'0': '.', '1': 'W', '2': 'B'})
+
+
+def _build_rays():
+    """
+    Precomputes, for every square, the masks of the rays leaving it in the eight directions.
+    Rays are split in ascending (towards higher bit indexes) and descending ones,
+    as the first blocker of each kind is found with a different bit trick
+    :return: (list, list) ascending and descending rays per square
+    """
+    ascending = [[] for _ in range(64)]
+    descending = [[] for _ in range(64)]
+    directions = [(0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (1, -1), (-1, 1), (1, 1)]
+
+    for sq in range(64):
+        x, y = sq % 8, sq // 8
+        for dx, dy in directions:
+            ray = 0
+            tx, ty = x + dx, y + dy
+            while 0 <= tx <= 7 and 0 <= ty <= 7:
+                ray |= 1 << (ty * 8 + tx)
+                tx += dx
+                ty += dy
+
+            # a ray needs at least two squares to bracket an opponent disc
+            if _popcount(ray) < 2:
+                continue
+
+            if dy * 8 + dx > 0:
+                ascending[sq].append(ray)
+            else:
+                descending[sq].append(ray)
+    return ascending, descending
+
+
+_RAYS_ASCENDING, _RAYS_DESCENDING = _build_rays()
+
+
+def legal_mask(own, opp):
+    """
+    Returns the bitmask of empty squares where the owner of 'own' can play,
+    computed with shift-and-mask flood fills in the eight directions
+    :param own: int bitboard of the player to move
+    :param opp: int bitboard of the opponent
+    :return: int
+    """
+    empty = ~(own | opp) & FULL
+    opp_h = opp & INNER_COLS
+    moves = 0
+
+    # each fill takes the opponent discs next to own discs, then the next one, and then
+    # two at a time through pairs of opponent discs (p), which covers runs of up to six
+    # x + 1
+    t = opp_h & (own << 1)
+    t |= opp_h & (t << 1)
+    p = opp_h & (opp_h << 1)
+    t |= p & (t << 2)
+    t |= p & (t << 2)
+    moves |= t << 1
+    # x - 1
+    t = opp_h & (own >> 1)
+    t |= opp_h & (t >> 1)
+    p = opp_h & (opp_h >> 1)
+    t |= p & (t >> 2)
+    t |= p & (t >> 2)
+    moves |= t >> 1
+    # y + 1
+    t = opp & (own << 8)
+    t |= opp & (t << 8)
+    p = opp & (opp << 8)
+    t |= p & (t << 16)
+    t |= p & (t << 16)
+    moves |= t << 8
+    # y - 1
+    t = opp & (own >> 8)
+    t |= opp & (t >> 8)
+    p = opp & (opp >> 8)
+    t |= p & (t >> 16)
+    t |= p & (t >> 16)
+    moves |= t >> 8
+    # x + 1, y + 1
+    t = opp_h & (own << 9)
+    t |= opp_h & (t << 9)
+    p = opp_h & (opp_h << 9)
+    t |= p & (t << 18)
+    t |= p & (t << 18)
+    moves |= t << 9
+    # x - 1, y - 1
+    t = opp_h & (own >> 9)
+    t |= opp_h & (t >> 9)
+    p = opp_h & (opp_h >> 9)
+    t |= p & (t >> 18)
+    t |= p & (t >> 18)
+    moves |= t >> 9
+    # x - 1, y + 1
+    t = opp_h & (own << 7)
+    t |= opp_h & (t << 7)
+    p = opp_h & (opp_h << 7)
+    t |= p & (t << 14)
+    t |= p & (t << 14)
+    moves |= t << 7
+    # x + 1, y - 1
+    t = opp_h & (own >> 7)
+    t |= opp_h & (t >> 7)
+    p = opp_h & (opp_h >> 7)
+    t |= p & (t >> 14)
+    t |= p & (t >> 14)
+    moves |= t >> 7
+
+    return moves & empty
+
+
+def flips_mask(sq, own, opp):
+    """
+    Returns the bitmask of opponent discs flipped by a disc placed at square sq.
+    Each ray is resolved at once by locating its first non-opponent square
+    :param sq: int square index (y * 8 + x)
+    :param own: int bitboard of the player to move
+    :param opp: int bitboard of the opponent
+    :return: int
+    """
+    flips = 0
+    not_opp = ~opp
+
+    for ray in _RAYS_ASCENDING[sq]:
+        blockers = ray & not_opp
+        first = blockers & -blockers  # lowest non-opponent square of the ray
+        if first & own:
+            flips |= ray & (first - 1)
+
+    for ray in _RAYS_DESCENDING[sq]:
+        blockers = ray & not_opp
+        if blockers:
+            first = 1 << (blockers.bit_length() - 1)  # highest non-opponent square of the ray
+            if first & own:
+                flips |= ray & -(first << 1)
+
+    return flips
+
+
+# moves of every possible row occupancy, indexed by [row][8-bit mask of the row]
+_ROW_MOVES = [[[(x, y) for x in range(8) if byte >> x & 1] for byte in range(256)] for y in range(8)]
+
+
+def mask_to_moves(mask):
+    """
+    Converts a bitmask of squares into a list of (x, y) moves
+    :param mask: int
+    :return: list of (int, int)
+    """
+    moves = []
+    y = 0
+    while mask:
+        byte = mask & 0xFF
+        if byte:
+            moves += _ROW_MOVES[y][byte]
+        mask >>= 8
+        y += 1
+    return moves
+
+
+class BitBoard(object):
+    """
+    Board implementation backed by two 64-bit integers, one per color.
+    It exposes the same interface as common.board.Board, so players
+    and server can swap one for the other.
+    """
+
+    BLACK = 'B'
+    WHITE = 'W'
+    EMPTY = '.'
+
+    def __init__(self):
+        """
+        Initializes the board with othello's initial position
+        :return:
+        """
+        self.black = (1 << 28) | (1 << 35)  # (4,3) and (3,4)
+        self.white = (1 << 27) | (1 << 36)  # (3,3) and (4,4)
+
+        # cache legal moves in attempt to reduce function calls
+        self._legal_moves = {self.BLACK: None, self.WHITE: None}
+
+        self.piece_count = {self.BLACK: 2, self.WHITE: 2, self.EMPTY: 60}
+
+        # zobrist key, updated incrementally by moves (see common.zobrist)
+        self.hash = self.compute_hash()
+
+        # pattern indexes of an attached evaluation, updated by moves (see common.patterns)
+        self.patterns = None
+
+    def compute_hash(self):
+        """
+        Computes the zobrist key of the discs on the board from scratch
+        (the side-to-move component is left clear)
+        :return: int
+        """
+        squares = [(sq, self.BLACK) for sq in range(64) if self.black >> sq & 1]
+        squares += [(sq, self.WHITE) for sq in range(64) if self.white >> sq & 1]
+        return zobrist.hash_squares(squares)
+
+    def pass_turn(self):
+        """
+        Registers that the side to move has passed,
+        toggling the side-to-move component of the hash
+        :return:
+        """
+        self.hash ^= zobrist.SIDE_KEY
+
+    def is_within_bounds(self, move):
+        """
+        Returns whether the move refers to a valid board position
+        :param move: (int, int)
+        :return: bool
+        """
+        return 0 <= move[0] < 8 and 0 <= move[1] < 8
+
+    def is_legal(self, move, color):
+        """
+        Returns whether the move is legal for the given color
+        :param move: (int,int) tile position to place the disk
+        :param color: color of the player making the move
+        :return: bool
+        """
+        # move is queried row,col as in common.board.Board
+        return self.is_within_bounds(move) and bool(self.legal_mask(color) >> (move[0] * 8 + move[1]) & 1)
+
+    def own_and_opponent(self, color):
+        """
+        Returns the bitboards of the given color and of its opponent
+        :param color:
+        :return: (int, int)
+        """
+        if color == self.BLACK:
+            return self.black, self.white
+        return self.white, self.black
+
+    def legal_mask(self, color):
+        """
+        Returns the bitmask of legal moves for the given color
+        :param color:
+        :return: int
+        """
+        own, opp = self.own_and_opponent(color)
+        return legal_mask(own, opp)
+
+    def process_move(self, position, color):
+        """
+        Executes the placement of a tile of a given color
+        in a given position
+        :param position: (int, int) x, y coordinates
+        :param color:
+        :return: bool
+        """
+        return self.make_move(position, color) is not None
+
+    @profiler.timed('child creation')
+    def make_move(self, position, color):
+        """
+        Executes the placement of a tile of a given color
+        in a given position and returns an undo record that
+        restores the previous state when passed to unmake_move
+        :param position: (int, int) x, y coordinates
+        :param color:
+        :return: (square, color, flipped mask, previous legal moves, previous hash, previous pattern indexes)
+                 or None if the move is illegal
+        """
+        if color == self.BLACK:
+            own, opp, opp_color = self.black, self.white, self.WHITE
+        elif color == self.WHITE:
+            own, opp, opp_color = self.white, self.black, self.BLACK
+        else:
+            raise ValueError("Move must be made by BLACK or WHITE player")
+
+        x, y = position
+        if not (0 <= x <= 7 and 0 <= y <= 7):
+            return None
+
+        sq = y * 8 + x
+        bit = 1 << sq
+        if (own | opp) & bit:
+            return None  # guards against moves on occupied tiles
+
+        flips = flips_mask(sq, own, opp)
+        if not flips:
+            return None  # guards against illegal moves
+
+        if opp_color == self.WHITE:
+            self.black, self.white = own | flips | bit, opp ^ flips
+        else:
+            self.white, self.black = own | flips | bit, opp ^ flips
+
+        # updates piece counts
+        flipped = _popcount(flips)
+        piece_count = self.piece_count
+        piece_count[color] += flipped + 1
+        piece_count[opp_color] -= flipped
+        piece_count[self.EMPTY] -= 1
+
+        # updates the zobrist key, one xor per flipped disc
+        previous_hash = self.hash
+        key = previous_hash ^ zobrist.PIECE_KEYS[color][sq] ^ zobrist.SIDE_KEY
+        flip_keys = zobrist.FLIP_KEYS
+        flips_left = flips
+        while flips_left:
+            lowest = flips_left & -flips_left
+            key ^= flip_keys[lowest.bit_length() - 1]
+            flips_left ^= lowest
+        self.hash = key
+
+        previous_indexes = None
+        if self.patterns is not None:
+            previous_indexes = self.patterns.play(sq, color, flips)
+
+        # the legal moves cache is replaced, the previous one goes to the undo record
+        legal_moves = self._legal_moves
+        self._legal_moves = {self.BLACK: None, self.WHITE: None}
+        return sq, color, flips, legal_moves, previous_hash, previous_indexes
+
+    @profiler.timed('child creation')
+    def unmake_move(self, undo):
+        """
+        Reverts a move executed by make_move, restoring discs,
+        piece counts and the legal moves cache
+        :param undo: record returned by make_move
+        :return:
+        """
+        sq, color, flips, legal_moves, previous_hash, previous_indexes = undo
+
+        flipped = _popcount(flips)
+        piece_count = self.piece_count
+        if color == self.BLACK:
+            self.black ^= flips | (1 << sq)
+            self.white |= flips
+            piece_count[self.BLACK] -= flipped + 1
+            piece_count[self.WHITE] += flipped
+        else:
+            self.white ^= flips | (1 << sq)
+            self.black |= flips
+            piece_count[self.WHITE] -= flipped + 1
+            piece_count[self.BLACK] += flipped
+        piece_count[self.EMPTY] += 1
+
+        self._legal_moves = legal_moves
+        self.hash = previous_hash
+        if previous_indexes is not None:
+            self.patterns.indexes = previous_indexes
+
+    @profiler.timed('move generation')
+    def legal_moves(self, color):
+        """
+        Returns a list of legal moves for the given color
+        :param color:
+        :return: list of (int, int)
+        """
+        if self._legal_moves[color] is None:
+            # construct the list of legal moves only once
+            self._legal_moves[color] = mask_to_moves(self.legal_mask(color))
+
+        return self._legal_moves[color]
+
+    def has_legal_move(self, color):
+        """
+        Returns whether the given color has any legal move
+        :param color:
+        :return:bool
+        """
+        return self.legal_mask(color) != 0
+
+    def is_endgame(self):
+        """
+        Returns whether the game is over: no color has a legal move
+        :return: bool
+        """
+        return legal_mask(self.black, self.white) == 0 and legal_mask(self.white, self.black) == 0
+
+    def opponent(self, color):
+        """
+        Returns the opponent of the received color
+        :param color:
+        :return:
+        """
+        if color == self.EMPTY:
+            raise ValueError('Empty has no opponent.')
+
+        if color == self.WHITE:
+            return self.BLACK
+        else:
+            return self.WHITE
+
+    def print_board(self):
+        """
+        Prints the string representation of the board
+        :return:
+        """
+
+        print(self.decorated_str())
+
+    def rows(self):
+        """
+        Returns the eight rows of the board as strings
+        :return: list of str
+        """
+        # each square becomes a decimal digit (2 black, 1 white, 0 empty);
+        # both binary strings are read as decimal, so the sum never carries
+        digits = int(format(self.black, 'b')) * 2 + int(format(self.white, 'b'))
+        squares = str(digits).zfill(64).translate(_DIGIT_TILES)[::-1]
+        return [squares[i:i + 8] for i in range(0, 64, 8)]
+
+    def decorated_str(self):
+        """
+        Returns the string representation of the board
+        decorated with coordinates for board positions
+        :return: str
+        """
+        string = 'x 01234567\n'
+        for i, row in enumerate(self.rows()):
+            string += '%d %s\n' % (i, row)
+
+        return string
+
+    def __str__(self):
+        """
+        Returns the string representation of the board
+        :return: str
+        """
+        return '\n'.join(self.rows()) + '\n'
@@ -1,3 +1,6 @@
+from common import zobrist
+
+
 def from_file(path_to_file):
     """
     Generates a board from the string representation
@@ -21,17 +24,43 @@ def from_string(string):
         line.strip()  # cuts the \n
 
         for colno, col in enumerate(line):
-            b.tiles[lineno][colno] = col
+            b.squares[lineno * 8 + colno] = col
             b.piece_count[col] += 1
 
+    b.hash = b.compute_hash()
+    b.compute_legal_moves()
     return b
 
 
-# TODO:create and test is_endgame
-# TODO:create list of legal moves on __init__ and update it on process_move
+def _build_rays(directions, min_length):
+    """
+    Lists, for each square, the squares met walking from it in each direction
+    (nearest first), so that moves never check the board bounds
+    :param directions: list of (dx, dy), x being the column and y the row as in Board.DIRECTIONS
+    :param min_length: shorter rays are left out
+    :return: list (by square index row * 8 + col) of tuples of rays, each a tuple of square indexes
+    """
+    rays = []
+    for sq in range(64):
+        square_rays = []
+        for dx, dy in directions:
+            ray = []
+            col, row = sq % 8 + dx, sq // 8 + dy
+            while 0 <= row <= 7 and 0 <= col <= 7:
+                ray.append(row * 8 + col)
+                col, row = col + dx, row + dy
+            if len(ray) >= min_length:
+                square_rays.append(tuple(ray))
+        rays.append(tuple(square_rays))
+    return rays
+
+
 class Board(object):
     """
     Board implementation strongly inspired by: http://dhconnelly.com/paip-python/docs/paip/othello.html
+    The tiles are a flat list of 64 squares (index row * 8 + col) walked through precomputed rays.
+    The legal moves of both colors are kept up to date by each move: only the empty squares
+    whose rays pass through the placed or flipped discs are checked again
     """
 
     BLACK = 'B'
@@ -51,21 +80,49 @@ class Board(object):
     # list with all directions
     DIRECTIONS = [UP, DOWN, LEFT, RIGHT, UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT]
 
+    # rays of each square, in the order of DIRECTIONS (the ones that are too short are left out):
+    # all of them, and the ones long enough for a move (an opponent disc and a disc of its own color after it)
+    ALL_RAYS = _build_rays(DIRECTIONS, 1)
+    RAYS = _build_rays(DIRECTIONS, 2)
+
     def __init__(self):
         """
         Initializes the 8x8 board with all tiles empty, except the center
         that are initialized according to othello's initial board
         :return:
         """
-        self.tiles = [[self.EMPTY] * 8 for i in range(8)]
+        self.squares = [self.EMPTY] * 64
+
+        self.squares[27], self.squares[28] = self.WHITE, self.BLACK
+        self.squares[35], self.squares[36] = self.BLACK, self.WHITE
+
+        self.piece_count = {self.BLACK: 2, self.WHITE: 2, self.EMPTY: 60}
 
-        self.tiles[3][3], self.tiles[3][4] = self.WHITE, self.BLACK
-        self.tiles[4][3], self.tiles[4][4] = self.BLACK, self.WHITE
+        # zobrist key, updated incrementally by moves (see common.zobrist)
+        self.hash = self.compute_hash()
 
-        # cache legal moves in attempt to reduce function calls
+        # empty squares next to a disc (the only ones that can be moves), the squares of the
+        # legal moves of each color, updated by moves, and the lists built from them on demand
+        self.frontier = set()
+        self._legal_squares = {self.BLACK: set(), self.WHITE: set()}
         self._legal_moves = {self.BLACK: None, self.WHITE: None}
+        self.compute_legal_moves()
 
-        self.piece_count = {self.BLACK: 2, self.WHITE: 2, self.EMPTY: 60}
+    def compute_hash(self):
+        """
+        Computes the zobrist key of the discs on the board from scratch
+        (the side-to-move component is left clear)
+        :return: int
+        """
+        return zobrist.hash_squares((sq, tile) for sq, tile in enumerate(self.squares) if tile != self.EMPTY)
+
+    def pass_turn(self):
+        """
+        Registers that the side to move has passed,
+        toggling the side-to-move component of the hash
+        :return:
+        """
+        self.hash ^= zobrist.SIDE_KEY
 
     def is_within_bounds(self, move):
         """
@@ -82,71 +139,28 @@ class Board(object):
         :param color: color of the player making the move
         :return: bool
         """
-        # move is queried row,col but stored col,row in legal_moves
-        return (move[1], move[0]) in self.legal_moves(color)
+        # move is queried row,col
+        return self.is_within_bounds(move) and move[0] * 8 + move[1] in self._legal_squares[color]
 
-    def find_bracket(self, move, color, direction):
+    def find_bracket(self, ray, color):
         """
-        Traverses the board in given direction trying to
-        find a tile of the given color that surrounds opponent tiles, returns
-        :param move: (int, int)
+        Walks the ray from the square of a move over opponent tiles, trying to
+        find a tile of the given color that surrounds them
+        :param ray: one of Board.RAYS of the square of the move
         :param color: color of player making the move
-        :param direction: one of eight directions of tile neighborhood
-        :return: (int,int)
+        :return: int number of surrounded opponent tiles (0 if there is no bracket)
         """
-        # performing inline boundary check to avoid calls for is_within_bounds
-        # this saves some time
-        dx, dy = direction
-        tx, ty = move
-        tx += dx
-        ty += dy
-
-        opp = self.BLACK if color == self.WHITE else self.WHITE  # inline opponent calc.
-
-        if not (0 <= tx <= 7 and 0 <= ty <= 7) or self.tiles[tx][ty] != opp:
-            return False
-
-        while self.tiles[tx][ty] == opp:  # putting is_within_bounds here yields more calls
-            tx += dx
-            ty += dy
-            if not (0 <= tx <= 7 and 0 <= ty <= 7):  # self.is_within_bounds((tx, ty)):
-                return False
-
-        if self.tiles[tx][ty] == self.EMPTY:
-            return False
-        return tx, ty
-
-    def find_where_to_play_from_owned(self, owned, color, direction):
-        """
-        Traverses the board in given direction trying to
-        find an empty tile that surrounds opponent tiles, returns it.
-        This is the dual of find_bracket, which goes from empty to
-        the piece of the desired color
-        :param owned: (int, int), col, row coordination of owned tile
-        :param color: color of owned tile
-        :param direction: one of eight directions of tile neighborhood
-        :return: (int,int) or False if not found
-        """
-        # performing inline boundary check to avoid calls for is_within_bounds
-        # this saves some time
-        dx, dy = direction
-        tx, ty = owned
-        tx += dx
-        ty += dy
+        squares = self.squares
         opp = self.BLACK if color == self.WHITE else self.WHITE  # inline opponent calc.
 
-        if not (0 <= tx <= 7 and 0 <= ty <= 7) or self.tiles[tx][ty] != opp:  # color:
-            return False
+        if squares[ray[0]] != opp:
+            return 0
 
-        while self.tiles[tx][ty] == opp:
-            tx += dx
-            ty += dy
-            if not (0 <= tx <= 7 and 0 <= ty <= 7):
-                return False
-
-        if self.tiles[tx][ty] != self.EMPTY:
-            return False
-        return tx, ty
+        for distance, sq in enumerate(ray):
+            tile = squares[sq]
+            if tile != opp:
+                return distance if tile == color else 0
+        return 0
 
     def process_move(self, position, color):
         """
@@ -156,108 +170,204 @@ class Board(object):
         :param color:
         :return: bool
         """
+        return self.make_move(position, color) is not None
 
-        # as the board is represented row-column, swaps coords to col-row
-        position = position[1], position[0]
-
+    def make_move(self, position, color):
+        """
+        Executes the placement of a tile of a given color
+        in a given position and returns an undo record that
+        restores the previous state when passed to unmake_move
+        :param position: (int, int) x, y coordinates
+        :param color:
+        :return: (square, color, flipped squares, previous legal moves, previous hash) or None if the move is illegal,
+                 the previous legal moves are the frontier, the legal squares and the legal move lists
+        """
         if color not in [self.WHITE, self.BLACK]:
             raise ValueError("Move must be made by BLACK or WHITE player")
 
-        if self.is_legal(position, color):
-            # places the piece and update piece counts
-            px, py = position
-            self.tiles[px][py] = color
-            self.piece_count[color] += 1
-            self.piece_count[self.EMPTY] -= 1
+        # is_legal is queried row,col
+        if not self.is_legal((position[1], position[0]), color):
+            return None  # guards against illegal moves
 
-            for direc in self.DIRECTIONS:
-                self.flip_tiles(position, color, direc)
+        legal_moves = self.frontier, self._legal_squares, self._legal_moves
+        previous_hash = self.hash
 
-            # resets legal moves
-            self._legal_moves[self.BLACK], self._legal_moves[self.WHITE] = None, None
-            return True
+        # places the piece and update piece counts
+        square = position[1] * 8 + position[0]
+        self.squares[square] = color
+        self.piece_count[color] += 1
+        self.piece_count[self.EMPTY] -= 1
+        self.hash ^= zobrist.PIECE_KEYS[color][square] ^ zobrist.SIDE_KEY
 
-        return False  # guards against illegal moves
+        flipped = []
+        for ray in self.RAYS[square]:
+            self.flip_tiles(color, ray, flipped)
 
-    def flip_tiles(self, origin, color, direction):
+        self.update_legal_moves(square, flipped)
+        return square, color, flipped, legal_moves, previous_hash
+
+    def unmake_move(self, undo):
         """
-        Traverses the board in the given direction,
-        transforming the color of appropriate tiles
-        :param origin: where the traversal will begin
-        :param color:
-        :param direction:
+        Reverts a move executed by make_move, restoring tiles,
+        piece counts and the legal moves cache
+        :param undo: record returned by make_move
         :return:
         """
-        destination = self.find_bracket(origin, color, direction)  # move, player, board, direction)
-        if not destination:
-            return
+        square, color, flipped, legal_moves, previous_hash = undo
+        opp = self.opponent(color)
 
-        ox, oy = origin
-        dx, dy = direction
+        squares = self.squares
+        squares[square] = self.EMPTY
+        for sq in flipped:
+            squares[sq] = opp
 
-        nx, ny = ox + dx, oy + dy  # n stands for 'next'
+        self.piece_count[color] -= len(flipped) + 1
+        self.piece_count[opp] += len(flipped)
+        self.piece_count[self.EMPTY] += 1
 
-        opp = self.opponent(color)
+        self.frontier, self._legal_squares, self._legal_moves = legal_moves
+        self.hash = previous_hash
 
-        while (nx, ny) != destination:
-            # flips the tile and updates piece counts
-            self.tiles[nx][ny] = color
-            self.piece_count[color] += 1
-            self.piece_count[opp] -= 1
-            nx, ny = nx + dx, ny + dy
-
-    def legal_moves(self, color):
+    def flip_tiles(self, color, ray, flipped=None):
         """
-        Returns a list of legal moves for the given color
+        Walks the ray from the square of a move,
+        transforming the color of the surrounded tiles
         :param color:
+        :param ray: one of Board.RAYS of the square of the move
+        :param flipped: optional list that receives the indexes of flipped squares
         :return:
         """
-        if self._legal_moves[color] is None:
-            # construct the list of legal moves only once
-            self._legal_moves[color] = []
+        count = self.find_bracket(ray, color)
+        if not count:
+            return
 
-            if self.piece_count[color] > self.piece_count[self.EMPTY]:
-                self.find_legal_moves_dense(color)
-            else:
-                self.find_legal_moves_sparse(color)
+        squares = self.squares
+        flip_keys = zobrist.FLIP_KEYS
+        for sq in ray[:count]:
+            # flips the tile and updates the hash
+            squares[sq] = color
+            self.hash ^= flip_keys[sq]
+        self.piece_count[color] += count
+        self.piece_count[self.opponent(color)] -= count
+        if flipped is not None:
+            flipped.extend(ray[:count])
+
+    def is_legal_square(self, square, color):
+        """
+        Returns whether an empty square is a legal move for the given color
+        :param square: int index of an empty square
+        :param color:
+        :return: bool
+        """
+        squares = self.squares
+        opp = self.BLACK if color == self.WHITE else self.WHITE
+
+        for ray in self.RAYS[square]:
+            # performs find_bracket inline
+            if squares[ray[0]] != opp:
+                continue
+            for sq in ray:
+                tile = squares[sq]
+                if tile != opp:
+                    break
+            if tile == color:
+                return True
+        return False
 
-        return self._legal_moves[color]
+    def compute_legal_moves(self):
+        """
+        Computes the frontier and the legal moves of both colors from scratch
+        :return:
+        """
+        squares, empty = self.squares, self.EMPTY
+        self.frontier = {sq for sq in range(64) if squares[sq] == empty
+                         and any(squares[ray[0]] != empty for ray in self.ALL_RAYS[sq])}
+        self._legal_squares = {color: {sq for sq in self.frontier if self.is_legal_square(sq, color)}
+                               for color in (self.BLACK, self.WHITE)}
+        self._legal_moves = {self.BLACK: None, self.WHITE: None}
 
-    def find_legal_moves_dense(self, color):
+    def update_legal_moves(self, square, flipped):
         """
-        Finds the legal moves for a given color in a dense board.
-        A dense board has less empty tiles than pieces of the given color.
-        :param color:
+        Updates the frontier and the legal moves after a disc was placed on square
+        and the flipped discs changed color. Only the empty squares whose rays pass
+        through those discs (the first empty square of each ray from them) can change.
+        New sets are made, so the ones saved by make_move for unmake_move stay intact
+        :param square: int index of the placed disc
+        :param flipped: list of indexes of the flipped discs
+        :return:
         """
-        # test if every empty tile on the board is a legal move
-        tiles = [(x, y) for x in range(8) for y in range(8) if self.tiles[x][y] == self.EMPTY]
+        squares, empty, all_rays = self.squares, self.EMPTY, self.ALL_RAYS
+
+        frontier = set(self.frontier)
+        frontier.discard(square)
+        frontier.update(ray[0] for ray in all_rays[square] if squares[ray[0]] == empty)
 
-        for x, y in tiles:
-            if self.tiles[x][y] == self.EMPTY:  # and any(map(hasbracket, self.DIRECTIONS)):
-                # performs the 'inline' any:
-                for direc in self.DIRECTIONS:
-                    if self.find_bracket((x, y), color, direc):
-                        # flips x,y because of the way tiles are stored and the x,y coords in real world
-                        self._legal_moves[color].append((y, x))
+        changed = [square] + flipped
+        if len(frontier) <= 2 * len(changed):
+            # finding the affected squares walks about as many rays as checking
+            # the whole frontier (typical of the endgame, with few empty squares)
+            affected = frontier
+        else:
+            affected = set()
+            for disc in changed:
+                for ray in all_rays[disc]:
+                    for sq in ray:
+                        if squares[sq] == empty:
+                            affected.add(sq)
+                            break
+
+        black, white = self.BLACK, self.WHITE
+        legal_black, legal_white = set(self._legal_squares[black]), set(self._legal_squares[white])
+        legal_black.discard(square)
+        legal_white.discard(square)
+
+        rays = self.RAYS
+        for sq in affected:
+            # a single walk along each ray checks both colors: a line of discs of one
+            # color closed by a disc of the other color is a move for the other color
+            black_move = white_move = False
+            for ray in rays[sq]:
+                first = squares[ray[0]]
+                if first == empty:
+                    continue
+                for other in ray:
+                    tile = squares[other]
+                    if tile != first:
                         break
+                if tile == black and first == white:
+                    black_move = True
+                elif tile == white and first == black:
+                    white_move = True
+                else:
+                    continue
+                if black_move and white_move:
+                    break
+
+            if black_move:
+                legal_black.add(sq)
+            else:
+                legal_black.discard(sq)
+            if white_move:
+                legal_white.add(sq)
+            else:
+                legal_white.discard(sq)
+        legal_squares = {black: legal_black, white: legal_white}
+
+        self.frontier = frontier
+        self._legal_squares = legal_squares
+        self._legal_moves = {self.BLACK: None, self.WHITE: None}
 
-    def find_legal_moves_sparse(self, color):
+    def legal_moves(self, color):
         """
-        Finds the legal moves for a given color in a sparse board.
-        A sparse board has more empty tiles than pieces of the given color
+        Returns a list of legal moves for the given color
         :param color:
         :return:
         """
-        # test if every empty tile on the board is a legal move
-        tiles = [(x, y) for x in range(8) for y in range(8) if self.tiles[x][y] == color]
+        if self._legal_moves[color] is None:
+            # construct the list of legal moves only once, moves are (x, y), that is (col, row)
+            self._legal_moves[color] = [(sq & 7, sq >> 3) for sq in sorted(self._legal_squares[color])]
 
-        for x, y in tiles:
-            if self.tiles[x][y] == color:
-                for direc in self.DIRECTIONS:
-                    move = self.find_where_to_play_from_owned((x, y), color, direc)
-                    if move:
-                        # flips x,y because of the way tiles are stored and the x,y coords in real world
-                        self._legal_moves[color].append((move[1], move[0]))
+        return self._legal_moves[color]
 
     def has_legal_move(self, color):
         """
@@ -265,17 +375,14 @@ class Board(object):
         :param color:
         :return:bool
         """
-        # test if every empty tile on the board is a legal move
-        tiles = [(x, y) for x in range(8) for y in range(8) if self.tiles[x][y] == self.EMPTY]
-
-        for x, y in tiles:
-            # self._legal_moves[color] = [(y, x) for x, y in tiles if self.is_legal((x, y), color)]
-
-            hasbracket = lambda direction: self.find_bracket((x, y), color, direction)
+        return len(self._legal_squares[color]) > 0
 
-            if self.tiles[x][y] == self.EMPTY and any(map(hasbracket, self.DIRECTIONS)):
-                return True
-        return False
+    def is_endgame(self):
+        """
+        Returns whether the game is over: no color has a legal move
+        :return: bool
+        """
+        return not self._legal_squares[self.BLACK] and not self._legal_squares[self.WHITE]
 
     def opponent(self, color):
         """
@@ -299,6 +406,14 @@ class Board(object):
 
         print(self.decorated_str())
 
+    def rows(self):
+        """
+        Returns the eight rows of the board as strings
+        :return: list of str
+        """
+        squares = ''.join(self.squares)
+        return [squares[i:i + 8] for i in range(0, 64, 8)]
+
     def decorated_str(self):
         """
         Returns the string representation of the board
@@ -306,8 +421,8 @@ class Board(object):
         :return: str
         """
         string = 'x 01234567\n'
-        for i, row in enumerate(self.tiles):
-            string += '%d %s\n' % (i, ''.join(row))
+        for i, row in enumerate(self.rows()):
+            string += '%d %s\n' % (i, row)
 
         return string
 
@@ -317,7 +432,7 @@ class Board(object):
         :return: str
         """
         string = ''
-        for i, row in enumerate(self.tiles):
-            string += '%s\n' % ''.join(row)
+        for row in self.rows():
+            string += '%s\n' % row
 
         return string
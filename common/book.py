@@ -0,0 +1,400 @@
+"""
+Opening book built from the game records of the server: the history.txt
+(one "x,y,color" line per move) and results.xml files of each game, such as
+the ones kept by tournament.py -k.
+
+Every game is replayed and each of its first plies is counted for the position
+before the move, seen from the side to move (own and opponent discs) and reduced
+to a canonical form: the smallest of its 8 symmetric images (rotations and
+reflections), with the move mapped by the same symmetry. The book keeps, per
+position and move, the number of games, wins, draws and the sum of the final
+disc differences, for the side that made the move.
+
+The book is a file with an open addressing hash table of positions, each one
+pointing to its moves, read through mmap: a probe hashes the canonical position
+and reads a few slots of the file, no matter how big the book is.
+    python -m common.book build [-o book file] [-p plies] game dir or file [...]
+    python -m common.book show state.txt color [-b book file]
+
+The players read the book of the file named by the environment variable
+OTHELLO_BOOK or else opening_book.bin next to this module, and search as usual
+when there is none.
+"""
+import argparse
+import mmap
+import os
+import struct
+import xml.etree.ElementTree as ET
+
+from common import bitboard
+
+# plies of each game that enter the book
+MAX_PLIES = 20
+
+# book moves are only played after this many games (a single game, lucky or not,
+# doesn't decide the opening), and when they don't lose on average
+MIN_GAMES = 3
+MIN_SCORE = 0
+
+BOOK_ENV_VAR = 'OTHELLO_BOOK'
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+
+# book file: header, then the slots of the hash table, then the moves of the positions
+_MAGIC = b'OTHB'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIIII')  # magic, version, number of slots, number of moves, max plies
+_SLOT = struct.Struct('<QQIH')  # own, opponent, first move, number of moves (0 marks an empty slot)
+_MOVE = struct.Struct('<BIIIi')  # square, games, wins, draws, sum of the final disc differences
+
+_HASH_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F)
+
+
+def _mirror(bits):
+    # reverses the columns (x -> 7 - x): the bits inside each row byte
+    bits = ((bits >> 1) & 0x5555555555555555) | ((bits & 0x5555555555555555) << 1)
+    bits = ((bits >> 2) & 0x3333333333333333) | ((bits & 0x3333333333333333) << 2)
+    return ((bits >> 4) & 0x0F0F0F0F0F0F0F0F) | ((bits & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def _flip(bits):
+    # reverses the rows (y -> 7 - y): the row bytes
+    return int.from_bytes(bits.to_bytes(8, 'little'), 'big')
+
+
+def _transpose(bits):
+    # swaps rows and columns ((x, y) -> (y, x)) by exchanging the blocks across the diagonal
+    t = 0x0F0F0F0F00000000 & (bits ^ (bits << 28))
+    bits ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (bits ^ (bits << 14))
+    bits ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (bits ^ (bits << 7))
+    bits ^= t ^ (t >> 7)
+    return bits
+
+
+def transform(bits, symmetry):
+    """
+    Applies one of the 8 symmetries of the board to a bitboard
+    :param bits: int bitboard
+    :param symmetry: int from 0 to 7, its bits select a mirror, a flip and a transposition
+    :return: int bitboard
+    """
+    if symmetry & 1:
+        bits = _mirror(bits)
+    if symmetry & 2:
+        bits = _flip(bits)
+    if symmetry & 4:
+        bits = _transpose(bits)
+    return bits
+
+
+# square -> square under each symmetry, and back
+_SQUARE_MAPS = [[transform(1 << sq, symmetry).bit_length() - 1 for sq in range(64)] for symmetry in range(8)]
+_INVERSE_MAPS = [[square_map.index(sq) for sq in range(64)] for square_map in _SQUARE_MAPS]
+
+
+def canonical(own, opp):
+    """
+    Returns the canonical form of a position: the smallest of its symmetric images
+    :param own: bitboard of the side to move
+    :param opp: bitboard of the opponent
+    :return: (own, opp, symmetry) the image and the symmetry that produces it
+    """
+    return min((transform(own, symmetry), transform(opp, symmetry), symmetry) for symmetry in range(8))
+
+
+def _slot_of(own, opp, mask):
+    return (((own * _HASH_MULTIPLIERS[0]) ^ (opp * _HASH_MULTIPLIERS[1])) >> 32) & mask
+
+
+def replay(moves, max_plies=MAX_PLIES):
+    """
+    Replays the moves of a game record as the server did: illegal moves are ignored
+    :param moves: list of ((x, y), color)
+    :param max_plies: number of positions to return
+    :return: (positions, board) positions is a list of (own, opp, square, color)
+             before each of the first accepted moves, board is the final BitBoard
+    """
+    a_board = bitboard.BitBoard()
+    positions = []
+    for move, color in moves:
+        own, opp = a_board.own_and_opponent(color)
+        if not a_board.is_within_bounds(move) or a_board.make_move(move, color) is None:
+            continue
+        if len(positions) < max_plies:
+            positions.append((own, opp, move[1] * 8 + move[0], color))
+    return positions, a_board
+
+
+def read_history(path):
+    """
+    Reads a history.txt written by the server
+    :param path:
+    :return: (moves, None) moves is a list of ((x, y), color), the file has no result
+    """
+    moves = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                x, y, color = line.strip().split(',')
+                moves.append(((int(x), int(y)), color))
+    return moves, None
+
+
+def read_results(path):
+    """
+    Reads a results.xml written by the server
+    :param path:
+    :return: (moves, disc difference) moves is a list of ((x, y), color), the difference
+             is the black score minus the white score
+    """
+    root = ET.parse(path).getroot()
+    scores = {}
+    for player in ('player1', 'player2'):
+        elem = root.find(player)
+        scores[elem.get('color')] = int(elem.get('score'))
+
+    moves = []
+    for elem in root.iter('move'):
+        x, y = (int(c) for c in elem.get('coord').split(','))
+        moves.append(((x, y), elem.get('color')))
+    return moves, scores[bitboard.BitBoard.BLACK] - scores[bitboard.BitBoard.WHITE]
+
+
+def find_records(paths):
+    """
+    Lists the game records among files and directories (searched recursively for
+    results.xml and history.txt files). Each game is listed once: a history.txt next
+    to a results.xml is the same game and is skipped, given as a file or found in a
+    directory, and so is a file given twice
+    :param paths: list of paths
+    :return: list of paths
+    """
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+        for directory, subdirs, files in os.walk(path):
+            subdirs.sort()
+            if 'results.xml' in files:
+                found.append(os.path.join(directory, 'results.xml'))
+            elif 'history.txt' in files:
+                found.append(os.path.join(directory, 'history.txt'))
+
+    found = [(os.path.realpath(path), path) for path in found]
+    with_results = {os.path.dirname(real) for real, path in found if os.path.basename(real) == 'results.xml'}
+
+    records, seen = [], set()
+    for real, path in found:
+        if real in seen or (os.path.basename(real) == 'history.txt' and os.path.dirname(real) in with_results):
+            continue
+        seen.add(real)
+        records.append(path)
+    return records
+
+
+class BookBuilder(object):
+    """
+    Accumulates the statistics of the moves of the games and writes the book file
+    """
+
+    def __init__(self, max_plies=MAX_PLIES):
+        """
+        :param max_plies: plies of each game that enter the book
+        """
+        self.max_plies = max_plies
+        self.positions = {}  # canonical (own, opp) -> {square: [games, wins, draws, disc sum]}
+        self.games = 0
+        self.skipped = 0
+
+    def add_game(self, moves, result=None):
+        """
+        Adds a game to the book
+        :param moves: list of ((x, y), color)
+        :param result: black minus white discs at the end of the game, needed only
+                       when the moves don't reach the end (e.g. a disqualification)
+        :return: bool whether the game was added
+        """
+        positions, a_board = replay(moves, self.max_plies)
+        if a_board.is_endgame():
+            result = a_board.piece_count[a_board.BLACK] - a_board.piece_count[a_board.WHITE]
+        if result is None:
+            self.skipped += 1
+            return False
+
+        for own, opp, sq, color in positions:
+            own, opp, symmetry = canonical(own, opp)
+            diff = result if color == a_board.BLACK else -result
+            stats = self.positions.setdefault((own, opp), {}).setdefault(_SQUARE_MAPS[symmetry][sq], [0, 0, 0, 0])
+            stats[0] += 1
+            stats[1] += diff > 0
+            stats[2] += diff == 0
+            stats[3] += diff
+
+        self.games += 1
+        return True
+
+    def add_record(self, path):
+        """
+        Adds the game of a history.txt or results.xml file
+        :param path:
+        :return: bool whether the game was added
+        """
+        moves, result = read_results(path) if path.endswith('.xml') else read_history(path)
+        return self.add_game(moves, result)
+
+    def write(self, path):
+        """
+        Writes the book file
+        :param path:
+        :return: number of positions written
+        """
+        slots = 1
+        while slots < 2 * len(self.positions):
+            slots *= 2  # at most half full, so probes are short
+        mask = slots - 1
+
+        table = [None] * slots
+        move_records = []
+        for (own, opp), moves in self.positions.items():
+            slot = _slot_of(own, opp, mask)
+            while table[slot] is not None:
+                slot = (slot + 1) & mask
+            table[slot] = (own, opp, len(move_records), len(moves))
+            move_records.extend((sq,) + tuple(stats) for sq, stats in sorted(moves.items()))
+
+        empty = _SLOT.pack(0, 0, 0, 0)
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, slots, len(move_records), self.max_plies))
+            f.write(b''.join(_SLOT.pack(*entry) if entry is not None else empty for entry in table))
+            f.write(b''.join(_MOVE.pack(*record) for record in move_records))
+        return len(self.positions)
+
+
+class OpeningBook(object):
+    """
+    Read-only view of a book file, mapped in memory
+    """
+
+    def __init__(self, path):
+        """
+        :param path: book file written by BookBuilder
+        """
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, slots, moves, self.max_plies = _HEADER.unpack_from(self.data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('%s is not a book file' % path)
+        self.mask = slots - 1
+        self.moves_offset = _HEADER.size + slots * _SLOT.size
+
+    def probe(self, own, opp):
+        """
+        Finds the moves of a canonical position
+        :param own: canonical bitboard of the side to move
+        :param opp: canonical bitboard of the opponent
+        :return: list of (square, games, wins, draws, disc sum), in canonical squares
+        """
+        data, mask = self.data, self.mask
+        slot = _slot_of(own, opp, mask)
+        while True:
+            slot_own, slot_opp, first, count = _SLOT.unpack_from(data, _HEADER.size + slot * _SLOT.size)
+            if not count:
+                return []
+            if slot_own == own and slot_opp == opp:
+                return [_MOVE.unpack_from(data, self.moves_offset + (first + i) * _MOVE.size) for i in range(count)]
+            slot = (slot + 1) & mask
+
+    def moves(self, a_board, color):
+        """
+        Returns the book moves of a position
+        :param a_board: common.bitboard.BitBoard
+        :param color: color to move
+        :return: list of ((x, y), games, wins, draws, mean disc difference for color)
+        """
+        if a_board.piece_count[a_board.EMPTY] < 60 - self.max_plies:
+            return []  # beyond the plies of the book, no need to look
+
+        own, opp = a_board.own_and_opponent(color)
+        own, opp, symmetry = canonical(own, opp)
+        inverse = _INVERSE_MAPS[symmetry]
+
+        result = []
+        for sq, games, wins, draws, disc_sum in self.probe(own, opp):
+            sq = inverse[sq]
+            result.append(((sq & 7, sq >> 3), games, wins, draws, disc_sum / games))
+        return result
+
+    def best_move(self, a_board, color, min_games=MIN_GAMES):
+        """
+        Returns the book move with the best mean result, if it was played in
+        enough games and doesn't lose on average
+        :param a_board: common.bitboard.BitBoard
+        :param color: color to move
+        :param min_games: games a move needs to be played
+        :return: (int, int) or None
+        """
+        candidates = [(score, games, move) for move, games, wins, draws, score in self.moves(a_board, color)
+                      if games >= min_games and score >= MIN_SCORE]
+        if not candidates:
+            return None
+        return max(candidates)[2]
+
+
+_DEFAULT_BOOK = None
+_DEFAULT_BOOK_READ = False
+
+
+def default_book():
+    """
+    Returns the book of the file named by OTHELLO_BOOK, else of BOOK_FILE,
+    else None (opened once per process)
+    :return: OpeningBook or None
+    """
+    global _DEFAULT_BOOK, _DEFAULT_BOOK_READ
+    if not _DEFAULT_BOOK_READ:
+        path = os.environ.get(BOOK_ENV_VAR)
+        if path:
+            _DEFAULT_BOOK = OpeningBook(path)
+        elif os.path.exists(BOOK_FILE):
+            _DEFAULT_BOOK = OpeningBook(BOOK_FILE)
+        _DEFAULT_BOOK_READ = True
+    return _DEFAULT_BOOK
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Opening book of the players.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    build_parser = commands.add_parser('build', help='Builds the book from game records.')
+    build_parser.add_argument('records', type=str, nargs='+',
+                              help='history.txt or results.xml files, or directories with them.')
+    build_parser.add_argument('-o', '--output', type=str, default=BOOK_FILE,
+                              help='Book file (default: the one the players read).')
+    build_parser.add_argument('-p', '--plies', type=int, default=MAX_PLIES,
+                              help='Plies of each game that enter the book.')
+
+    show_parser = commands.add_parser('show', help='Prints the book moves of a position.')
+    show_parser.add_argument('state', type=str, help='Board file, as the state.txt of the players.')
+    show_parser.add_argument('color', type=str, choices=['black', 'white'], help='Color to move.')
+    show_parser.add_argument('-b', '--book', type=str, default=BOOK_FILE, help='Book file.')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        builder = BookBuilder(args.plies)
+        for record in find_records(args.records):
+            builder.add_record(record)
+        positions = builder.write(args.output)
+        print('%d games (%d skipped, without a result), %d positions saved to %s' % (
+            builder.games, builder.skipped, positions, args.output))
+    else:
+        board = bitboard.from_file(args.state)
+        book = OpeningBook(args.book)
+        color = board.BLACK if args.color == 'black' else board.WHITE
+        for move, games, wins, draws, score in sorted(book.moves(board, color), key=lambda m: -m[4]):
+            print('%d,%d: %d games, %d wins, %d draws, mean disc difference %+.1f' % (
+                move + (games, wins, draws, score)))
+        print('Book move: %s' % (book.best_move(board, color),))
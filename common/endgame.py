@@ -0,0 +1,214 @@
+from common import profiler
+from common.bitboard import FULL, flips_mask, legal_mask
+from common.time_manager import SearchTimeout
+
+# the board is split in four 4x4 quadrants for parity ordering
+QUADRANTS = [0x000000000F0F0F0F, 0x00000000F0F0F0F0, 0x0F0F0F0F00000000, 0xF0F0F0F000000000]
+
+# quadrant of each square
+_QUADRANT_OF = [(sq >> 5) * 2 + ((sq & 7) >> 2) for sq in range(64)]
+
+_INFINITY = 65
+
+
+def _popcount(bits):
+    """
+    Returns the number of set bits in the given integer
+    :param bits: int
+    :return: int
+    """
+    return bin(bits).count('1')
+
+
+def _squares(mask):
+    """
+    Returns the indexes of the squares set in the mask
+    :param mask: int
+    :return: list of int
+    """
+    squares = []
+    while mask:
+        lowest = mask & -mask
+        squares.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return squares
+
+
+class EndgameSolver(object):
+    """
+    Exact solver for the last empty squares. It works directly on the bitboards
+    of the side to move (own) and of its opponent (opp), proving the final
+    disc difference or, in the faster win/loss/draw mode, only its sign.
+    Moves are ordered fastest-first (fewest opponent replies) while many squares
+    are empty and by region parity near the end; the last 1 to 4 empties use
+    dedicated code paths that skip move generation.
+    """
+
+    # empties up to which the players switch to the solver
+    EXACT_EMPTIES = 12
+    WIN_LOSS_DRAW_EMPTIES = 15
+
+    # below this many empties, mobility ordering costs more than it saves
+    FASTEST_FIRST_EMPTIES = 7
+
+    # positions with this many empties or fewer use the dedicated code paths
+    SMALL_EMPTIES = 4
+
+    def __init__(self, time_manager=None):
+        """
+        :param time_manager: TimeManager that aborts the solver with SearchTimeout (None means no limit)
+        """
+        self.time_manager = time_manager
+        self.nodes = 0
+
+    @profiler.timed('endgame solver')
+    def solve_board(self, a_board, color, exact=True):
+        """
+        Solves the position of a board for the given color
+        :param a_board: common.bitboard.BitBoard
+        :param color: color to move
+        :param exact: proves the exact disc difference, otherwise only win/loss/draw
+        :return: (score, move) score is the final disc difference (or its sign in
+                 win/loss/draw mode) for color, move is None when color has to pass
+        """
+        own, opp = a_board.own_and_opponent(color)
+        alfa, beta = (-_INFINITY, _INFINITY) if exact else (-1, 1)
+
+        moves = legal_mask(own, opp)
+        if not moves:
+            return self.solve(own, opp, alfa, beta), None
+
+        best, best_move = -_INFINITY, None
+        for sq, flips in self.ordered_moves(own, opp, moves):
+            self.nodes += 1
+            score = -self.solve(opp ^ flips, own | flips | (1 << sq), -beta, -alfa)
+            if score > best:
+                best, best_move = score, (sq & 7, sq >> 3)
+                if score > alfa:
+                    alfa = score
+                    if alfa >= beta:
+                        break
+
+        if not exact:
+            best = (best > 0) - (best < 0)
+        return best, best_move
+
+    def solve(self, own, opp, alfa, beta, passed=False):
+        """
+        Negamax alpha-beta search until the end of the game
+        :param own: bitboard of the side to move
+        :param opp: bitboard of the opponent
+        :param alfa:
+        :param beta:
+        :param passed: whether the opponent has just passed
+        :return: int final disc difference for the side to move (fail-soft)
+        """
+        if self.time_manager is not None:
+            self.time_manager.check()
+
+        empties = ~(own | opp) & FULL
+        if _popcount(empties) <= self.SMALL_EMPTIES:
+            return self.solve_small(own, opp, alfa, beta, _squares(empties))
+
+        moves = legal_mask(own, opp)
+        if not moves:
+            if passed:
+                return _popcount(own) - _popcount(opp)
+            return -self.solve(opp, own, -beta, -alfa, True)
+
+        best = -_INFINITY
+        for sq, flips in self.ordered_moves(own, opp, moves):
+            self.nodes += 1
+            score = -self.solve(opp ^ flips, own | flips | (1 << sq), -beta, -alfa)
+            if score > best:
+                best = score
+                if score > alfa:
+                    alfa = score
+                    if alfa >= beta:
+                        break
+        return best
+
+    def ordered_moves(self, own, opp, moves):
+        """
+        Orders the moves: fastest-first (fewest opponent moves afterwards) while there are
+        many empties, odd-parity regions first otherwise (and to break ties)
+        :param own:
+        :param opp:
+        :param moves: bitmask of legal moves
+        :return: list of (square, flipped mask)
+        """
+        empties = ~(own | opp) & FULL
+        odd_regions = [_popcount(empties & quadrant) & 1 for quadrant in QUADRANTS]
+
+        children = []
+        fastest_first = _popcount(empties) > self.FASTEST_FIRST_EMPTIES
+        for sq in _squares(moves):
+            flips = flips_mask(sq, own, opp)
+            priority = 1 - odd_regions[_QUADRANT_OF[sq]]
+            if fastest_first:
+                new_own = own | flips | (1 << sq)
+                priority += _popcount(legal_mask(opp ^ flips, new_own)) * 2
+            children.append((priority, sq, flips))
+
+        children.sort()
+        return [(sq, flips) for _, sq, flips in children]
+
+    def solve_small(self, own, opp, alfa, beta, empties, passed=False):
+        """
+        Dedicated search for the last few empties: tries each empty square directly,
+        without generating the move mask, and solves the last square without recursion
+        :param own:
+        :param opp:
+        :param alfa:
+        :param beta:
+        :param empties: list of empty squares
+        :param passed: whether the opponent has just passed
+        :return: int
+        """
+        if len(empties) == 1:
+            return self.solve_last(own, opp, empties[0])
+
+        best = -_INFINITY
+        for i, sq in enumerate(empties):
+            flips = flips_mask(sq, own, opp)
+            if not flips:
+                continue
+
+            self.nodes += 1
+            rest = empties[:i] + empties[i + 1:]
+            score = -self.solve_small(opp ^ flips, own | flips | (1 << sq), -beta, -alfa, rest)
+            if score > best:
+                best = score
+                if score > alfa:
+                    alfa = score
+                    if alfa >= beta:
+                        return best
+
+        if best == -_INFINITY:
+            # no move for the side to move
+            if passed:
+                return _popcount(own) - _popcount(opp)
+            return -self.solve_small(opp, own, -beta, -alfa, empties, True)
+        return best
+
+    def solve_last(self, own, opp, sq):
+        """
+        Final disc difference with a single empty square left
+        :param own:
+        :param opp:
+        :param sq: the empty square
+        :return: int
+        """
+        self.nodes += 1
+        flips = flips_mask(sq, own, opp)
+        if flips:
+            flipped = _popcount(flips)
+            return _popcount(own) + flipped + 1 - (_popcount(opp) - flipped)
+
+        # the side to move passes, the opponent may still play the last square
+        flips = flips_mask(sq, opp, own)
+        if flips:
+            flipped = _popcount(flips)
+            return _popcount(own) - flipped - (_popcount(opp) + flipped + 1)
+
+        return _popcount(own) - _popcount(opp)
@@ -0,0 +1,258 @@
+"""
+Line protocol for players that stay alive during the whole match, instead of
+being launched once per move. The server starts engine.sh once in the player
+directory and talks to it over its stdin/stdout; players without engine.sh keep
+using the file protocol (launch.sh, state.txt and move.txt).
+
+server -> player, one command per line:
+    position <64 tiles, row by row>     position of the next request
+    go <id> <black|white> <seconds> <increment>
+                                        asks for a move, with the seconds left on the player's clock
+                                        (the increment of this move included) and the increment
+                                        added at each move (with no game clock: 0 and the time of a move)
+    go <id> <black|white> <seconds> <increment> ponder
+                                        same, on the opponent's time: the position is the one after
+                                        the predicted reply and the clock only starts at ponderhit
+    ponderhit                           the opponent played the predicted reply
+    stop                                it didn't, the pondering search must answer at once
+    quit                                end of the match
+player -> server:
+    ready                               once, after start up
+    move <id> <x>,<y> [ponder <x>,<y>]  answer to the go command with the same id,
+                                        optionally with the predicted reply of the opponent
+
+Moves carry the id of their request so that a late answer is never
+taken as the answer to the next one (the answer to a stopped ponder is discarded).
+"""
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from common import bitboard
+from common.time_manager import TimeManager, move_budget
+
+
+def serve(choose_move, predict_reply=None):
+    """
+    Player side of the protocol: answers the server requests until it quits.
+    Everything the player prints goes to stderr, stdout is left to the protocol
+    :param choose_move: function (common.bitboard.BitBoard, color name, TimeManager) -> (x, y),
+                        it must search within the time manager (which may be pondering)
+    :param predict_reply: function (common.bitboard.BitBoard, opponent color) -> (x, y) or None,
+                          the expected reply after the chosen move, for the server to ponder on
+    :return:
+    """
+    protocol = sys.stdout
+    sys.stdout = sys.stderr
+
+    def send(line):
+        protocol.write(line + '\n')
+        protocol.flush()
+
+    # commands are read by a thread, so that stop and ponderhit reach a running search
+    commands = queue.Queue()
+    current = {}  # time manager and end-of-pondering event of the last go command, last position
+
+    def read_commands():
+        for line in sys.stdin:
+            words = line.split()
+            if not words:
+                continue
+
+            if words[0] in ('stop', 'ponderhit') and current:
+                if words[0] == 'stop':
+                    current['time_manager'].stop()
+                else:
+                    current['time_manager'].ponderhit()
+                current['ponder_over'].set()
+            elif words[0] == 'go':
+                pondering = words[5:6] == ['ponder']
+                empties = current.get('position', '').count(bitboard.BitBoard.EMPTY)
+                budget = move_budget(float(words[3]), float(words[4]), empties)
+                current['time_manager'] = TimeManager(budget, pondering=pondering)
+                current['ponder_over'] = threading.Event()
+                if not pondering:
+                    current['ponder_over'].set()
+                commands.put((words, current['time_manager'], current['ponder_over']))
+            else:
+                if words[0] == 'position':
+                    current['position'] = words[1]
+                commands.put((words, None, None))
+        commands.put((['quit'], None, None))
+
+    reader = threading.Thread(target=read_commands)
+    reader.daemon = True
+    reader.start()
+
+    send('ready')
+    position = None
+    while True:
+        words, time_manager, ponder_over = commands.get()
+        if words[0] == 'position':
+            position = words[1]
+        elif words[0] == 'go':
+            request_id, color = words[1], words[2]
+            x, y = choose_move(bitboard.from_string(position), color, time_manager)
+
+            # a pondering search that ends early still waits for the opponent's move
+            ponder_over.wait()
+
+            answer = 'move %s %d,%d' % (request_id, x, y)
+            if predict_reply is not None and not time_manager.stopped:
+                a_board = bitboard.from_string(position)
+                my_color = a_board.WHITE if color == 'white' else a_board.BLACK
+                if a_board.make_move((x, y), my_color) is not None:
+                    reply = predict_reply(a_board, a_board.opponent(my_color))
+                    if reply is not None:
+                        answer += ' ponder %d,%d' % reply
+            send(answer)
+        elif words[0] == 'quit':
+            break
+
+
+class EngineProcess(object):
+    """
+    Server side of the protocol: a player process started once per match.
+    Its output is read by a thread, so waiting for a move can time out.
+    """
+
+    # time the engine has to start up (outside the clock of its moves), in seconds
+    STARTUP_TIME = 10.0
+
+    def __init__(self, command, cwd, stderr=None):
+        """
+        :param command: list with the command that starts the player
+        :param cwd: player directory
+        :param stderr: file that receives the player's prints (None inherits the server's)
+        """
+        self.process = subprocess.Popen(
+            command, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr,
+            universal_newlines=True, bufsize=1, preexec_fn=os.setsid
+        )
+        self.lines = queue.Queue()
+        self.request_id = 0
+
+        self.ponder_move = None  # reply predicted by the player in its last answer ('x,y')
+        self.ponder_request = None  # id of the go ponder request being searched
+        self.ponder_position = None  # position of that request
+
+        reader = threading.Thread(target=self._read_lines)
+        reader.daemon = True
+        reader.start()
+
+    def _read_lines(self):
+        """
+        Moves the lines written by the player to the queue, None marks its end
+        :return:
+        """
+        for line in self.process.stdout:
+            self.lines.put(line.strip())
+        self.lines.put(None)
+
+    def send(self, line):
+        """
+        Sends a command to the player
+        :param line: str without the line break
+        :return: bool whether it could be sent (False if the player died)
+        """
+        try:
+            self.process.stdin.write(line + '\n')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return False
+        return True
+
+    def wait_ready(self):
+        """
+        Waits for the player to start up
+        :return: bool whether it answered 'ready' in time
+        """
+        try:
+            return self.lines.get(timeout=self.STARTUP_TIME) == 'ready'
+        except queue.Empty:
+            return False
+
+    def request_move(self, board_string, color_name, time_left, increment):
+        """
+        Asks the player for a move and waits for it. If the player is pondering on this
+        very position its search goes on, otherwise it is stopped and a new one is requested
+        :param board_string: board as in state.txt
+        :param color_name: 'black' or 'white'
+        :param time_left: seconds the player has to answer (its clock)
+        :param increment: seconds added to its clock at each move
+        :return: str with the move as in move.txt ('x,y') or None if there was no answer in time
+        """
+        position = ''.join(board_string.split())
+        if self.ponder_request is not None:
+            request_id, pondered_position = self.ponder_request, self.ponder_position
+            self.ponder_request = self.ponder_position = None
+            if pondered_position == position:
+                if not self.send('ponderhit'):
+                    return None
+                return self.wait_move(request_id, time_left)
+
+            # the answer to the stopped search is discarded by wait_move
+            if not self.send('stop'):
+                return None
+
+        self.request_id += 1
+        if not self.send('position ' + position) \
+                or not self.send('go %d %s %.3f %.3f' % (self.request_id, color_name, time_left, increment)):
+            return None
+        return self.wait_move(self.request_id, time_left)
+
+    def start_pondering(self, board_string, color_name, time_left, increment):
+        """
+        Asks the player to search, on the opponent's time, the position after the reply it predicted
+        :param board_string: board after the predicted reply, as in state.txt
+        :param color_name: color of the player
+        :param time_left: seconds the player will have for the move, once the ponder is hit
+        :param increment: seconds added to its clock at each move
+        :return:
+        """
+        self.request_id += 1
+        position = ''.join(board_string.split())
+        if self.send('position ' + position) \
+                and self.send('go %d %s %.3f %.3f ponder' % (self.request_id, color_name, time_left, increment)):
+            self.ponder_request, self.ponder_position = self.request_id, position
+
+    def wait_move(self, request_id, time_left):
+        """
+        Waits for the answer to a request, discarding answers to earlier ones
+        :param request_id:
+        :param time_left: seconds to wait
+        :return: str with the move ('x,y') or None if there was no answer in time
+        """
+        self.ponder_move = None
+        expected = 'move %d ' % request_id
+        deadline = time.monotonic() + time_left
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.send('stop')  # out of time, its late answer will be discarded
+                return None
+            if line is None:
+                self.lines.put(None)  # the player died, later requests fail at once too
+                return None
+            if line.startswith(expected):
+                words = line[len(expected):].split()
+                if words[1:2] == ['ponder']:
+                    self.ponder_move = words[2]
+                return words[0]
+
+    def close(self):
+        """
+        Asks the player to quit and kills it if it doesn't
+        :return:
+        """
+        self.send('quit')
+        try:
+            self.process.wait(1.0)
+        except subprocess.TimeoutExpired:
+            os.killpg(os.getpgid(self.process.pid), signal.SIGKILL)
+            self.process.wait()
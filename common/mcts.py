@@ -0,0 +1,433 @@
+"""
+Monte Carlo Tree Search: UCT with optional RAVE (rapid action value estimation).
+
+Each iteration descends the tree by the UCB1 formula, expands the leaf with all
+its children at once, plays a random game to the end from there and backs the
+result up the path. With RAVE, the value of a child is blended with its AMAF
+(all moves as first) statistics: the results of the playouts in which its move
+was played later on by the same side, which gives young nodes a useful value
+after a handful of visits.
+
+Playouts work on two ints (the discs of the side to move and of its opponent),
+so copying the position costs nothing and no board objects are created. Nodes
+live in a NodePool of parallel arrays allocated once: when it is full the tree
+stops growing and the iterations go on from its leaves.
+
+Running it as a script prints the statistics of a search of a state file:
+    python -m common.mcts [-t seconds] [-w workers] [-r] state_file color
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import time
+from array import array
+
+from common import bitboard
+from common import profiler
+from common.bitboard import _popcount, flips_mask, legal_mask
+from common.time_manager import TimeManager
+
+# move of a node where the side to move passes
+PASS = 64
+
+# first_child of a node that wasn't expanded yet
+NOT_EXPANDED = -1
+
+DEFAULT_CAPACITY = 500000
+
+# exploration constant of UCB1, and visits at which RAVE and the playouts weigh the same
+EXPLORATION = 1.4
+RAVE_EQUIVALENCE = 500
+
+
+def playout(own, opp, rng):
+    """
+    Plays random moves until the end of the game
+    :param own: bitboard of the side to move
+    :param opp: bitboard of the opponent
+    :param rng: random.Random
+    :return: (disc difference, squares, opponent squares) the final disc difference for
+             the side to move and the masks of the squares played by each side
+    """
+    played = [0, 0]
+    side = 0
+    passed = False
+    randrange = rng.randrange
+    while True:
+        moves = legal_mask(own, opp)
+        if moves:
+            passed = False
+            # the k-th set bit of the mask, clearing the lowest k times
+            for _ in range(randrange(_popcount(moves))):
+                moves &= moves - 1
+            bit = moves & -moves
+            flips = flips_mask(bit.bit_length() - 1, own, opp)
+            own, opp = opp ^ flips, own | flips | bit
+            played[side] |= bit
+        elif passed:
+            break
+        else:
+            passed = True
+            own, opp = opp, own
+        side ^= 1
+
+    # the loop ends after two passes in a row, with the side to move of the start as own
+    diff = _popcount(own) - _popcount(opp)
+    return (diff if side == 0 else -diff), played[0], played[1]
+
+
+class NodePool(object):
+    """
+    Fixed-capacity storage of the tree, as parallel arrays indexed by node.
+    The children of a node are contiguous (first_child, child_count), wins and
+    rave_wins count for the side that played the move leading to the node
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """
+        :param capacity: maximum number of nodes
+        """
+        self.capacity = capacity
+        self.own = array('Q', bytes(8 * capacity))
+        self.opp = array('Q', bytes(8 * capacity))
+        self.move = array('B', bytes(capacity))
+        self.first_child = array('i', [NOT_EXPANDED]) * capacity
+        self.child_count = array('B', bytes(capacity))
+        self.visits = array('I', bytes(4 * capacity))
+        self.wins = array('d', bytes(8 * capacity))
+        self.rave_visits = array('I', bytes(4 * capacity))
+        self.rave_wins = array('d', bytes(8 * capacity))
+        self.size = 0
+
+    def new_node(self, own, opp, move):
+        """
+        Takes the next free node (the caller checks the capacity)
+        :param own: bitboard of the side to move in the node
+        :param opp: bitboard of its opponent
+        :param move: square of the move leading to the node, or PASS
+        :return: int node index
+        """
+        node = self.size
+        self.own[node] = own
+        self.opp[node] = opp
+        self.move[node] = move
+        self.first_child[node] = NOT_EXPANDED
+        self.child_count[node] = 0
+        self.visits[node] = 0
+        self.wins[node] = 0.0
+        self.rave_visits[node] = 0
+        self.rave_wins[node] = 0.0
+        self.size += 1
+        return node
+
+    def expand(self, node):
+        """
+        Creates the children of a node: one per legal move, a single PASS child
+        when only the opponent can move, none when the game is over
+        :param node:
+        :return: bool whether the node was expanded (False when the pool is full)
+        """
+        own, opp = self.own[node], self.opp[node]
+        moves = legal_mask(own, opp)
+        count = _popcount(moves) if moves else (1 if legal_mask(opp, own) else 0)
+        if self.size + count > self.capacity:
+            return False
+
+        self.first_child[node] = self.size
+        self.child_count[node] = count
+        if not moves:
+            if count:
+                self.new_node(opp, own, PASS)
+            return True
+
+        while moves:
+            bit = moves & -moves
+            sq = bit.bit_length() - 1
+            flips = flips_mask(sq, own, opp)
+            self.new_node(opp ^ flips, own | flips | bit, sq)
+            moves ^= bit
+        return True
+
+    def reset(self):
+        """
+        Frees every node, keeping the arrays
+        :return:
+        """
+        self.size = 0
+
+
+class MCTS(object):
+    """
+    Search of a position by iterations of selection, expansion, random playout
+    and backpropagation until the deadline; the move is the most visited child of the root
+    """
+
+    def __init__(self, a_board, color, time_manager=None, rave=False, pool=None, seed=None):
+        """
+        :param a_board: common.bitboard.BitBoard
+        :param color: color to move at the root
+        :param time_manager: TimeManager of the move (None needs a number of playouts in search())
+        :param rave: blends the AMAF statistics into the value of the nodes
+        :param pool: NodePool reused between searches, if any
+        :param seed: seed of the playouts
+        """
+        self.time_manager = time_manager
+        self.rave = rave
+        self.pool = pool if pool is not None else NodePool()
+        self.pool.reset()
+        self.rng = random.Random(seed)
+
+        own, opp = a_board.own_and_opponent(color)
+        self.root = self.pool.new_node(own, opp, PASS)
+        self.playouts = 0
+        self.elapsed = 0.0
+
+    def value(self, node, parent_log):
+        """
+        Selection value of a child, for the side to move in its parent
+        :param node:
+        :param parent_log: log of the visits of the parent
+        :return: float
+        """
+        pool = self.pool
+        visits = pool.visits[node]
+        if self.rave:
+            rave_visits = pool.rave_visits[node]
+            if not visits and not rave_visits:
+                return math.inf
+            beta = math.sqrt(RAVE_EQUIVALENCE / (3.0 * visits + RAVE_EQUIVALENCE))
+            mean = pool.wins[node] / visits if visits else 0.0
+            rave_mean = pool.rave_wins[node] / rave_visits if rave_visits else mean
+            value = (1 - beta) * mean + beta * rave_mean
+            return value + EXPLORATION * math.sqrt(parent_log / visits) if visits else value
+        if not visits:
+            return math.inf
+        return pool.wins[node] / visits + EXPLORATION * math.sqrt(parent_log / visits)
+
+    def select(self, node):
+        """
+        Returns the child of the node with the best value
+        :param node: expanded node with children
+        :return: int child index
+        """
+        first = self.pool.first_child[node]
+        parent_log = math.log(self.pool.visits[node] + 1)
+        return max(range(first, first + self.pool.child_count[node]), key=lambda child: self.value(child, parent_log))
+
+    def iterate(self):
+        """
+        Runs one iteration from the root
+        :return:
+        """
+        pool = self.pool
+        node = self.root
+        path = [node]
+        while pool.first_child[node] != NOT_EXPANDED and pool.child_count[node]:
+            node = self.select(node)
+            path.append(node)
+
+        # the leaf grows by one level, and the playout starts from one of its new children
+        if pool.first_child[node] == NOT_EXPANDED and pool.expand(node) and pool.child_count[node]:
+            node = pool.first_child[node] + self.rng.randrange(pool.child_count[node])
+            path.append(node)
+
+        diff, played, opponent_played = playout(pool.own[node], pool.opp[node], self.rng)
+        self.backpropagate(path, diff, played, opponent_played)
+        self.playouts += 1
+
+    def backpropagate(self, path, diff, played, opponent_played):
+        """
+        Adds the result of a playout to the nodes of the path (and to the AMAF
+        statistics of their siblings, with RAVE)
+        :param path: list of nodes from the root to the start of the playout
+        :param diff: final disc difference for the side to move at the end of the path
+        :param played: squares played in the playout by that side
+        :param opponent_played: squares played by the other side
+        :return:
+        """
+        pool = self.pool
+        # rewards and squares by side, side 0 moves at the end of the path
+        rewards = (1.0 if diff > 0 else 0.5 if diff == 0 else 0.0, 1.0 if diff < 0 else 0.5 if diff == 0 else 0.0)
+        squares = [played, opponent_played]
+
+        side = 0
+        for node in reversed(path):
+            if self.rave and pool.first_child[node] != NOT_EXPANDED:
+                # children whose move was played afterwards by the side to move in the node
+                later, reward = squares[side], rewards[side]
+                first = pool.first_child[node]
+                for child in range(first, first + pool.child_count[node]):
+                    move = pool.move[child]
+                    if move != PASS and later >> move & 1:
+                        pool.rave_visits[child] += 1
+                        pool.rave_wins[child] += reward
+
+            # the move leading to the node was played by the other side
+            side ^= 1
+            pool.visits[node] += 1
+            pool.wins[node] += rewards[side]
+            if pool.move[node] != PASS:
+                squares[side] |= 1 << pool.move[node]
+
+    @profiler.timed('search')
+    def search(self, playouts=None):
+        """
+        Iterates until the deadline of the time manager or the number of playouts
+        :param playouts: number of playouts (None runs until the deadline)
+        :return: (int, int) most visited move, (-1, -1) when the side to move has to pass
+        """
+        start = time.perf_counter()
+        root = self.root
+        pool = self.pool
+        if pool.first_child[root] == NOT_EXPANDED:
+            pool.expand(root)
+        if pool.child_count[root] == 0 or pool.move[pool.first_child[root]] == PASS:
+            return -1, -1
+
+        if playouts is None and self.time_manager is None:
+            raise ValueError('A search without time manager needs a number of playouts')
+
+        while (playouts is None or self.playouts < playouts) \
+                and (self.time_manager is None or not self.time_manager.time_is_up()):
+            self.iterate()
+
+        self.elapsed = time.perf_counter() - start
+        return self.best_move()
+
+    def root_children(self):
+        """
+        Returns the statistics of the moves of the root
+        :return: list of ((x, y), visits, wins)
+        """
+        pool = self.pool
+        first = pool.first_child[self.root]
+        return [((pool.move[child] & 7, pool.move[child] >> 3), pool.visits[child], pool.wins[child])
+                for child in range(first, first + pool.child_count[self.root])]
+
+    def best_move(self):
+        """
+        Returns the most visited move of the root
+        :return: (int, int)
+        """
+        return max(self.root_children(), key=lambda child: child[1])[0]
+
+    def predicted_reply(self):
+        """
+        Returns the most visited reply to the most visited move of the root
+        :return: (int, int) or None when the reply wasn't expanded or is a pass
+        """
+        pool = self.pool
+        first = pool.first_child[self.root]
+        if first == NOT_EXPANDED or not pool.child_count[self.root]:
+            return None
+        child = max(range(first, first + pool.child_count[self.root]), key=pool.visits.__getitem__)
+
+        first = pool.first_child[child]
+        if first == NOT_EXPANDED or not pool.child_count[child]:
+            return None
+        reply = max(range(first, first + pool.child_count[child]), key=pool.visits.__getitem__)
+        if pool.move[reply] == PASS:
+            return None
+        return pool.move[reply] & 7, pool.move[reply] >> 3
+
+    def stats(self):
+        """
+        Returns a printable summary of the search
+        :return: str
+        """
+        playouts_per_second = self.playouts / self.elapsed if self.elapsed > 0 else 0.0
+        return "Playouts: %d, playouts/s: %.0f, nodes: %d" % (self.playouts, playouts_per_second, self.pool.size)
+
+
+def _search_worker(task):
+    """
+    Runs an independent search in a worker process
+    :param task: (board string, color, deadline as time.time(), rave, seed)
+    :return: (list of ((x, y), visits, wins), playouts)
+    """
+    board_string, color, deadline, rave, seed = task
+    budget = max(0.0, deadline - time.time()) * 10 ** 9
+    search = MCTS(bitboard.from_string(board_string), color, TimeManager(budget), rave, seed=seed)
+    search.search()
+    return search.root_children(), search.playouts
+
+
+class RootParallelMCTS(object):
+    """
+    Root parallelization: each process grows its own tree from the position until
+    the deadline, then the visits of the moves of the root are added up
+    """
+
+    def __init__(self, a_board, color, workers=None, max_time=4.7, rave=False):
+        """
+        :param a_board: common.bitboard.BitBoard
+        :param color: color to move
+        :param workers: number of processes (defaults to the number of cpus)
+        :param max_time: time budget in seconds
+        :param rave: whether the searches use RAVE
+        """
+        self.board = a_board
+        self.color = color
+        self.workers = workers or os.cpu_count() or 1
+        self.deadline = time.time() + max_time
+        self.rave = rave
+        self.playouts = 0
+        self.elapsed = 0.0
+
+    def search(self):
+        """
+        Searches until the deadline
+        :return: (int, int) the move with the most visits over all trees, (-1, -1) if there is none
+        """
+        if not self.board.legal_moves(self.color):
+            return -1, -1
+
+        start = time.perf_counter()
+        seed = random.getrandbits(32)
+        tasks = [(str(self.board), self.color, self.deadline, self.rave, seed + i) for i in range(self.workers)]
+        pool = multiprocessing.Pool(self.workers)
+        try:
+            results = pool.map(_search_worker, tasks)
+        finally:
+            pool.terminate()
+
+        visits = {}
+        for children, playouts in results:
+            self.playouts += playouts
+            for move, child_visits, wins in children:
+                visits[move] = visits.get(move, 0) + child_visits
+        self.elapsed = time.perf_counter() - start
+        return max(visits, key=visits.get)
+
+    def stats(self):
+        """
+        Returns a printable summary of the search
+        :return: str
+        """
+        playouts_per_second = self.playouts / self.elapsed if self.elapsed > 0 else 0.0
+        return "Playouts: %d, playouts/s: %.0f, workers: %d" % (self.playouts, playouts_per_second, self.workers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Searches a position with Monte Carlo Tree Search.')
+    parser.add_argument('state', type=str, help='Board state file')
+    parser.add_argument('color', type=str, choices=['black', 'white'], help='Color to move')
+    parser.add_argument('-t', '--time', type=float, default=5.0, help='Seconds of search')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of processes')
+    parser.add_argument('-r', '--rave', action='store_true', help='Uses RAVE')
+    args = parser.parse_args()
+
+    a_board = bitboard.from_file(args.state)
+    color = a_board.BLACK if args.color == 'black' else a_board.WHITE
+    if args.workers > 1:
+        search = RootParallelMCTS(a_board, color, args.workers, args.time, args.rave)
+        move = search.search()
+    else:
+        search = MCTS(a_board, color, TimeManager(args.time * 10 ** 9), args.rave)
+        move = search.search()
+        for child_move, visits, wins in sorted(search.root_children(), key=lambda child: -child[1]):
+            print('%d,%d: %d visits, %.1f%% wins' % (child_move + (visits, 100.0 * wins / max(visits, 1))))
+    print(search.stats())
+    print('Move: %d,%d' % move)
@@ -0,0 +1,86 @@
+from common import profiler
+
+# static priority of each square (index y * 8 + x), higher is tried first:
+# corners first, then edges and the center, C-squares late and X-squares last
+SQUARE_PRIORITY = [
+    9, 1, 7, 6, 6, 7, 1, 9,
+    1, 0, 3, 4, 4, 3, 0, 1,
+    7, 3, 5, 5, 5, 5, 3, 7,
+    6, 4, 5, 5, 5, 5, 4, 6,
+    6, 4, 5, 5, 5, 5, 4, 6,
+    7, 3, 5, 5, 5, 5, 3, 7,
+    1, 0, 3, 4, 4, 3, 0, 1,
+    9, 1, 7, 6, 6, 7, 1, 9,
+]
+
+# ordering bonus of each kind of move, above anything the history table can reach
+_TT_MOVE_BONUS = 1 << 62
+_KILLER_BONUS = 1 << 60
+
+
+class MoveOrdering(object):
+    """
+    Cheap move ordering for alpha-beta searches, none of it needs child boards:
+    the transposition table move first, then two killer moves per ply,
+    then moves sorted by the history table and, on ties, by the static square priority.
+    """
+
+    def __init__(self, max_ply=64):
+        """
+        :param max_ply: deepest ply that keeps killer moves
+        """
+        self.killers = [[None, None] for _ in range(max_ply + 1)]
+        self.history = [0] * 64
+
+    @profiler.timed('ordering')
+    def order(self, moves, ply, tt_move=None):
+        """
+        Returns the moves sorted from the most to the least promising
+        :param moves: list of (int, int) legal moves
+        :param ply: distance from the root of the search
+        :param tt_move: (int, int) best move stored in the transposition table, if any
+        :return: list of (int, int)
+        """
+        if len(moves) < 2:
+            return moves
+
+        killer_1, killer_2 = self.killers[ply] if ply < len(self.killers) else (None, None)
+        history = self.history
+
+        def priority(move):
+            sq = move[1] * 8 + move[0]
+            score = (history[sq] << 4) + SQUARE_PRIORITY[sq]
+            if move == tt_move:
+                score += _TT_MOVE_BONUS
+            elif move == killer_1:
+                score += _KILLER_BONUS + 1
+            elif move == killer_2:
+                score += _KILLER_BONUS
+            return score
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def record_cutoff(self, move, ply, depth):
+        """
+        Registers a move that caused a beta cutoff
+        :param move: (int, int)
+        :param ply: distance from the root of the search
+        :param depth: remaining depth of the node where the cutoff happened
+        :return:
+        """
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+        # deeper cutoffs prune bigger subtrees, so they weigh more
+        self.history[move[1] * 8 + move[0]] += depth * depth
+
+    def age(self):
+        """
+        Halves the history table, so newer cutoffs weigh more than older ones
+        (to be called between iterations of iterative deepening)
+        :return:
+        """
+        self.history = [value >> 1 for value in self.history]
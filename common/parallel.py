@@ -0,0 +1,333 @@
+"""
+Root-parallel search: the moves of the root are split across a multiprocessing pool.
+The first move is searched alone (Young Brothers Wait: the eldest brother establishes
+alfa before its siblings are searched in parallel), the others run in the workers,
+which share the best score found so far so that late workers search narrower windows.
+
+The pool can outlive a search (an engine keeps one for the whole match, so its
+start-up cost is paid once). The search follows a TimeManager: this process
+watches its deadline, ponderhit and stop, and raises a stop flag shared with the
+workers when the time is up.
+
+Running it as a script compares the parallel search against the serial one:
+    python -m common.parallel [-w workers] [-d depth] state_file [state_file ...]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from common import bitboard
+from common.move_ordering import MoveOrdering
+from common.pvs import INFINITY, PVSEngine
+from common.time_manager import SearchTimeout, TimeManager
+from common.transposition import TranspositionTable
+
+# state of each worker process, set up by _init_worker
+_shared_alfa = None
+_worker_table = None
+_worker_time_manager = None
+
+
+class SharedStop(TimeManager):
+    """
+    Time manager of the workers: they have no clock of their own, the process
+    that runs the search raises the shared stop flag when its time is up
+    """
+
+    def __init__(self, stop_flag):
+        """
+        :param stop_flag: multiprocessing.Value('b'), set to 1 to abort the searches
+        """
+        TimeManager.__init__(self, 0, pondering=True)
+        self.stop_flag = stop_flag
+
+    def check(self):
+        """
+        Aborts the current search if the stop flag is set
+        :return:
+        """
+        if self.stop_flag.value:
+            raise SearchTimeout()
+
+
+def _init_worker(shared_alfa, stop_flag):
+    """
+    Pool initializer: keeps the shared alfa, the stop flag and a transposition
+    table that lives for all the tasks run by the worker
+    :param shared_alfa: multiprocessing.Value('i') with the best root score so far
+    :param stop_flag: multiprocessing.Value('b') raised when the time is up
+    :return:
+    """
+    global _shared_alfa, _worker_table, _worker_time_manager
+    _shared_alfa = shared_alfa
+    _worker_table = TranspositionTable(size_mb=8)
+    _worker_time_manager = SharedStop(stop_flag)
+
+
+def search_root_move(task, shared_alfa, transposition_table, time_manager, alfa=None):
+    """
+    Searches one root move with the window (alfa, +infinity)
+    :param task: (board string, color, move, depth)
+    :param shared_alfa: multiprocessing.Value('i') with the best root score so far
+    :param transposition_table:
+    :param time_manager: TimeManager (None searches without time limit)
+    :param alfa: lower bound of the window (None reads the shared alfa)
+    :return: (move, score or None if the time was up, alfa of the window, nodes)
+    """
+    board_string, color, move, depth = task
+    a_board = bitboard.from_string(board_string)
+    a_board.make_move(move, color)
+    opp = a_board.opponent(color)
+
+    engine = PVSEngine(a_board, opp, transposition_table=transposition_table, time_manager=time_manager)
+
+    if alfa is None:
+        alfa = shared_alfa.value
+    try:
+        score = -engine.pvs(depth - 1, -INFINITY, -alfa, opp, 1)
+    except SearchTimeout:
+        return move, None, alfa, engine.nodes + 1
+
+    # only a move that beats alfa has an exact score (otherwise it is an upper bound)
+    with shared_alfa.get_lock():
+        if score > shared_alfa.value:
+            shared_alfa.value = score
+    return move, score, alfa, engine.nodes + 1
+
+
+def _search_root_move(task):
+    """
+    Pool task: searches one root move in a worker
+    :param task: (board string, color, move, depth)
+    :return: see search_root_move
+    """
+    return search_root_move(task, _shared_alfa, _worker_table, _worker_time_manager)
+
+
+class WorkerPool(object):
+    """
+    Worker processes of the root-parallel search, with the shared alfa and stop flag
+    they were started with. With a single worker there are no processes and the tasks
+    run in this process, which gives the serial reference of the benchmark
+    """
+
+    # how often this process checks the time while it waits for the workers, in seconds
+    POLL_INTERVAL = 0.005
+
+    def __init__(self, workers=None):
+        """
+        :param workers: number of processes (defaults to the number of cpus)
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.shared_alfa = multiprocessing.Value('i', -INFINITY)
+        self.stop_flag = multiprocessing.Value('b', 0, lock=False)
+
+        # this process searches the eldest move, with a table of its own
+        self.transposition_table = TranspositionTable(size_mb=8)
+
+        self.pool = None
+        if self.workers > 1:
+            self.pool = multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                             initargs=(self.shared_alfa, self.stop_flag))
+
+    def search(self, task, time_manager, alfa=None):
+        """
+        Searches one root move in this process
+        :param task: (board string, color, move, depth)
+        :param time_manager: TimeManager (None searches without time limit)
+        :param alfa: lower bound of the window (None reads the shared alfa)
+        :return: see search_root_move
+        """
+        return search_root_move(task, self.shared_alfa, self.transposition_table, time_manager, alfa)
+
+    def search_all(self, tasks, time_manager):
+        """
+        Searches root moves in the workers, yielding the results as they finish.
+        When the time manager's time is up the workers are stopped, and the results of
+        the aborted tasks (None scores) are still yielded, so no task outlives the call
+        :param tasks: list of (board string, color, move, depth)
+        :param time_manager: TimeManager (None searches without time limit)
+        :return: generator of search_root_move results
+        """
+        if self.pool is None:
+            for task in tasks:
+                yield self.search(task, time_manager)
+            return
+
+        self.stop_flag.value = 0
+        results = self.pool.imap_unordered(_search_root_move, tasks)
+        for _ in tasks:
+            while True:
+                try:
+                    result = results.next(timeout=self.POLL_INTERVAL)
+                    break
+                except multiprocessing.TimeoutError:
+                    if time_manager is not None and time_manager.time_is_up():
+                        self.stop_flag.value = 1
+            yield result
+
+    def stop(self):
+        """
+        Aborts the tasks running in the workers
+        :return:
+        """
+        self.stop_flag.value = 1
+
+    def close(self):
+        """
+        Ends the worker processes
+        :return:
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+class ParallelRootSearch(object):
+    """
+    Iterative deepening search that splits the root moves across a WorkerPool.
+    A pool that is not given is started for the search and closed at its end.
+    """
+
+    def __init__(self, a_board, color, workers=None, time_manager=None, pool=None):
+        """
+        :param a_board: common.bitboard.BitBoard
+        :param color: color to move
+        :param workers: number of processes of the pool started for the search (defaults to the number of cpus)
+        :param time_manager: TimeManager that limits the search (None searches without time limit)
+        :param pool: WorkerPool kept between searches, if any
+        """
+        self.board = a_board
+        self.color = color
+        self.time_manager = time_manager
+        self.pool = pool
+        self.workers = pool.workers if pool is not None else workers or os.cpu_count() or 1
+
+        self.move_ordering = MoveOrdering()
+        self.nodes = 0
+        self.completed_depth = 0
+        self.score = None
+
+    def search(self, max_depth):
+        """
+        Searches the root up to max_depth or until the time is up
+        :param max_depth:
+        :return: (int, int) best move of the deepest completed iteration, (-1, -1) if there is none
+        """
+        moves = self.board.legal_moves(self.color)
+        if not moves:
+            return -1, -1
+
+        pool = self.pool if self.pool is not None else WorkerPool(self.workers)
+        best_move = self.move_ordering.order(moves, 0)[0]
+        try:
+            for depth in range(1, max_depth + 1):
+                nodes_before = self.nodes
+                elapsed_before = self.time_manager.elapsed() if self.time_manager is not None else 0
+                result = self.search_depth(pool, depth, best_move)
+                if result is None:
+                    break  # unfinished iterations are discarded
+
+                self.score, best_move = result
+                self.completed_depth = depth
+                if depth >= self.board.piece_count[self.board.EMPTY]:
+                    break
+
+                if self.time_manager is not None:
+                    self.time_manager.record_iteration(self.nodes - nodes_before,
+                                                       self.time_manager.elapsed() - elapsed_before)
+                    if not self.time_manager.can_start_next_iteration():
+                        break
+        finally:
+            if self.pool is None:
+                pool.close()
+
+        return best_move
+
+    def search_depth(self, pool, depth, pv_move):
+        """
+        Searches the root at a given depth: the eldest move first, the others in parallel
+        :param pool: WorkerPool
+        :param depth:
+        :param pv_move: best move of the previous iteration, searched first
+        :return: (score, move) or None if the time was up
+        """
+        board_string = str(self.board)
+        moves = self.move_ordering.order(self.board.legal_moves(self.color), 0, pv_move)
+        tasks = [(board_string, self.color, move, depth) for move in moves]
+
+        pool.shared_alfa.value = -INFINITY
+        move, best, alfa, nodes = pool.search(tasks[0], self.time_manager)
+        self.nodes += nodes
+        if best is None:
+            return None
+        best_move = move
+
+        # every result is read, even after a timeout, so that no task of this search is left in the pool
+        timed_out = False
+        for move, score, alfa, nodes in pool.search_all(tasks[1:], self.time_manager):
+            self.nodes += nodes
+            if score is None:
+                pool.stop()
+                timed_out = True
+            if timed_out:
+                continue
+
+            if best < score <= alfa:
+                # the score is only an upper bound, the true one needs the full window
+                move, score, alfa, nodes = pool.search(tasks[moves.index(move)], self.time_manager, -INFINITY)
+                self.nodes += nodes
+                if score is None:
+                    pool.stop()
+                    timed_out = True
+                    continue
+            if score > best:
+                best, best_move = score, move
+
+        return None if timed_out else (best, best_move)
+
+
+def compare_with_serial(path, depth, workers):
+    """
+    Searches a position serially and in parallel at a fixed depth
+    :param path: state file
+    :param depth:
+    :param workers:
+    :return: dict with times, nodes, speedup and search overhead
+    """
+    stats = {}
+    for name, count in (('serial', 1), ('parallel', workers)):
+        # the state file doesn't tell whose turn it is: black moves if it can
+        a_board = bitboard.from_file(path)
+        color = a_board.BLACK if a_board.legal_moves(a_board.BLACK) else a_board.WHITE
+
+        # the pool starts before the clock, as in an engine that keeps it for the match
+        pool = WorkerPool(count)
+        search = ParallelRootSearch(a_board, color, pool=pool)
+        try:
+            start = time.perf_counter()
+            move = search.search(depth)
+            stats[name] = {'time': time.perf_counter() - start, 'nodes': search.nodes, 'move': move,
+                           'score': search.score}
+        finally:
+            pool.close()
+
+    stats['speedup'] = stats['serial']['time'] / stats['parallel']['time']
+    stats['overhead'] = stats['parallel']['nodes'] / float(stats['serial']['nodes']) - 1
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the root-parallel search against the serial one.')
+    parser.add_argument('states', metavar='state', type=str, nargs='+', help='Board state files')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('-d', '--depth', type=int, default=6, help='Search depth')
+    args = parser.parse_args()
+
+    for state in args.states:
+        result = compare_with_serial(state, args.depth, args.workers)
+        print('%s: serial %.2fs %d nodes, parallel %.2fs %d nodes, speedup %.2fx, overhead %.1f%%' % (
+            state, result['serial']['time'], result['serial']['nodes'], result['parallel']['time'],
+            result['parallel']['nodes'], result['speedup'], result['overhead'] * 100))
@@ -0,0 +1,318 @@
+"""
+Table-driven evaluation of bitboard positions (common.bitboard.BitBoard).
+
+The board is covered by patterns, fixed lists of squares: the edges with their
+two X-squares, the 3x3 corners and the diagonals, each in all its orientations.
+The discs on the squares of a pattern are read as a base-3 number (0 empty,
+1 black, 2 white, the first square is the least significant digit), the index
+of the pattern in a table with a value for every configuration. The board keeps
+the indexes up to date as discs are placed and flipped, so evaluating a position
+is one lookup per pattern, plus mobility and potential mobility tables indexed
+by the number of moves and of frontier squares of each side.
+
+The tables are from black's point of view; the orientations of a pattern share
+its table, as their squares are listed in the same order relative to the corner.
+Values are in evaluation units, UNITS_PER_DISC of them per disc of final difference.
+
+The weights are read once per process from the file named by the environment
+variable OTHELLO_WEIGHTS or else from pattern_weights.bin next to this module
+(written by common.tuning), and are hand-picked defaults when there is none.
+"""
+import os
+import struct
+from array import array
+
+from common.bitboard import FULL, BitBoard, _popcount
+from common.pvs import WIN_SCORE
+
+BLACK_DIGIT = 1
+WHITE_DIGIT = 2
+
+
+def _rotate(square):
+    x, y = square
+    return 7 - y, x
+
+
+def _orientations(squares, count):
+    """
+    Returns the pattern in its first orientations, each one rotated by 90 degrees
+    :param squares: list of (x, y) of the pattern in its first orientation
+    :param count: number of orientations (2 for the patterns that a half turn maps onto themselves)
+    :return: list of lists of square indexes (y * 8 + x)
+    """
+    result = []
+    for _ in range(count):
+        result.append([y * 8 + x for x, y in squares])
+        squares = [_rotate(square) for square in squares]
+    return result
+
+
+# pattern name -> squares of each orientation
+PATTERNS = {
+    'edge_2x': _orientations([(x, 0) for x in range(8)] + [(1, 1), (6, 1)], 4),
+    'corner_3x3': _orientations([(x, y) for y in range(3) for x in range(3)], 4),
+    'diagonal_8': _orientations([(i, i) for i in range(8)], 2),
+    'diagonal_7': _orientations([(i, i + 1) for i in range(7)], 4),
+    'diagonal_6': _orientations([(i, i + 2) for i in range(6)], 4),
+    'diagonal_5': _orientations([(i, i + 3) for i in range(5)], 4),
+    'diagonal_4': _orientations([(i, i + 4) for i in range(4)], 4),
+}
+PATTERN_NAMES = sorted(PATTERNS)
+
+# the instances (pattern orientations) in a fixed order, with the name of their pattern
+INSTANCES = [(name, squares) for name in PATTERN_NAMES for squares in PATTERNS[name]]
+
+# square -> list of (instance, power of 3 of the square in the instance)
+SQUARE_INSTANCES = [[] for _ in range(64)]
+for _instance, (_name, _squares) in enumerate(INSTANCES):
+    for _digit, _sq in enumerate(_squares):
+        SQUARE_INSTANCES[_sq].append((_instance, 3 ** _digit))
+
+# moves and frontier squares counted by the mobility tables
+MAX_MOBILITY = 64
+
+# source squares of the shifts towards higher and lower columns, so that they don't wrap rows
+_NOT_LAST_COL = 0x7F7F7F7F7F7F7F7F
+_NOT_FIRST_COL = 0xFEFEFEFEFEFEFEFE
+
+# scale of the values of the tables
+UNITS_PER_DISC = 10
+
+# weights file: header (magic, number of values) then every table in WEIGHT_NAMES order, as int16
+WEIGHTS_ENV_VAR = 'OTHELLO_WEIGHTS'
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pattern_weights.bin')
+_WEIGHTS_MAGIC = b'OTHW'
+_WEIGHTS_HEADER = struct.Struct('<4sI')
+WEIGHT_NAMES = PATTERN_NAMES + ['mobility', 'potential_mobility']
+
+# default weights, the constants of the old move evaluation of player_alpha_beta_v2 in spirit:
+# corners are good, X and C-squares next to an empty corner are bad, edges are good, mobility is good
+CORNER = 20
+X_SQUARE = -8
+C_SQUARE = -4
+EDGE = 2
+MOBILITY = 3
+POTENTIAL_MOBILITY = 1
+
+
+def _digit_values(weight):
+    # value of a square with each digit, from black's point of view
+    return [0, weight, -weight]
+
+
+def _build_table(square_weights, pairs=()):
+    """
+    Builds the table of a pattern from the value of each square and of pairs of squares
+    :param square_weights: list with the weight of each square of the pattern
+    :param pairs: list of (square, other square, weight): the weight counts when
+                  square has a disc and other square is empty
+    :return: list of 3 ** len(square_weights) ints
+    """
+    table = [0]
+    for weight in square_weights:
+        values = _digit_values(weight)
+        # the new square is the most significant digit
+        table = [value + t for value in values for t in table]
+
+    for square, other, weight in pairs:
+        values = _digit_values(weight)
+        power, other_power = 3 ** square, 3 ** other
+        table = [t + (values[i // power % 3] if i // other_power % 3 == 0 else 0) for i, t in enumerate(table)]
+    return table
+
+
+def default_weights():
+    """
+    Returns hand-picked weights, used while there are no fitted ones
+    :return: dict pattern name -> table, plus 'mobility' and 'potential_mobility' -> list by count
+    """
+    weights = {
+        # squares 0 and 7 are corners (counted by corner_3x3), 1 and 6 are C-squares, 8 and 9 X-squares
+        'edge_2x': _build_table([0, 0, EDGE, EDGE, EDGE, EDGE, 0, 0, 0, 0],
+                                [(1, 0, C_SQUARE), (6, 7, C_SQUARE)]),
+        # square 0 is the corner and square 4 the X-square
+        'corner_3x3': _build_table([CORNER, 0, 0, 0, 0, 0, 0, 0, 0], [(4, 0, X_SQUARE)]),
+        'mobility': [MOBILITY * n for n in range(MAX_MOBILITY + 1)],
+        'potential_mobility': [POTENTIAL_MOBILITY * n for n in range(MAX_MOBILITY + 1)],
+    }
+    for name in PATTERN_NAMES:
+        if name not in weights:
+            weights[name] = [0] * 3 ** len(PATTERNS[name][0])
+    return weights
+
+
+def weight_sizes():
+    """
+    Returns the number of values of each table
+    :return: list of (name, size) in WEIGHT_NAMES order
+    """
+    sizes = [(name, 3 ** len(PATTERNS[name][0])) for name in PATTERN_NAMES]
+    return sizes + [('mobility', MAX_MOBILITY + 1), ('potential_mobility', MAX_MOBILITY + 1)]
+
+
+def save_weights(weights, path):
+    """
+    Writes the weights
+    :param weights: dict name -> list of ints (values beyond int16 are clipped)
+    :param path:
+    :return:
+    """
+    values = array('h')
+    for name, size in weight_sizes():
+        if len(weights[name]) != size:
+            raise ValueError('Table %s has %d values, it should have %d' % (name, len(weights[name]), size))
+        values.extend(max(-32768, min(32767, int(round(value)))) for value in weights[name])
+
+    with open(path, 'wb') as f:
+        f.write(_WEIGHTS_HEADER.pack(_WEIGHTS_MAGIC, len(values)))
+        values.tofile(f)
+
+
+def load_weights(path):
+    """
+    Reads weights written by save_weights
+    :param path:
+    :return: dict name -> list of ints
+    """
+    with open(path, 'rb') as f:
+        magic, count = _WEIGHTS_HEADER.unpack(f.read(_WEIGHTS_HEADER.size))
+        expected = sum(size for name, size in weight_sizes())
+        if magic != _WEIGHTS_MAGIC or count != expected:
+            raise ValueError('%s is not a weights file of these patterns' % path)
+        values = array('h')
+        values.fromfile(f, count)
+
+    weights, start = {}, 0
+    for name, size in weight_sizes():
+        weights[name] = values[start:start + size].tolist()
+        start += size
+    return weights
+
+
+_STARTUP_WEIGHTS = None
+
+
+def startup_weights():
+    """
+    Returns the weights of the file named by OTHELLO_WEIGHTS, else of WEIGHTS_FILE,
+    else the default weights (read once per process)
+    :return: dict name -> list of ints
+    """
+    global _STARTUP_WEIGHTS
+    if _STARTUP_WEIGHTS is None:
+        path = os.environ.get(WEIGHTS_ENV_VAR)
+        if path:
+            _STARTUP_WEIGHTS = load_weights(path)
+        elif os.path.exists(WEIGHTS_FILE):
+            _STARTUP_WEIGHTS = load_weights(WEIGHTS_FILE)
+        else:
+            _STARTUP_WEIGHTS = default_weights()
+    return _STARTUP_WEIGHTS
+
+
+def _neighbours(bits):
+    """
+    Returns the squares next to any of the given squares, in the eight directions
+    :param bits: int bitboard
+    :return: int bitboard
+    """
+    east, west = bits & _NOT_LAST_COL, bits & _NOT_FIRST_COL
+    return ((bits << 8) | (bits >> 8)
+            | (east << 1) | (east << 9) | (east >> 7)
+            | (west >> 1) | (west >> 9) | (west << 7)) & FULL
+
+
+def indexes_of(a_board):
+    """
+    Computes the index of every pattern instance from scratch
+    :param a_board: common.bitboard.BitBoard
+    :return: list of int, in the order of INSTANCES
+    """
+    result = []
+    for name, squares in INSTANCES:
+        index = 0
+        for digit, sq in enumerate(squares):
+            if a_board.black >> sq & 1:
+                index += BLACK_DIGIT * 3 ** digit
+            elif a_board.white >> sq & 1:
+                index += WHITE_DIGIT * 3 ** digit
+        result.append(index)
+    return result
+
+
+class PatternEvaluation(object):
+    """
+    Evaluation of a board, attached to it: the board calls play() on every move
+    so the pattern indexes follow its discs (unmake_move restores them)
+    """
+
+    def __init__(self, a_board, weights=None):
+        """
+        :param a_board: common.bitboard.BitBoard, evaluated from now on
+        :param weights: dict name -> table, as returned by load_weights() (None uses startup_weights())
+        """
+        if weights is None:
+            weights = startup_weights()
+
+        self.tables = [weights[name] for name, squares in INSTANCES]
+        self.mobility = weights['mobility']
+        self.potential_mobility = weights['potential_mobility']
+
+        self.indexes = indexes_of(a_board)
+        a_board.patterns = self
+
+    def play(self, sq, color, flips):
+        """
+        Updates the indexes after a disc of color is placed on sq, flipping the flips discs
+        :param sq: square index
+        :param color: BitBoard.BLACK or BitBoard.WHITE
+        :param flips: int bitboard of the flipped discs
+        :return: list of int, the indexes before the move (for unmake_move)
+        """
+        previous = self.indexes
+        indexes = previous[:]
+
+        if color == BitBoard.BLACK:
+            placed, flipped = BLACK_DIGIT, BLACK_DIGIT - WHITE_DIGIT
+        else:
+            placed, flipped = WHITE_DIGIT, WHITE_DIGIT - BLACK_DIGIT
+
+        for instance, power in SQUARE_INSTANCES[sq]:
+            indexes[instance] += placed * power
+        while flips:
+            lowest = flips & -flips
+            for instance, power in SQUARE_INSTANCES[lowest.bit_length() - 1]:
+                indexes[instance] += flipped * power
+            flips ^= lowest
+
+        self.indexes = indexes
+        return previous
+
+    def evaluate(self, a_board, color):
+        """
+        Evaluates the board attached to this evaluation
+        :param a_board: the board (the same one given to the constructor)
+        :param color: point of view
+        :return: int, positive when color is better (finished games score beyond any position)
+        """
+        black, white = a_board.black, a_board.white
+        # the board caches the legal moves, the search usually needs them anyway
+        black_moves, white_moves = len(a_board.legal_moves(BitBoard.BLACK)), len(a_board.legal_moves(BitBoard.WHITE))
+        if not black_moves and not white_moves:
+            # finished game: only the disc difference matters
+            diff = _popcount(black) - _popcount(white)
+            score = WIN_SCORE + diff if diff > 0 else -WIN_SCORE + diff if diff < 0 else 0
+            return score if color == BitBoard.BLACK else -score
+
+        score = sum(map(list.__getitem__, self.tables, self.indexes))
+
+        mobility = self.mobility
+        score += mobility[black_moves] - mobility[white_moves]
+
+        # empty squares next to the opponent's discs, where moves may appear later
+        empty = ~(black | white) & FULL
+        potential = self.potential_mobility
+        score += potential[_popcount(_neighbours(white) & empty)] - potential[_popcount(_neighbours(black) & empty)]
+
+        return score if color == BitBoard.BLACK else -score
@@ -0,0 +1,187 @@
+"""
+Perft: counts the leaf nodes of the game tree up to a fixed depth. Wrong counts
+reveal bugs in the move generation (legal moves, flips and make/unmake), and the
+time it takes measures the speed of a board implementation.
+
+A side without legal moves passes, which takes a ply; a finished game is a leaf.
+
+Any board backend can be checked: a module with from_string(string) that
+returns a board with legal_moves(color), make_move((x, y), color),
+unmake_move(undo) and opponent(color):
+    python -m common.perft [-b backend] [-r reference backend] [-d depth] [state_file ...]
+"""
+import argparse
+import glob
+import importlib
+import os
+import sys
+import time
+
+# backends known by a short name
+BACKENDS = {
+    'board': 'common.board',
+    'bitboard': 'common.bitboard',
+}
+
+# leaf counts from the initial position, by depth (published Othello perft values)
+KNOWN_PERFT = [1, 4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288, 24571284, 212258800, 1939886636]
+
+INITIAL_POSITION = '\n'.join([
+    '........',
+    '........',
+    '........',
+    '...WB...',
+    '...BW...',
+    '........',
+    '........',
+    '........',
+])
+
+# name -> (board, color to move, leaf counts by depth), counts cross-checked between backends
+REFERENCE_POSITIONS = {
+    'initial': (INITIAL_POSITION, 'B', KNOWN_PERFT),
+    'midgame': ('\n'.join([
+        '.B...BB.',
+        '.B.W.BB.',
+        '.BWW.WB.',
+        '..WBWBB.',
+        '..WWWWW.',
+        '.....WB.',
+        '........',
+        '........',
+    ]), 'B', [1, 12, 161, 1933, 26065, 301264, 4101420]),
+    'pass': ('\n'.join([
+        '......W.',
+        '..BBBBWW',
+        '..B.B.W.',
+        '..BBBWWW',
+        '..BBB.W.',
+        '.BBBBBWW',
+        '.BBB..W.',
+        '.....WWW',
+    ]), 'B', [1, 1, 8, 28, 284, 1919, 21211]),
+    'endgame': ('\n'.join([
+        'WBBBWWWW',
+        'WBBB.BWW',
+        'BWWBBWW.',
+        'WWWWWBBB',
+        '.WWWWBBB',
+        '..WWBWBB',
+        '..B.BBW.',
+        '.B.BBB.W',
+    ]), 'B', [1, 8, 44, 279, 1627, 7930, 42227]),
+}
+
+# the repository's own state files, also used as perft positions
+STATE_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '*', 'state*.txt')
+
+
+def load_backend(name):
+    """
+    Imports a board backend
+    :param name: short name (see BACKENDS) or module path
+    :return: module with from_string
+    """
+    return importlib.import_module(BACKENDS.get(name, name))
+
+
+def perft(a_board, color, depth):
+    """
+    Counts the leaves of the game tree below the position
+    :param a_board: board of any backend, restored when the count ends
+    :param color: color to move
+    :param depth: plies to play
+    :return: int
+    """
+    if depth == 0:
+        return 1
+
+    opp = a_board.opponent(color)
+    moves = a_board.legal_moves(color)
+    if not moves:
+        if not a_board.legal_moves(opp):
+            return 1  # the game is over before the depth
+        return perft(a_board, opp, depth - 1)
+
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        undo = a_board.make_move(move, color)
+        nodes += perft(a_board, opp, depth - 1)
+        a_board.unmake_move(undo)
+    return nodes
+
+
+def side_to_move(a_board):
+    """
+    State files don't tell whose turn it is: black moves if it can
+    :param a_board:
+    :return: color
+    """
+    black, white = 'B', 'W'
+    return black if a_board.legal_moves(black) or not a_board.legal_moves(white) else white
+
+
+def positions(state_files):
+    """
+    Returns the positions to count: the reference positions and the given state files
+    :param state_files: list of paths
+    :return: list of (name, board string, color, expected counts by depth or None)
+    """
+    result = [(name, string, color, counts) for name, (string, color, counts) in REFERENCE_POSITIONS.items()]
+    for path in state_files:
+        result.append((os.path.relpath(path), open(path).read(), None, None))
+    return result
+
+
+def run(backend, depth, state_files, reference=None):
+    """
+    Counts every position at depths 1 to depth, checking the counts against the
+    known values or, for positions without them, against a reference backend
+    :param backend: module of the board backend
+    :param depth: deepest depth counted
+    :param state_files: list of paths
+    :param reference: module of the reference backend or None
+    :return: bool whether all the counts are right
+    """
+    ok = True
+    for name, string, color, expected in positions(state_files):
+        a_board = backend.from_string(string)
+        if color is None:
+            color = side_to_move(a_board)
+
+        for d in range(1, depth + 1):
+            start = time.perf_counter()
+            nodes = perft(a_board, color, d)
+            duration = time.perf_counter() - start
+
+            if expected is not None and d < len(expected):
+                right = expected[d]
+            elif reference is not None:
+                right = perft(reference.from_string(string), color, d)
+            else:
+                right = None
+
+            status = '' if right is None else 'ok' if nodes == right else 'WRONG (expected %d)' % right
+            ok = ok and (right is None or nodes == right)
+            print('%-28s %s depth %2d: %12d nodes %8.2fs %10.0f nodes/s %s' % (
+                name, color, d, nodes, duration, nodes / duration if duration > 0 else 0, status))
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Counts the leaf nodes of the game tree (perft).')
+    parser.add_argument('states', metavar='state', type=str, nargs='*',
+                        help='Board state files (default: the state files of the repository)')
+    parser.add_argument('-b', '--backend', type=str, default='bitboard',
+                        help='Board backend: %s or a module path' % ', '.join(sorted(BACKENDS)))
+    parser.add_argument('-r', '--reference', type=str, default=None,
+                        help='Backend that checks the positions without known counts')
+    parser.add_argument('-d', '--depth', type=int, default=5, help='Deepest depth counted')
+    args = parser.parse_args()
+
+    states = args.states or sorted(glob.glob(STATE_FILES))
+    reference_backend = load_backend(args.reference) if args.reference is not None else None
+    sys.exit(0 if run(load_backend(args.backend), args.depth, states, reference_backend) else 1)
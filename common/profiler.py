@@ -0,0 +1,254 @@
+"""
+Hierarchical profiling of the searches, shared by all the players.
+
+Functions decorated with timed(name) and blocks inside scope(name) are named
+scopes that nest: the time of each one is split between its own code and its
+sub-scopes, and aggregated by the stack of scopes that led to it, so a flame
+graph shows where a search spends its time (move generation, evaluation,
+child creation, ordering, TT probes...). Every scope also counts its calls and
+time by nesting level: the level of the 'search' scope is the ply of the node.
+count(name, depth) adds explicit counters by search depth.
+
+Profiling is off unless the environment variable OTHELLO_PROFILE names the
+output file when the player starts (%p is replaced by the process id):
+    OTHELLO_PROFILE=profile.json    trace event format (chrome://tracing, Perfetto, speedscope)
+    OTHELLO_PROFILE=profile.folded  collapsed stacks (flamegraph.pl, speedscope), for any other extension
+The file is written when the process exits, and a summary is printed to stderr.
+
+Disabled, timed() returns the function itself and scope() a shared object that
+does nothing, so the instrumented code runs as if it wasn't. Hot code should
+still guard its count() calls with 'if profiler.ENABLED'.
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+from time import perf_counter_ns
+
+ENV_VAR = 'OTHELLO_PROFILE'
+OUTPUT_FILE = os.environ.get(ENV_VAR) or None
+ENABLED = OUTPUT_FILE is not None
+
+# scopes kept in the trace, later ones are only aggregated (a search opens millions of them)
+MAX_EVENTS = 200000
+
+
+class Profiler(object):
+    """
+    Records the scopes of one process (searches run in a single thread)
+    """
+
+    def __init__(self):
+        self.stack = []  # names of the open scopes
+        self.frames = []  # [start time, time spent in sub-scopes] of each open scope
+        self.paths = {}  # tuple of scope names -> [calls, own time]
+        self.levels = {}  # scope name -> {nesting level: [calls, total time]}
+        self.counters = {}  # counter name -> {depth: count}
+        self.events = []  # (name, start time, duration) of the first scopes, for the trace
+        self.dropped_events = 0
+        self.origin = perf_counter_ns()
+
+    def enter(self, name):
+        self.stack.append(name)
+        self.frames.append([perf_counter_ns(), 0])
+
+    def exit(self):
+        end = perf_counter_ns()
+        start, children = self.frames.pop()
+        elapsed = end - start
+
+        path = tuple(self.stack)
+        name = self.stack.pop()
+        if self.frames:
+            self.frames[-1][1] += elapsed
+
+        entry = self.paths.get(path)
+        if entry is None:
+            entry = self.paths[path] = [0, 0]
+        entry[0] += 1
+        entry[1] += elapsed - children
+
+        level = self.stack.count(name)
+        by_level = self.levels.setdefault(name, {})
+        entry = by_level.get(level)
+        if entry is None:
+            entry = by_level[level] = [0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+
+        if len(self.events) < MAX_EVENTS:
+            self.events.append((name, start, elapsed))
+        else:
+            self.dropped_events += 1
+
+    def count(self, name, depth, amount=1):
+        by_depth = self.counters.setdefault(name, {})
+        by_depth[depth] = by_depth.get(depth, 0) + amount
+
+    def collapsed_stacks(self):
+        """
+        Returns the own time of each stack of scopes, one 'scope;sub-scope;... nanoseconds' per line
+        :return: str
+        """
+        return ''.join('%s %d\n' % (';'.join(path), own) for path, (calls, own) in sorted(self.paths.items()))
+
+    def trace(self):
+        """
+        Returns the scopes as complete events of the trace event format (times in microseconds),
+        with the aggregates by nesting level and the counters as metadata
+        :return: dict
+        """
+        pid = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'ts': (start - self.origin) / 1000.0, 'dur': elapsed / 1000.0,
+                   'pid': pid, 'tid': 0} for name, start, elapsed in self.events]
+        levels = {name: {level: {'calls': calls, 'time_ms': total / 10 ** 6}
+                         for level, (calls, total) in sorted(by_level.items())}
+                  for name, by_level in self.levels.items()}
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'levels': levels, 'counters': self.counters, 'dropped_events': self.dropped_events}}
+
+    def summary(self):
+        """
+        Returns the own time and calls of each scope, and the scopes and counters by level
+        :return: str
+        """
+        own, calls = {}, {}
+        for path, (path_calls, path_own) in self.paths.items():
+            own[path[-1]] = own.get(path[-1], 0) + path_own
+            calls[path[-1]] = calls.get(path[-1], 0) + path_calls
+        total = sum(own.values()) or 1
+
+        lines = ['%-24s %12s %10s %7s' % ('Scope', 'Calls', 'Own time', '%')]
+        for name in sorted(own, key=own.get, reverse=True):
+            lines.append('%-24s %12d %9.3fs %6.1f%%' % (name, calls[name], own[name] * 10 ** -9,
+                                                       own[name] * 100.0 / total))
+        for name, by_level in sorted(self.levels.items()):
+            if len(by_level) > 1:
+                lines.append('%s by level: %s' % (name, ', '.join(
+                    '%d: %d' % (level, level_calls) for level, (level_calls, _) in sorted(by_level.items()))))
+        for name, by_depth in sorted(self.counters.items()):
+            lines.append('%s by depth: %s' % (name, ', '.join(
+                '%s: %d' % (depth, amount) for depth, amount in sorted(by_depth.items()))))
+        return '\n'.join(lines)
+
+    def export(self, path):
+        """
+        Writes the profile, as a trace if the file is .json and as collapsed stacks otherwise
+        :param path:
+        :return:
+        """
+        with open(path, 'w') as f:
+            if path.endswith('.json'):
+                json.dump(self.trace(), f)
+            else:
+                f.write(self.collapsed_stacks())
+
+
+PROFILER = Profiler() if ENABLED else None
+
+
+class _NullScope(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, tb):
+        pass
+
+
+class _Scope(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        PROFILER.enter(self.name)
+
+    def __exit__(self, type, value, tb):
+        PROFILER.exit()
+
+
+_NULL_SCOPE = _NullScope()
+
+
+def scope(name):
+    """
+    Returns a context manager that times its block as a scope
+    :param name: name of the scope
+    :return:
+    """
+    return _Scope(name) if ENABLED else _NULL_SCOPE
+
+
+def timed(name):
+    """
+    Decorator that times each call of the function as a scope
+    (without profiling the function is returned unchanged)
+    :param name: name of the scope
+    :return:
+    """
+    def decorator(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            PROFILER.enter(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                PROFILER.exit()
+        return wrapper
+    return decorator
+
+
+def count(name, depth, amount=1):
+    """
+    Adds to a counter aggregated by search depth
+    :param name: name of the counter
+    :param depth: depth (or ply) where it happened
+    :param amount:
+    :return:
+    """
+    if ENABLED:
+        PROFILER.count(name, depth, amount)
+
+
+def _write_profile():
+    path = OUTPUT_FILE.replace('%p', str(os.getpid()))
+    PROFILER.export(path)
+    sys.stderr.write(PROFILER.summary() + '\nProfile written to %s\n' % path)
+
+
+if ENABLED:
+    atexit.register(_write_profile)
+
+
+class MonitorPerformance(object):
+    """
+    Measures the time of a block, printing it if asked, and profiles it as a scope
+    """
+
+    def __init__(self, do_print=True, to_print='', name='move'):
+        """
+        :param do_print: prints the time when the block ends
+        :param to_print: text printed before the time
+        :param name: name of the scope
+        """
+        self.do_print = do_print
+        self.to_print = to_print
+        self.name = name
+        self.start_time = None
+        self.end_time = None
+
+    def __enter__(self):
+        if ENABLED:
+            PROFILER.enter(self.name)
+        self.start_time = perf_counter_ns()
+
+    def __exit__(self, type, value, tb):
+        self.end_time = perf_counter_ns()
+        if ENABLED:
+            PROFILER.exit()
+        if self.do_print:
+            prefix = self.to_print + ' ' if self.to_print else ''
+            print(prefix + "{:.2f}".format((self.end_time - self.start_time) * 10**-9) + "s")
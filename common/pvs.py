@@ -0,0 +1,250 @@
+from common import profiler
+from common.move_ordering import MoveOrdering
+from common.time_manager import SearchTimeout
+from common.transposition import TranspositionTable
+
+# scores are integers, so null windows are (alfa, alfa + 1)
+INFINITY = 10 ** 6
+
+# finished games score beyond any heuristic evaluation (plus the disc difference)
+WIN_SCORE = 10 ** 4
+
+
+@profiler.timed('evaluation')
+def disc_difference(a_board, color):
+    """
+    Default evaluation: discs of the given color minus discs of its opponent
+    :param a_board:
+    :param color: color to move
+    :return: int
+    """
+    return a_board.piece_count[color] - a_board.piece_count[a_board.opponent(color)]
+
+
+class PVSEngine(object):
+    """
+    Negamax Principal Variation Search (NegaScout).
+    The first child of each node is searched with the full window, the others
+    with a null window and are only re-searched when they fail high.
+    The root is driven by iterative deepening with aspiration windows around
+    the score of the previous iteration.
+    The board is searched in place with make_move/unmake_move.
+    """
+
+    # half-width of the aspiration window, in evaluation units
+    ASPIRATION_WINDOW = 8
+
+    def __init__(self, a_board, color, evaluate=disc_difference, transposition_table=None,
+                 move_ordering=None, time_manager=None):
+        """
+        :param a_board: board (common.board.Board or common.bitboard.BitBoard) with the side to move
+        :param color: color to move at the root
+        :param evaluate: function (board, color to move) -> int
+        :param transposition_table: TranspositionTable shared with other searches, if any
+        :param move_ordering: MoveOrdering shared with other searches, if any
+        :param time_manager: TimeManager that limits the search (None searches without time limit)
+        """
+        self.board = a_board
+        self.color = color
+        self.evaluate = evaluate
+        self.transposition_table = transposition_table if transposition_table is not None else TranspositionTable()
+        self.move_ordering = move_ordering if move_ordering is not None else MoveOrdering()
+        self.time_manager = time_manager
+
+        self.nodes = 0
+        self.prunings = 0
+        self.re_searches = 0  # null-window searches that failed high and were searched again
+        self.aspiration_failures = 0  # root searches repeated with a wider window
+        self.completed_depth = 0
+        self.score = 0
+
+    def search(self, max_depth):
+        """
+        Searches the root position by iterative deepening
+        :param max_depth:
+        :return: (int, int) best move of the deepest completed iteration, (-1, -1) if there is none
+        """
+        moves = self.board.legal_moves(self.color)
+        if not moves:
+            return -1, -1
+
+        best_move = self.move_ordering.order(moves, 0)[0]
+        empties = self.board.piece_count[self.board.EMPTY]
+
+        for depth in range(1, max_depth + 1):
+            nodes_before = self.nodes
+            elapsed_before = self.time_manager.elapsed() if self.time_manager is not None else 0
+            try:
+                score, move = self.aspiration_search(depth, best_move)
+            except SearchTimeout:
+                break  # unfinished iterations are discarded
+
+            self.score, best_move = score, move
+            self.completed_depth = depth
+            self.move_ordering.age()
+
+            if depth >= empties:
+                break  # the search already reaches the end of the game
+
+            if self.time_manager is not None:
+                self.time_manager.record_iteration(self.nodes - nodes_before,
+                                                   self.time_manager.elapsed() - elapsed_before)
+                if not self.time_manager.can_start_next_iteration():
+                    break
+
+        return best_move
+
+    def aspiration_search(self, depth, pv_move):
+        """
+        Searches the root with a window around the previous score,
+        widening it until the score falls inside
+        :param depth:
+        :param pv_move: best move of the previous iteration
+        :return: (score, move)
+        """
+        if self.completed_depth < 2:
+            return self.search_root(depth, -INFINITY, INFINITY, pv_move)
+
+        delta = self.ASPIRATION_WINDOW
+        alfa, beta = self.score - delta, self.score + delta
+        while True:
+            score, move = self.search_root(depth, alfa, beta, pv_move)
+            if alfa < score < beta or (alfa <= -INFINITY and beta >= INFINITY):
+                return score, move
+
+            self.aspiration_failures += 1
+            self.re_searches += 1
+            delta *= 4
+            if score <= alfa:
+                alfa = max(-INFINITY, score - delta)
+            else:
+                beta = min(INFINITY, score + delta)
+                pv_move = move
+
+    def search_root(self, depth, alfa, beta, pv_move):
+        """
+        Principal variation search of the root position
+        :param depth:
+        :param alfa:
+        :param beta:
+        :param pv_move: move searched first
+        :return: (score, move)
+        """
+        a_board, color = self.board, self.color
+        opp = a_board.opponent(color)
+
+        alfa_start = alfa
+        best, best_move = -INFINITY - 1, pv_move
+        for i, move in enumerate(self.move_ordering.order(a_board.legal_moves(color), 0, pv_move)):
+            undo = a_board.make_move(move, color)
+            self.nodes += 1
+            try:
+                if i == 0:
+                    score = -self.pvs(depth - 1, -beta, -alfa, opp, 1)
+                else:
+                    score = -self.pvs(depth - 1, -alfa - 1, -alfa, opp, 1)
+                    if alfa < score < beta:
+                        self.re_searches += 1
+                        score = -self.pvs(depth - 1, -beta, -score, opp, 1)
+            finally:
+                a_board.unmake_move(undo)
+
+            if score > best:
+                best, best_move = score, move
+                if score > alfa:
+                    alfa = score
+                    if alfa >= beta:
+                        self.prunings += 1
+                        break
+
+        self.transposition_table.store(a_board.hash, depth, best, alfa_start, beta, best_move)
+        return best, best_move
+
+    @profiler.timed('search')
+    def pvs(self, depth, alfa, beta, color, ply):
+        """
+        Fail-soft negamax principal variation search
+        :param depth: remaining depth
+        :param alfa:
+        :param beta:
+        :param color: color to move
+        :param ply: distance from the root
+        :return: int score from the point of view of color
+        """
+        if self.time_manager is not None:
+            self.time_manager.check()
+
+        a_board = self.board
+        if depth <= 0:
+            return self.evaluate(a_board, color)
+
+        opp = a_board.opponent(color)
+        moves = a_board.legal_moves(color)
+        if not moves:
+            if not a_board.legal_moves(opp):
+                return self.final_score(color)
+
+            # passes the turn, without spending depth
+            a_board.pass_turn()
+            try:
+                return -self.pvs(depth, -beta, -alfa, opp, ply + 1)
+            finally:
+                a_board.pass_turn()
+
+        key = a_board.hash
+        tt_score, tt_move = self.transposition_table.lookup(key, depth, alfa, beta)
+        if tt_score is not None:
+            return int(tt_score)
+
+        alfa_start = alfa
+        best, best_move = -INFINITY - 1, None
+        first = True
+        for move in self.move_ordering.order(moves, ply, tt_move):
+            undo = a_board.make_move(move, color)
+            self.nodes += 1
+            try:
+                if first:
+                    score = -self.pvs(depth - 1, -beta, -alfa, opp, ply + 1)
+                    first = False
+                else:
+                    score = -self.pvs(depth - 1, -alfa - 1, -alfa, opp, ply + 1)
+                    if alfa < score < beta:
+                        self.re_searches += 1
+                        score = -self.pvs(depth - 1, -beta, -score, opp, ply + 1)
+            finally:
+                a_board.unmake_move(undo)
+
+            if score > best:
+                best, best_move = score, move
+                if score > alfa:
+                    alfa = score
+                    if alfa >= beta:
+                        self.prunings += 1
+                        if profiler.ENABLED:
+                            profiler.count('prunings', ply)
+                        self.move_ordering.record_cutoff(move, ply, depth)
+                        break
+
+        self.transposition_table.store(key, depth, best, alfa_start, beta, best_move)
+        return best
+
+    def final_score(self, color):
+        """
+        Score of a finished game, from the point of view of color
+        :param color:
+        :return: int
+        """
+        diff = disc_difference(self.board, color)
+        if diff > 0:
+            return WIN_SCORE + diff
+        if diff < 0:
+            return -WIN_SCORE + diff
+        return 0
+
+    def stats(self):
+        """
+        Returns a printable summary of the search counters
+        :return: str
+        """
+        return "PVS depth: %d, nodes: %d, prunings: %d, re-searches: %d (aspiration: %d)" % (
+            self.completed_depth, self.nodes, self.prunings, self.re_searches, self.aspiration_failures)
@@ -0,0 +1,159 @@
+from time import perf_counter_ns
+
+# time kept for starting up and answering the server, in seconds
+SAFETY_MARGIN = 0.3
+
+
+def move_budget(time_left, increment, empties):
+    """
+    Splits the clock of a player between its remaining moves: each move gets the increment
+    plus an even share of the rest of the clock, never more than the clock itself,
+    minus the safety margin
+    :param time_left: seconds on the player's clock (including the increment of this move)
+    :param increment: seconds added to the clock at each move (with no game clock, the time of a move)
+    :param empties: empty squares of the board
+    :return: int nanoseconds
+    """
+    moves_to_go = max(1, (empties + 1) // 2)
+    share = min(time_left, increment + max(0.0, time_left - increment) / moves_to_go)
+
+    # a nearly empty clock still gets a fraction of what is left, instead of the margin
+    return int(max(share - SAFETY_MARGIN, share / 4) * 10 ** 9)
+
+
+class SearchTimeout(Exception):
+    """
+    Raised from inside a search when the time budget is over,
+    unwinding the whole (unfinished) iteration
+    """
+    pass
+
+
+class TimeManager(object):
+    """
+    Keeps the time budget of a move for an iterative deepening search.
+    Completed iterations are recorded so the cost of the next depth
+    can be predicted from the measured effective branching factor.
+    A search started while pondering has no time limit until ponderhit()
+    starts its clock or stop() aborts it (both may be called from another thread).
+    """
+
+    # branching factor assumed while there is a single completed iteration
+    DEFAULT_BRANCHING_FACTOR = 6.0
+
+    def __init__(self, max_time, start_time=None, pondering=False):
+        """
+        :param max_time: time budget in nanoseconds
+        :param start_time: perf_counter_ns() of when the move started (defaults to now)
+        :param pondering: whether the search runs on the opponent's time (the budget only starts at ponderhit)
+        """
+        self.start_time = perf_counter_ns() if start_time is None else start_time
+        self.max_time = max_time
+        self.pondering = pondering
+        self.stopped = False
+        self.portions = []  # time managers created by portion(), that follow this one
+
+        self.iteration_nodes = []  # nodes expanded by each completed iteration
+        self.iteration_times = []  # time (ns) spent by each completed iteration
+
+    def elapsed(self):
+        """
+        Returns the time spent since the move started
+        :return: int nanoseconds
+        """
+        return perf_counter_ns() - self.start_time
+
+    def time_is_up(self):
+        """
+        Returns whether the time budget is over
+        :return: bool
+        """
+        if self.stopped:
+            return True
+        return not self.pondering and perf_counter_ns() - self.start_time > self.max_time
+
+    def check(self):
+        """
+        Aborts the current search iteration if the time budget is over
+        :return:
+        """
+        if self.stopped or (not self.pondering and perf_counter_ns() - self.start_time > self.max_time):
+            raise SearchTimeout()
+
+    def portion(self, fraction):
+        """
+        Returns a time manager for a fraction of this budget (for a search that must leave
+        time to another one), which also follows the ponderhit() and stop() of this one
+        :param fraction: float
+        :return: TimeManager
+        """
+        manager = TimeManager(self.max_time * fraction, self.start_time, self.pondering)
+        manager.stopped = self.stopped
+        self.portions.append(manager)
+        return manager
+
+    def ponderhit(self):
+        """
+        The opponent played the move the search was pondering on: the budget starts now
+        :return:
+        """
+        now = perf_counter_ns()
+        for manager in [self] + self.portions:
+            manager.start_time = now
+            manager.pondering = False
+
+    def stop(self):
+        """
+        Aborts the search as soon as it checks the time
+        :return:
+        """
+        for manager in [self] + self.portions:
+            manager.stopped = True
+
+    def record_iteration(self, nodes, duration):
+        """
+        Records a completed iteration
+        :param nodes: nodes expanded by the iteration
+        :param duration: time (ns) spent by the iteration
+        :return:
+        """
+        self.iteration_nodes.append(nodes)
+        self.iteration_times.append(duration)
+
+    def branching_factor(self):
+        """
+        Returns the effective branching factor measured on completed iterations.
+        Alpha-beta trees grow unevenly between odd and even depths, so when possible
+        the factor is measured over two plies (between iterations of the same parity)
+        :return: float
+        """
+        nodes = self.iteration_nodes
+        if len(nodes) >= 3 and nodes[-3] > 0:
+            return max(1.0, (nodes[-1] / nodes[-3]) ** 0.5)
+        if len(nodes) == 2 and nodes[-2] > 0:
+            return max(1.0, nodes[-1] / nodes[-2])
+        return self.DEFAULT_BRANCHING_FACTOR
+
+    def predicted_next_iteration(self):
+        """
+        Predicts how long the next (one ply deeper) iteration will take
+        :return: float nanoseconds
+        """
+        times = self.iteration_times
+        if not times:
+            return 0.0
+        if len(times) >= 3:
+            # extrapolates from the last iteration of the same parity as the next one
+            return times[-2] * self.branching_factor() ** 2
+        return times[-1] * self.branching_factor()
+
+    def can_start_next_iteration(self):
+        """
+        Returns whether the next iteration is expected to finish inside the budget
+        :return: bool
+        """
+        if self.stopped:
+            return False
+        if self.pondering:
+            return True
+        return self.elapsed() + self.predicted_next_iteration() <= self.max_time
@@ -0,0 +1,151 @@
+from array import array
+
+from common import profiler
+
+# bound types of a stored score
+EXACT = 0
+LOWER = 1  # the search failed high, real score is >= stored score
+UPPER = 2  # the search failed low, real score is <= stored score
+
+# bytes used by one entry: key, score, depth, bound and move
+ENTRY_SIZE = 8 + 8 + 1 + 1 + 1
+
+_NO_MOVE = -1
+
+
+class TranspositionTable(object):
+    """
+    Fixed-size transposition table indexed by zobrist keys (board.hash).
+    Entries live in parallel arrays allocated once, according to the memory budget.
+    Each bucket has two slots: the first keeps the deepest search (depth-preferred)
+    and the second is always replaced, so recent positions are kept as well.
+    """
+
+    def __init__(self, size_mb=16):
+        """
+        Allocates the table
+        :param size_mb: memory budget in megabytes
+        """
+        buckets = 1
+        while buckets * 2 * 2 * ENTRY_SIZE <= size_mb * 1024 * 1024:
+            buckets *= 2  # power of two, so the bucket index is a mask of the key
+
+        self.mask = buckets - 1
+        slots = buckets * 2
+
+        self.keys = array('Q', bytes(8 * slots))
+        self.scores = array('d', bytes(8 * slots))
+        self.depths = array('b', [-1]) * slots  # depth -1 marks an empty slot
+        self.bounds = array('b', bytes(slots))
+        self.moves = array('b', [_NO_MOVE]) * slots
+
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0  # misses on buckets holding other positions
+
+    def probe(self, key):
+        """
+        Finds the slot where the position is stored
+        :param key: zobrist key of the position
+        :return: int slot index or -1 if the position is not stored
+        """
+        slot = (key & self.mask) << 1
+        depths, keys = self.depths, self.keys
+
+        if depths[slot] >= 0 and keys[slot] == key:
+            self.hits += 1
+            return slot
+        if depths[slot + 1] >= 0 and keys[slot + 1] == key:
+            self.hits += 1
+            return slot + 1
+
+        self.misses += 1
+        if depths[slot] >= 0 or depths[slot + 1] >= 0:
+            self.collisions += 1
+        return -1
+
+    @profiler.timed('tt probe')
+    def lookup(self, key, depth, alfa, beta):
+        """
+        Probes the table for a position searched at least as deep as requested
+        :param key: zobrist key of the position
+        :param depth: remaining search depth
+        :param alfa:
+        :param beta:
+        :return: (score, move) where score is None when the entry can't cut the search
+                 and move is the best move stored for the position (or None)
+        """
+        slot = self.probe(key)
+        if slot < 0:
+            return None, None
+
+        move = self.moves[slot]
+        move = (move & 7, move >> 3) if move != _NO_MOVE else None
+
+        if self.depths[slot] >= depth:
+            score, bound = self.scores[slot], self.bounds[slot]
+            if bound == EXACT \
+                    or (bound == LOWER and score >= beta) \
+                    or (bound == UPPER and score <= alfa):
+                return score, move
+
+        return None, move
+
+    def best_move(self, key):
+        """
+        Returns the best move stored for the position, regardless of its depth
+        :param key: zobrist key of the position
+        :return: (int, int) or None
+        """
+        slot = self.probe(key)
+        if slot < 0 or self.moves[slot] == _NO_MOVE:
+            return None
+        move = self.moves[slot]
+        return move & 7, move >> 3
+
+    @profiler.timed('tt store')
+    def store(self, key, depth, score, alfa, beta, move):
+        """
+        Stores the result of a search, classifying its bound
+        from the window it was searched with
+        :param key: zobrist key of the position
+        :param depth: remaining search depth
+        :param score: value returned by the search
+        :param alfa: alfa of the search window (before searching)
+        :param beta: beta of the search window (before searching)
+        :param move: (int, int) best move found or None
+        :return:
+        """
+        if score <= alfa:
+            bound = UPPER
+        elif score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+
+        slot = (key & self.mask) << 1
+        if self.depths[slot] > depth and self.keys[slot] != key:
+            slot += 1  # keeps the deeper entry, uses the always-replace slot
+
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.depths[slot] = min(depth, 127)
+        self.bounds[slot] = bound
+        self.moves[slot] = move[1] * 8 + move[0] if move is not None else _NO_MOVE
+
+    def clear(self):
+        """
+        Empties the table and resets its counters
+        :return:
+        """
+        slots = len(self.depths)
+        self.depths = array('b', [-1]) * slots
+        self.moves = array('b', [_NO_MOVE]) * slots
+        self.hits = self.misses = self.collisions = 0
+
+    def stats(self):
+        """
+        Returns a printable summary of the table counters
+        :return: str
+        """
+        return "TT hits: %d, misses: %d, collisions: %d" % (self.hits, self.misses, self.collisions)
@@ -0,0 +1,240 @@
+"""
+Offline tuning of the pattern evaluation (common.patterns), in two steps.
+
+generate: plays self-play games in a process pool, each move chosen by a PVS
+search with the current weights (after a few random opening moves, so games
+differ), until the endgame solver can prove the final disc difference. Every
+position of the game is labelled with that proven result, from black's point of
+view, and streamed to the output file as the games finish, one 17 byte record
+per position: black discs (uint64), white discs (uint64), label (int8).
+
+fit: reads the positions with NumPy and fits the tables by batched gradient
+descent on the squared error between the evaluation and the labels (a least
+squares fit), then writes a weights file that the players load at startup:
+    python -m common.tuning generate -o positions.bin [-g games] [-w workers] [-d depth] [-r random moves]
+    python -m common.tuning fit positions.bin [positions.bin ...] [-o weights file] [-e epochs]
+
+Only this module needs NumPy; the players read the weights without it.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import struct
+import time
+
+import numpy as np
+
+from common import bitboard
+from common import patterns
+from common.batch import legal_moves_mask, neighbours, popcount
+from common.endgame import EndgameSolver
+from common.pvs import PVSEngine
+from common.transposition import TranspositionTable
+
+RECORD = struct.Struct('<QQb')
+RECORD_DTYPE = np.dtype([('black', '<u8'), ('white', '<u8'), ('label', 'i1')])
+
+
+def play_game(task):
+    """
+    Plays a self-play game (runs in a worker process)
+    :param task: (seed, search depth, random opening moves, empties from which the game is solved)
+    :return: bytes with the records of the positions of the game
+    """
+    seed, depth, random_moves, solve_empties = task
+    rng = random.Random(seed)
+
+    a_board = bitboard.BitBoard()
+    evaluation = patterns.PatternEvaluation(a_board)
+    transposition_table = TranspositionTable(size_mb=4)
+    color = a_board.BLACK
+    positions = []
+    label = None
+
+    while label is None:
+        moves = a_board.legal_moves(color)
+        if not moves:
+            color = a_board.opponent(color)
+            moves = a_board.legal_moves(color)
+            if not moves:
+                label = a_board.piece_count[a_board.BLACK] - a_board.piece_count[a_board.WHITE]
+                break
+
+        positions.append((a_board.black, a_board.white))
+        if a_board.piece_count[a_board.EMPTY] <= solve_empties:
+            score, move = EndgameSolver().solve_board(a_board, color)
+            label = score if color == a_board.BLACK else -score
+        elif len(positions) <= random_moves:
+            a_board.make_move(rng.choice(moves), color)
+        else:
+            search = PVSEngine(a_board, color, evaluate=evaluation.evaluate, transposition_table=transposition_table)
+            a_board.make_move(search.search(depth), color)
+        color = a_board.opponent(color)
+
+    # the random opening moves are not worth learning from
+    return b''.join(RECORD.pack(black, white, label) for black, white in positions[random_moves:])
+
+
+def generate(output, games, workers, depth, random_moves, solve_empties, seed):
+    """
+    Plays the self-play games and appends their positions to the output file
+    :param output: path of the positions file
+    :param games: number of games
+    :param workers: number of processes
+    :param depth: depth of the search of each move
+    :param random_moves: moves played at random at the start of each game
+    :param solve_empties: empties from which the game result is proven by the endgame solver
+    :param seed: seed of the first game (each game uses the next one)
+    :return: number of positions written
+    """
+    tasks = [(seed + game, depth, random_moves, solve_empties) for game in range(games)]
+    count = 0
+    start = time.perf_counter()
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        with open(output, 'ab') as f:
+            for game, records in enumerate(pool.imap_unordered(play_game, tasks)):
+                f.write(records)
+                count += len(records) // RECORD.size
+                if (game + 1) % 10 == 0 or game + 1 == games:
+                    print('%d games, %d positions, %.1f positions/s' % (
+                        game + 1, count, count / (time.perf_counter() - start)))
+    finally:
+        pool.close()
+        pool.join()
+    return count
+
+
+def read_positions(paths):
+    """
+    Reads positions files
+    :param paths: list of paths
+    :return: numpy structured array with black, white and label
+    """
+    return np.concatenate([np.fromfile(path, dtype=RECORD_DTYPE) for path in paths])
+
+
+def features(black, white):
+    """
+    Returns the table entries used by the evaluation of each position: every position
+    adds the entries of its columns, multiplied by their signs (the white mobility
+    tables are subtracted)
+    :param black: numpy uint64 array
+    :param white: numpy uint64 array
+    :return: (columns, signs) numpy arrays of shape (positions, entries used), columns
+             index the concatenation of the tables in patterns.WEIGHT_NAMES order
+    """
+    offsets, offset = {}, 0
+    for name, size in patterns.weight_sizes():
+        offsets[name] = offset
+        offset += size
+
+    columns = []
+    for name, squares in patterns.INSTANCES:
+        index = np.zeros(len(black), dtype=np.int64)
+        for digit, sq in enumerate(squares):
+            sq = np.uint64(sq)
+            index += ((black >> sq) & np.uint64(1)).astype(np.int64) * (patterns.BLACK_DIGIT * 3 ** digit)
+            index += ((white >> sq) & np.uint64(1)).astype(np.int64) * (patterns.WHITE_DIGIT * 3 ** digit)
+        columns.append(offsets[name] + index)
+    signs = [1] * len(columns)
+
+    empty = ~(black | white)
+    columns += [offsets['mobility'] + popcount(legal_moves_mask(black, white)),
+                offsets['mobility'] + popcount(legal_moves_mask(white, black)),
+                offsets['potential_mobility'] + popcount(neighbours(white) & empty),
+                offsets['potential_mobility'] + popcount(neighbours(black) & empty)]
+    signs += [1, -1, 1, -1]
+
+    # int32 halves the memory of millions of positions
+    columns = np.stack(columns, axis=1).astype(np.int32)
+    return columns, np.broadcast_to(np.array(signs, dtype=np.float64), columns.shape)
+
+
+def fit(positions, epochs, batch_size, learning_rate, seed=0):
+    """
+    Fits the tables to the labels by mini-batch gradient descent on the squared error.
+    Each entry moves by the mean residual of the positions that use it in the batch,
+    so rare configurations learn as fast as common ones
+    :param positions: structured array of read_positions()
+    :param epochs: passes over the positions
+    :param batch_size: positions of each step
+    :param learning_rate: fraction of the mean residual applied at each step
+    :param seed: seed of the shuffling
+    :return: dict name -> list of int, in evaluation units
+    """
+    # each position also counts with the colors swapped, so the tables come out color-symmetric
+    black = np.concatenate([positions['black'], positions['white']])
+    white = np.concatenate([positions['white'], positions['black']])
+    labels = np.concatenate([positions['label'], -positions['label']]).astype(np.float64)
+
+    columns, signs = features(black, white)
+    size = sum(size for name, size in patterns.weight_sizes())
+    weights = np.zeros(size)
+    rng = np.random.default_rng(seed)
+
+    for epoch in range(epochs):
+        order = rng.permutation(len(labels))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            batch_columns, batch_signs = columns[batch], signs[batch]
+            residuals = labels[batch] - (weights[batch_columns] * batch_signs).sum(axis=1)
+
+            gradient = np.bincount(batch_columns.ravel(), weights=(batch_signs * residuals[:, None]).ravel(),
+                                   minlength=size)
+            uses = np.bincount(batch_columns.ravel(), minlength=size)
+            weights += learning_rate * gradient / np.maximum(uses, 1)
+
+        errors = np.concatenate([labels[start:start + batch_size]
+                                 - (weights[columns[start:start + batch_size]]
+                                    * signs[start:start + batch_size]).sum(axis=1)
+                                 for start in range(0, len(labels), batch_size)])
+        print('epoch %d: mean squared error %.2f, mean absolute error %.2f discs' % (
+            epoch + 1, np.mean(errors ** 2), np.mean(np.abs(errors))))
+
+    result, start = {}, 0
+    for name, table_size in patterns.weight_sizes():
+        result[name] = (weights[start:start + table_size] * patterns.UNITS_PER_DISC).round().astype(int).tolist()
+        start += table_size
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tunes the weights of the pattern evaluation.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    generate_parser = commands.add_parser('generate', help='Plays self-play games and saves their positions.')
+    generate_parser.add_argument('-o', '--output', type=str, default='positions.bin',
+                                 help='Positions file, new positions are appended.')
+    generate_parser.add_argument('-g', '--games', type=int, default=100, help='Number of games.')
+    generate_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                                 help='Number of processes.')
+    generate_parser.add_argument('-d', '--depth', type=int, default=3, help='Depth of the search of each move.')
+    generate_parser.add_argument('-r', '--random-moves', type=int, default=8,
+                                 help='Moves played at random at the start of each game.')
+    generate_parser.add_argument('-e', '--solve-empties', type=int, default=EndgameSolver.EXACT_EMPTIES,
+                                 help='Empties from which the game result is proven by the endgame solver.')
+    generate_parser.add_argument('-s', '--seed', type=int, default=int(time.time()),
+                                 help='Seed of the first game.')
+
+    fit_parser = commands.add_parser('fit', help='Fits the weights to saved positions.')
+    fit_parser.add_argument('positions', type=str, nargs='+', help='Positions files.')
+    fit_parser.add_argument('-o', '--output', type=str, default=patterns.WEIGHTS_FILE,
+                            help='Weights file (default: the one the players load).')
+    fit_parser.add_argument('-e', '--epochs', type=int, default=10, help='Passes over the positions.')
+    fit_parser.add_argument('-b', '--batch-size', type=int, default=4096, help='Positions of each step.')
+    fit_parser.add_argument('-l', '--learning-rate', type=float, default=0.05,
+                            help='Fraction of the mean residual applied at each step.')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate(args.output, args.games, args.workers, args.depth, args.random_moves, args.solve_empties,
+                 args.seed)
+    else:
+        data = read_positions(args.positions)
+        print('%d positions' % len(data))
+        patterns.save_weights(fit(data, args.epochs, args.batch_size, args.learning_rate), args.output)
+        print('Weights saved to %s' % args.output)
@@ -0,0 +1,32 @@
+"""
+Zobrist keys shared by the board implementations.
+A position key is the xor of one random 64-bit number per disc (by square and color)
+plus SIDE_KEY, which is toggled every time the turn changes.
+"""
+import random
+
+# fixed seed, so server, players and tools agree on the keys of a position
+_rng = random.Random(20210322)
+
+# PIECE_KEYS[color][square], square = row * 8 + col
+PIECE_KEYS = {
+    'B': [_rng.getrandbits(64) for _ in range(64)],
+    'W': [_rng.getrandbits(64) for _ in range(64)],
+}
+
+# flipping a disc swaps its black key for the white one (or vice-versa), a single xor
+FLIP_KEYS = [b ^ w for b, w in zip(PIECE_KEYS['B'], PIECE_KEYS['W'])]
+
+SIDE_KEY = _rng.getrandbits(64)
+
+
+def hash_squares(squares):
+    """
+    Computes the key of a position from scratch
+    :param squares: iterable of (square, color) for every disc on the board
+    :return: int
+    """
+    key = 0
+    for square, color in squares:
+        key ^= PIECE_KEYS[color][square]
+    return key
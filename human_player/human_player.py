@@ -111,6 +111,17 @@ class Patrick:
             return score
 
 
+def choose_move(a_board, color, time_left):
+    """
+    In-process player interface (see match.py), always plays without asking the human
+    :param a_board: board of the current position (common.board.Board or common.bitboard.BitBoard)
+    :param color: 'black' or 'white'
+    :param time_left: seconds available for the move (not needed here)
+    :return: (int, int)
+    """
+    return Patrick(board.from_string(str(a_board)), color).next_move()
+
+
 if __name__ == '__main__':
     b = board.from_file(sys.argv[1])
     f = open('move.txt', 'w')
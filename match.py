@@ -0,0 +1,181 @@
+#!/usr/bin/python
+
+import os
+import time
+import argparse
+import importlib
+import contextlib
+
+from common import board
+
+# player directory -> module with its choose_move(board, color, time_left) function
+PLAYERS = {
+    'randomplayer': 'randomplayer.randomplayer',
+    'human_player': 'human_player.human_player',
+    'player_min_max': 'player_min_max.min_max',
+    'player_alpha_beta': 'player_alpha_beta.alpha_beta',
+    'player_alpha_beta_v2': 'player_alpha_beta_v2.alpha_beta',
+    'player_alpha_beta_v3': 'player_alpha_beta_v3.alpha_beta',
+    'player_mcts': 'player_mcts.monte_carlo',
+}
+
+
+def load_player(spec):
+    """
+    Returns the move function of a player
+    :param spec: player directory, optionally followed by extra arguments of its
+                 choose_move separated by colons (e.g. player_alpha_beta_v3:pvs)
+    :return: function (board, color name, time_left) -> (x, y)
+    """
+    name, *options = spec.split(':')
+    name = os.path.basename(os.path.normpath(name))
+    if name not in PLAYERS:
+        raise ValueError('Unknown player %s, the players are: %s' % (name, ', '.join(sorted(PLAYERS))))
+
+    choose_move = importlib.import_module(PLAYERS[name]).choose_move
+    return lambda a_board, color, time_left: choose_move(a_board, color, time_left, *options)
+
+
+class Match(object):
+    """
+    Plays a game between two in-process players, with the rules of the server
+    (illegal moves lose the turn, 5 in a row disqualify) but no launch scripts,
+    files or subprocesses. The time of each move is measured, not enforced
+    """
+
+    def __init__(self, players, delay, verbose=False):
+        """
+        :param players: [black move function, white move function] as returned by load_player
+        :param delay: seconds given to each move
+        :param verbose: shows the players' output and the board after each move
+        """
+        self.players = players
+        self.player_color = [board.Board.BLACK, board.Board.WHITE]
+        self.color_names = ['black', 'white']
+        self.delay = delay
+        self.verbose = verbose
+
+        self.board = board.Board()
+        self.history = []  # a list of performed moves (tuple: ((x,y), color)
+        self.times = [0.0, 0.0]  # time used by each player
+        self.overtime = [0, 0]  # moves that took longer than the delay
+        self.result = None
+
+    def run(self):
+        """
+        Plays the game
+        :return: 0 if black wins, 1 if white wins, 2 on a draw
+        """
+        player = 0
+        illegal_count = [0, 0]
+
+        while True:
+            color = self.player_color[player]
+            if illegal_count[player] >= 5:
+                self.log('Player %d DISQUALIFIED! Too many illegal move attempts.' % (player + 1))
+                self.result = 1 - player
+                return self.result
+
+            if self.board.is_endgame():
+                break
+
+            # the legal moves stay cached in the board and check the player's move later
+            if not self.board.legal_moves(color):
+                illegal_count[player] = 0
+                player = 1 - player
+                continue
+
+            # each player gets its own copy, so it can't change the board of the match
+            a_board = board.from_string(str(self.board))
+            start = time.perf_counter()
+            if self.verbose:
+                move = self.players[player](a_board, self.color_names[player], self.delay)
+            else:
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    move = self.players[player](a_board, self.color_names[player], self.delay)
+            used = time.perf_counter() - start
+
+            self.times[player] += used
+            if used > self.delay:
+                self.overtime[player] += 1
+
+            self.history.append((move, color))
+            if self.board.process_move(move, color):
+                illegal_count[player] = 0
+                self.log('Player %d move %d,%d accepted (%.3fs).' % (player + 1, move[0], move[1], used))
+                if self.verbose:
+                    print(self.board.decorated_str())
+            else:
+                illegal_count[player] += 1
+                self.log('Player %d move %d,%d ILLEGAL!' % (player + 1, move[0], move[1]))
+
+            player = 1 - player
+
+        scores = self.scores()
+        self.result = 0 if scores[0] > scores[1] else 1 if scores[1] > scores[0] else 2
+        return self.result
+
+    def scores(self):
+        """
+        Returns the discs of each player
+        :return: (int, int)
+        """
+        return self.board.piece_count[self.board.BLACK], self.board.piece_count[self.board.WHITE]
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+
+def play_games(specs, games, delay, verbose=False):
+    """
+    Plays games between two players, alternating their colors
+    :param specs: two player specs (see load_player)
+    :param games: number of games
+    :param delay: seconds given to each move
+    :param verbose:
+    :return: dict with the wins, draws, discs, time and overtime moves of each player
+    """
+    players = [load_player(spec) for spec in specs]
+    stats = {'wins': [0, 0], 'draws': 0, 'discs': [0, 0], 'time': [0.0, 0.0], 'overtime': [0, 0], 'games': games}
+
+    for game in range(games):
+        # on odd games the second player plays black
+        order = [0, 1] if game % 2 == 0 else [1, 0]
+        match = Match([players[order[0]], players[order[1]]], delay, verbose)
+        result = match.run()
+
+        scores = match.scores()
+        for side, idx in enumerate(order):
+            stats['discs'][idx] += scores[side] - scores[1 - side]
+            stats['time'][idx] += match.times[side]
+            stats['overtime'][idx] += match.overtime[side]
+        if result == 2:
+            stats['draws'] += 1
+        else:
+            stats['wins'][order[result]] += 1
+
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plays Othello games between two players in this process.')
+    parser.add_argument('players', metavar='player', type=str, nargs=2,
+                        help='Player directory, optionally followed by options (e.g. player_alpha_beta_v3:pvs)')
+    parser.add_argument('-g', '--games', type=int, default=2,
+                        help='Number of games, colors alternate between them.')
+    parser.add_argument('-d', '--delay', type=float, metavar='delay', default=1.0,
+                        help='Time given to each move (measured, not enforced).')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Shows the players\' output and the board after each move.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = play_games(args.players, args.games, args.delay, args.verbose)
+    duration = time.perf_counter() - start
+
+    print('%d games in %.1fs (%.1f games/minute)' % (args.games, duration, args.games * 60 / duration))
+    for idx, spec in enumerate(args.players):
+        print('%-30s wins: %d, draws: %d, discs: %+d, time: %.1fs, moves over the delay: %d' % (
+            spec, result['wins'][idx], result['draws'], result['discs'][idx], result['time'][idx],
+            result['overtime'][idx]))
@@ -1,9 +1,9 @@
-import heapq
 import sys
 
-from common import board
-from player_alpha_beta.monitor_performance import MonitorPerformance
-from player_alpha_beta.move_score import MoveScore
+from common import bitboard as board
+from common import profiler
+from common.move_ordering import MoveOrdering
+from common.profiler import MonitorPerformance
 
 
 class AlphaBeta:
@@ -22,6 +22,10 @@ class AlphaBeta:
         self.pruning_counter = 0
         self.node_expands_counter = 0
 
+        self.move_ordering = MoveOrdering()
+        self.root_depth = 0
+
+    @profiler.timed('evaluation')
     def __get_board_score(self, board):
         scores = [board.piece_count[self.my_color], board.piece_count[self.opponent_color]]
         score = scores[0] - scores[1]
@@ -47,35 +51,39 @@ class AlphaBeta:
 
         best_move = (-1, -1)
 
+        self.root_depth = max_depth
+
         if len(self.available_moves) > 0:  # se existe algum movimento possivel
-            for move in self.get_ordered_best_moves_for_player(self.board):  # para cada movimento disponivel
-            #for i, move in enumerate(self.available_moves):  # para cada movimento disponivel
-                imaginary_board = board.from_string(str(self.board))  # cria um tabuleiro "imaginario"
-                score = self.alfa_beta_max(imaginary_board, alfa, beta, max_depth)
+            for move in self.move_ordering.order(self.available_moves, 0):  # para cada movimento disponivel
+                undo = self.board.make_move(move, self.my_color)
+                self.node_expands_counter += 1
+                score = self.alfa_beta_min(self.board, alfa, beta, max_depth - 1)
+                self.board.unmake_move(undo)
 
                 if score > v:
                     v = score
                     best_move = move
+                alfa = max(alfa, v)
 
         self.show_move_result(best_move)
 
         return best_move
 
+    @profiler.timed('search')
     def alfa_beta_max(self, a_board, alfa, beta, max_depth):
-        if (len(a_board.legal_moves(self.my_color)) > 0) and (max_depth > 0):
+        if (max_depth > 0) and (len(a_board.legal_moves(self.my_color)) > 0):
             depth = max_depth - 1
-            #for move in self.get_ordered_best_moves_for_oponent(a_board):
-            #for move in self.get_ordered_best_moves_for_player(a_board):
-            #for i, move in enumerate(a_board.legal_moves(self.my_color)):
-            for move in a_board.legal_moves(self.my_color):
-                imaginary_board = board.from_string(str(a_board))
-                imaginary_board.process_move(move, self.my_color)
+            ply = self.root_depth - max_depth
+            for move in self.move_ordering.order(a_board.legal_moves(self.my_color), ply):
+                undo = a_board.make_move(move, self.my_color)  # joga no proprio tabuleiro e desfaz depois
 
                 self.node_expands_counter += 1
-                v = self.alfa_beta_min(imaginary_board, alfa, beta, depth)
+                v = self.alfa_beta_min(a_board, alfa, beta, depth)
+                a_board.unmake_move(undo)
                 alfa = max(v, alfa)
                 if beta < alfa:
                     self.pruning_counter += 1
+                    self.move_ordering.record_cutoff(move, ply, max_depth)
                     #print("Nós podados na profundidade [" + str(max_depth) + "]=" + str(len(a_board.legal_moves(self.my_color)) - i) + " - MAX")
                     return alfa
             return alfa
@@ -83,22 +91,22 @@ class AlphaBeta:
             score = self.__get_board_score(a_board)
             return score
 
+    @profiler.timed('search')
     def alfa_beta_min(self, a_board, alfa, beta, max_depth):
-        if (len(a_board.legal_moves(self.opponent_color)) > 0) and (max_depth > 0):
+        if (max_depth > 0) and (len(a_board.legal_moves(self.opponent_color)) > 0):
             depth = max_depth - 1
-            #for move in self.get_ordered_best_moves_for_player(a_board):
-            #for move in self.get_ordered_best_moves_for_oponent(a_board):
-            #for i, move in enumerate(a_board.legal_moves(self.opponent_color)):
-            for move in a_board.legal_moves(self.opponent_color):
-                imaginary_board = board.from_string(str(a_board))
-                imaginary_board.process_move(move, self.opponent_color)
+            ply = self.root_depth - max_depth
+            for move in self.move_ordering.order(a_board.legal_moves(self.opponent_color), ply):
+                undo = a_board.make_move(move, self.opponent_color)  # joga no proprio tabuleiro e desfaz depois
 
                 self.node_expands_counter += 1
-                v = self.alfa_beta_max(imaginary_board, alfa, beta, depth)
+                v = self.alfa_beta_max(a_board, alfa, beta, depth)
+                a_board.unmake_move(undo)
 
                 beta = min(v, beta)
                 if alfa >= beta:
                     self.pruning_counter += 1
+                    self.move_ordering.record_cutoff(move, ply, max_depth)
                     # print("Nós podados na profundidade [" + str(max_depth) + "]=" + str(len(a_board.legal_moves(self.opponent_color)) - i) + " - MIN")
                     return beta
             return beta
@@ -112,48 +120,9 @@ class AlphaBeta:
     2: 143;728                               156;533;571373400
     3:  1131; 20488;6857975100                338; 3952;2553580300
     4: 19188;205582;70718427300              19526;180531;136965686300
-    """
-
-    def get_ordered_best_moves_for_player(self, a_board):
-        best_moves = []
-        heapq.heapify(best_moves)
-        for move in a_board.legal_moves(self.my_color):
-            imaginary_board = board.from_string(str(a_board))
-            imaginary_board.process_move(move, self.my_color)
-
-            score = self.__get_board_score(imaginary_board)
-            move_score = MoveScore(move, (-1 * score), self.my_color)
-            heapq.heappush(best_moves, move_score)
-            # score invertido para ordenar pelo de maior valor ;)
-
-        ordered_moves = []
-
-        while len(best_moves) > 0:
-            best_move = heapq.heappop(best_moves)
-            ordered_moves.append(best_move.get_move())
-
-        return ordered_moves
 
-    def get_ordered_best_moves_for_oponent(self, a_board):
-        best_moves = []
-        heapq.heapify(best_moves)
-        for move in a_board.legal_moves(self.opponent_color):
-            imaginary_board = board.from_string(str(a_board))
-            imaginary_board.process_move(move, self.opponent_color)
-
-            score = self.__get_board_score(imaginary_board)
-            move_score = MoveScore(move, score, self.opponent_color)
-            heapq.heappush(best_moves, move_score)
-            # o heap vai ordenar pelo menor valor
-
-        ordered_moves = []
-
-        # o melhor movimento do oponente é o que ao jogador menos pontos
-        while len(best_moves) > 0:
-            best_move = heapq.heappop(best_moves)
-            ordered_moves.append(best_move.get_move())
-
-        return ordered_moves
+    Medidas reproduzíveis (nós, podas, tempo e nós/s em posições fixas): python -m common.benchmark
+    """
 
     #se o movimento é uma das bordas recebe prioridade
     def is_move_on_corner(self, move):
@@ -176,6 +145,17 @@ class AlphaBeta:
         if move[0] == 6 & (move[1] > 0 & move[1 < 7]):
             return True
 
+def choose_move(a_board, color, time_left):
+    """
+    In-process player interface (see match.py)
+    :param a_board: board of the current position (common.board.Board or common.bitboard.BitBoard)
+    :param color: 'black' or 'white'
+    :param time_left: seconds available for the move (the search has a fixed depth)
+    :return: (int, int)
+    """
+    return AlphaBeta(board.from_string(str(a_board)), color).next_move_alfa_beta(2)
+
+
 if __name__ == '__main__':
     b = board.from_file(sys.argv[1])
     f = open('move.txt', 'w')
@@ -1,17 +1,20 @@
 import sys
 from time import perf_counter_ns
 
-from player_alpha_beta_v2.common import board
-from player_alpha_beta_v2.monitor_performance import MonitorPerformance
+from common import bitboard as board
+from common import book
+from common import engine
+from common import profiler
+from common.endgame import EndgameSolver
+from common.move_ordering import MoveOrdering
+from common.patterns import PatternEvaluation
+from common.profiler import MonitorPerformance
+from common.time_manager import SearchTimeout, TimeManager, move_budget
+from common.transposition import TranspositionTable
 
 
 class AlphaBeta:
-    top_left = (0, 0)
-    top_right = (0, 7)
-    bottom_left = (7, 0)
-    bottom_right = (7, 7)
-
-    def __init__(self, board, my_color):
+    def __init__(self, board, my_color, time_manager=None, transposition_table=None):
         self.my_color = board.WHITE if my_color == 'white' else board.BLACK
         self.opponent_color = board.opponent(self.my_color)
         self.board = board
@@ -20,41 +23,30 @@ class AlphaBeta:
         self.pruning_counter = 0
         self.node_expands_counter = 0
 
-        self.start_time = perf_counter_ns()
-        self.max_time = 4.7 * 10 ** 9
-        self.danger_zone = self.get_danger_zone()
-        self.borders_zone = self.get_borders_zone()
-
-    def get_danger_zone(self):
-        zone = [(1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (2, 1), (2, 6), (3, 1), (3, 6), (4, 1), (4, 6), (5, 1),
-                (5, 6), (6, 1), (6, 2), (6, 3), (6, 4), (6, 5), (6, 6)]
-        if len(zone) < 0:  # hardcoded para não calcular denovo
-            for col in range(1, 7):  # coluna
-                for row in range(1, 7):  # lina
-                    if col == 1 or col == 6:
-                        zone.append((col, row))
-                    elif row == 1 or row == 6:
-                        zone.append((col, row))
-        return zone
-
-    def get_borders_zone(self):
-        zone = [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (0, 6), (0, 7), (1, 0), (1, 7), (2, 0), (2, 7), (3, 0),
-                (3, 7), (4, 0), (4, 7), (5, 0), (5, 7), (6, 0), (6, 7), (7, 0), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5),
-                (7, 6), (7, 7)]
-        if len(zone) < 0:  # hardcoded para não calcular denovo
-            for col in range(0, 8):  # coluna
-                for row in range(0, 8):  # lina
-                    if col == 0 or col == 7:
-                        zone.append((col, row))
-                    elif row == 0 or row == 7:
-                        zone.append((col, row))
-        return zone
+        # o modo engine passa o tempo da jogada (que pode estar em ponder, no tempo do oponente)
+        self.time_manager = time_manager if time_manager is not None else TimeManager(4.7 * 10 ** 9)
+        self.start_time = self.time_manager.start_time
+        self.max_time = self.time_manager.max_time
+        self.completed_depth = 0
+
+        # avaliação por tabelas de padrões, atualizada pelo tabuleiro a cada movimento
+        self.evaluation = PatternEvaluation(board)
+
+        # guarda as posições já avaliadas entre iterações e entre movimentos da raiz
+        # (e entre jogadas, quando a tabela é mantida pelo modo engine)
+        self.transposition_table = transposition_table if transposition_table is not None else TranspositionTable()
+        self.move_ordering = MoveOrdering()
+        self.root_depth = 0
 
     def __get_board_score(self, board):
         scores = [board.piece_count[self.my_color], board.piece_count[self.opponent_color]]
         score = scores[0] - scores[1]
         return score
 
+    @profiler.timed('evaluation')
+    def evaluate(self, a_board):
+        return self.evaluation.evaluate(a_board, self.my_color)
+
     def show_move_result(self, selected_move):
         before_move = self.__get_board_score(self.board)
         self.board.process_move(selected_move, self.my_color)
@@ -64,152 +56,238 @@ class AlphaBeta:
         print("Score after movement:  " + str(after_move))
         print("Node expand count:  " + str(self.node_expands_counter))
         print("Pruning count:  " + str(self.pruning_counter))
+        print("Completed depth:  " + str(self.completed_depth))
+        print(self.transposition_table.stats())
         print("Selected move:  " + str(selected_move))
 
         return selected_move
 
     def next_move_alfa_beta(self, max_depth):
-        alfa = float('-inf')
-        beta = float('+inf')
-
-        v = float('-inf')
         best_move = (-1, -1)
 
         if len(self.available_moves) < 1:
             return best_move
 
+        book_move = self.next_move_book()
+        if book_move is not None:
+            self.show_move_result(book_move)
+            return book_move
+
+        # no fim do jogo a posição é resolvida de forma exata, sem heurística
+        endgame_move = self.next_move_endgame()
+        if endgame_move is not None:
+            self.show_move_result(endgame_move)
+            return endgame_move
+
+        # aprofundamento iterativo: só o resultado de uma profundidade completa é usado
+        best_move = self.available_moves[0]
         depth = 1
         while depth <= max_depth:
-            for move in self.board.legal_moves(self.my_color):
-                with MonitorPerformance(False, "Execution time for depth: " + str(depth)):
-                    imaginary_board = board.from_string(str(self.board))
-                    score = self.alfa_beta_max(imaginary_board, alfa, beta, depth)
-                    score += self.move_eval(imaginary_board, move, self.my_color)
-                    if score > v:
-                        v = score
-                        best_move = move
+            nodes_before = self.node_expands_counter
+            iteration_start = perf_counter_ns()
+            try:
+                with MonitorPerformance(False, "Execution time for depth: " + str(depth), "iteration"):
+                    best_move = self.search_root(depth, best_move)
+            except SearchTimeout:
+                break  # iteração incompleta é descartada
+            self.move_ordering.age()
+
+            self.completed_depth = depth
+            self.time_manager.record_iteration(self.node_expands_counter - nodes_before,
+                                               perf_counter_ns() - iteration_start)
+
+            # não adianta ir além do fim do jogo nem começar uma profundidade que não vai terminar
+            if depth >= self.board.piece_count[self.board.EMPTY] \
+                    or not self.time_manager.can_start_next_iteration():
+                break
             depth += 1
 
         self.show_move_result(best_move)
 
         return best_move
 
+    def next_move_book(self):
+        # na abertura a jogada vem do livro, sem gastar tempo de busca
+        opening_book = book.default_book()
+        if opening_book is None:
+            return None
+
+        move = opening_book.best_move(self.board, self.my_color)
+        if move is not None:
+            print("Book move: " + str(move))
+        return move
+
+    def next_move_endgame(self):
+        empties = self.board.piece_count[self.board.EMPTY]
+        if empties > EndgameSolver.WIN_LOSS_DRAW_EMPTIES:
+            return None
+
+        # o resolvedor usa no máximo metade do tempo, se não terminar a busca heurística assume
+        solver = EndgameSolver(self.time_manager.portion(0.5))
+        try:
+            score, move = solver.solve_board(self.board, self.my_color, exact=empties <= EndgameSolver.EXACT_EMPTIES)
+        except SearchTimeout:
+            return None
+        finally:
+            self.node_expands_counter += solver.nodes
+
+        print("Endgame solved, score: " + str(score))
+        return move
+
+    def search_root(self, depth, pv_move):
+        alfa = float('-inf')
+        beta = float('+inf')
+
+        v = float('-inf')
+        best_move = pv_move
+        self.root_depth = depth
+
+        # o melhor movimento da iteração anterior é avaliado primeiro
+        for move in self.move_ordering.order(self.board.legal_moves(self.my_color), 0, pv_move):
+            undo = self.board.make_move(move, self.my_color)
+            self.node_expands_counter += 1
+
+            # desfaz a jogada mesmo se o tempo acabar no meio da busca
+            try:
+                score = self.alfa_beta_min(self.board, alfa, beta, depth - 1)
+            finally:
+                self.board.unmake_move(undo)
+
+            if score > v:
+                v = score
+                best_move = move
+            alfa = max(alfa, v)
+
+        return best_move
+
     def cut_test(self, a_board, alfa, beta, max_depth):
-        # termina a execução se passou do tempo maximo
-        if (perf_counter_ns() - self.start_time) > self.max_time:
-            return True
+        # interrompe a iteração se passou do tempo maximo
+        self.time_manager.check()
 
-        if len(a_board.legal_moves(self.my_color)) > 0 and (max_depth > 0):
+        if (max_depth > 0) and len(a_board.legal_moves(self.my_color)) > 0:
             return False
         else:
             return True
 
+    @profiler.timed('search')
     def alfa_beta_max(self, a_board, alfa, beta, max_depth):
         if self.cut_test(a_board, alfa, beta, max_depth):
-            score = self.__get_board_score(a_board)
-            return score
+            return self.evaluate(a_board)
+
+        key = a_board.hash
+        tt_score, tt_move = self.transposition_table.lookup(key, max_depth, alfa, beta)
+        if tt_score is not None:
+            return tt_score
+
+        alfa_start = alfa
+        best_v = float('-inf')
+        best_move = None
 
-        for move in a_board.legal_moves(self.my_color):
-            imaginary_board = board.from_string(str(a_board))
-            imaginary_board.process_move(move, self.my_color)
+        ply = self.root_depth - max_depth
+        for move in self.move_ordering.order(a_board.legal_moves(self.my_color), ply, tt_move):
+            undo = a_board.make_move(move, self.my_color)  # joga no proprio tabuleiro e desfaz depois
 
             self.node_expands_counter += 1
 
-            v = self.alfa_beta_min(imaginary_board, alfa, beta, max_depth - 1)
-            v += self.move_eval(imaginary_board, move, self.my_color)
+            try:
+                v = self.alfa_beta_min(a_board, alfa, beta, max_depth - 1)
+            finally:
+                a_board.unmake_move(undo)
+
+            if v > best_v:
+                best_v, best_move = v, move
 
             alfa = max(v, alfa)
             if beta < alfa:
                 self.pruning_counter += 1
+                self.move_ordering.record_cutoff(move, ply, max_depth)
+                self.transposition_table.store(key, max_depth, alfa, alfa_start, beta, best_move)
                 return alfa
 
+        self.transposition_table.store(key, max_depth, alfa, alfa_start, beta, best_move)
         return alfa
 
+    @profiler.timed('search')
     def alfa_beta_min(self, a_board, alfa, beta, max_depth):
         if self.cut_test(a_board, alfa, beta, max_depth):
-            score = self.__get_board_score(a_board)
-            return score
+            return self.evaluate(a_board)
+
+        key = a_board.hash
+        tt_score, tt_move = self.transposition_table.lookup(key, max_depth, alfa, beta)
+        if tt_score is not None:
+            return tt_score
 
-        for move in a_board.legal_moves(self.opponent_color):
-            imaginary_board = board.from_string(str(a_board))
-            imaginary_board.process_move(move, self.opponent_color)
+        beta_start = beta
+        best_v = float('+inf')
+        best_move = None
+
+        ply = self.root_depth - max_depth
+        for move in self.move_ordering.order(a_board.legal_moves(self.opponent_color), ply, tt_move):
+            undo = a_board.make_move(move, self.opponent_color)
 
             self.node_expands_counter += 1
-            v = self.alfa_beta_max(imaginary_board, alfa, beta, max_depth - 1)
-            v += self.move_eval(imaginary_board, move, self.opponent_color)
+            try:
+                v = self.alfa_beta_max(a_board, alfa, beta, max_depth - 1)
+            finally:
+                a_board.unmake_move(undo)
+
+            if v < best_v:
+                best_v, best_move = v, move
 
             beta = min(v, beta)
             if alfa >= beta:
                 self.pruning_counter += 1
+                self.move_ordering.record_cutoff(move, ply, max_depth)
+                self.transposition_table.store(key, max_depth, beta, alfa, beta_start, best_move)
                 return beta
+
+        self.transposition_table.store(key, max_depth, beta, alfa, beta_start, best_move)
         return beta
 
-    def move_eval(self, a_board, move, color):
-        score = 0
-        score += self.is_move_on_corner(move)
-        # score += self.off_center_move(move) # não deu muito certo
-        score += self.is_move_in_danger_zone(move)
-        score += self.is_move_in_borders(move)
-        score += self.check_opponent_next_move(a_board, move, color)
 
-        return score
+def choose_move(a_board, color, time_left):
+    """
+    In-process player interface (see match.py)
+    :param a_board: board of the current position (common.board.Board or common.bitboard.BitBoard)
+    :param color: 'black' or 'white'
+    :param time_left: seconds available for the move
+    :return: (int, int)
+    """
+    # o tempo da jogada é o delay: mesma margem de segurança das jogadas pelo servidor
+    budget = move_budget(time_left, time_left, a_board.piece_count[a_board.EMPTY])
+    patrick = AlphaBeta(board.from_string(str(a_board)), color, TimeManager(budget))
+    return patrick.next_move_alfa_beta(60)
 
-    def check_opponent_next_move(self, a_board, move, color):
-        score = 0
-        a_board.process_move(move, color)
 
-        opponent_next_moves = a_board.legal_moves(a_board.opponent(color))
+def engine_mode():
+    # o processo fica vivo durante a partida e a tabela de transposição é mantida entre jogadas
+    transposition_table = TranspositionTable()
 
-        if len(opponent_next_moves) < 3:  # se oponente não tem poucos  movimentos é bom
-            score += 5
+    def search_move(a_board, color, time_manager):
+        patrick = AlphaBeta(a_board, color, time_manager, transposition_table)
+        return patrick.next_move_alfa_beta(60)
 
-        if len(opponent_next_moves) < 1:  # se oponente não tem mais movimentos é bom
-            score += 10
+    # a resposta esperada do oponente é a melhor jogada guardada na tabela
+    def predict_reply(a_board, color):
+        return transposition_table.best_move(a_board.hash)
 
-        for opponent_move in opponent_next_moves:
-            if self.is_move_on_corner(opponent_move):  # se oponente pode usar canto é ruim
-                score -= 2
-                return score
+    engine.serve(search_move, predict_reply)
 
-            if self.is_move_in_borders(opponent_move):  # se oponente pode usar borda é ruim
-                score -= 1
-                return score
-        return score
 
-    # se o movimento é uma das bordas recebe prioridade
-    def is_move_on_corner(self, move):
-        if move == self.top_left \
-                or move == self.top_right \
-                or move == self.bottom_left \
-                or move == self.bottom_right:
-            return 5
-        return 0
-
-    # movimento que se afasta do centro recebe uma penalidade
-    def off_center_move(self, move):
-        center = 3.5
-        penalty1 = move[0] - center
-        penalty2 = move[1] - center
-        return (abs(penalty1) + abs(penalty2)) * -1
-
-    def is_move_in_danger_zone(self, move):
-        if move in self.danger_zone:
-            return -2
-        return 0
-
-    def is_move_in_borders(self, move):
-        if move in self.borders_zone:
-            return 3
-        return 0
-
-
-if __name__ == '__main__':
+if __name__ == '__main__' and sys.argv[1:2] == ['engine']:
+    engine_mode()
+elif __name__ == '__main__':
     b = board.from_file(sys.argv[1])
     f = open('move.txt', 'w')
-    patrick = AlphaBeta(b, sys.argv[2])
+
+    # o servidor passa o relógio do jogador e o incremento depois da cor
+    time_manager = None
+    if len(sys.argv) > 4:
+        time_manager = TimeManager(move_budget(float(sys.argv[3]), float(sys.argv[4]), b.piece_count[b.EMPTY]))
+    patrick = AlphaBeta(b, sys.argv[2], time_manager)
 
     with MonitorPerformance(True):
-        movement = patrick.next_move_alfa_beta(4)
+        movement = patrick.next_move_alfa_beta(60)
 
     f.write('%d,%d' % movement)
 
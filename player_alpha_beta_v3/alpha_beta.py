@@ -1,8 +1,17 @@
 import sys
 from time import perf_counter_ns
 
-from common import board
-from player_alpha_beta.monitor_performance import MonitorPerformance
+from common import bitboard as board
+from common import book
+from common import engine
+from common import profiler
+from common.endgame import EndgameSolver
+from common.move_ordering import MoveOrdering
+from common.parallel import ParallelRootSearch, WorkerPool
+from common.profiler import MonitorPerformance
+from common.pvs import PVSEngine
+from common.time_manager import SearchTimeout, TimeManager, move_budget
+from common.transposition import TranspositionTable
 
 
 class AlphaBeta:
@@ -11,17 +20,32 @@ class AlphaBeta:
     bottom_left = (7, 0)
     bottom_right = (7, 7)
 
-    def __init__(self, board, my_color):
+    # modos de busca
+    ALFA_BETA = 'alfa_beta'
+    PVS = 'pvs'
+    PARALLEL = 'parallel'
+    MODES = [ALFA_BETA, PVS, PARALLEL]
+
+    def __init__(self, board, my_color, mode=ALFA_BETA, time_manager=None, transposition_table=None,
+                 worker_pool=None):
         self.my_color = board.WHITE if my_color == 'white' else board.BLACK
         self.opponent_color = board.opponent(self.my_color)
         self.board = board
+        self.mode = mode
 
         self.available_moves = board.legal_moves(self.my_color)
         self.pruning_counter = 0
         self.node_expands_counter = 0
 
-        self.start_time = perf_counter_ns()
-        self.max_time = 4.7 * 10 ** 9
+        self.move_ordering = MoveOrdering()
+        self.transposition_table = transposition_table  # usada pelo modo pvs
+        self.worker_pool = worker_pool  # processos do modo parallel, mantidos entre jogadas
+        self.root_depth = 0
+
+        # o modo engine passa o tempo da jogada (que pode estar em ponder, no tempo do oponente)
+        self.time_manager = time_manager if time_manager is not None else TimeManager(4.7 * 10 ** 9)
+        self.start_time = self.time_manager.start_time
+        self.max_time = self.time_manager.max_time
         self.danger_zone = [(1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (2, 1), (2, 6), (3, 1), (3, 6), (4, 1), (4, 6), (5, 1), (5, 6), (6, 1), (6, 2), (6, 3), (6, 4), (6, 5), (6, 6)]
 
     def danger_zone(self):
@@ -35,6 +59,7 @@ class AlphaBeta:
         return zone
 
 
+    @profiler.timed('evaluation')
     def __get_board_score(self, board):
         scores = [board.piece_count[self.my_color], board.piece_count[self.opponent_color]]
         score = scores[0] - scores[1]
@@ -60,55 +85,137 @@ class AlphaBeta:
 
         best_move = (-1, -1)
 
+        self.root_depth = max_depth
+
+        # no fim do jogo a posição é resolvida de forma exata
+        endgame_move = self.next_move_endgame()
+        if endgame_move is not None:
+            self.show_move_result(endgame_move)
+            return endgame_move
+
         if len(self.available_moves) > 0:  # se existe algum movimento possivel
-            for move in self.available_moves:  # para cada movimento disponivel
-                imaginary_board = board.from_string(str(self.board))  # cria um tabuleiro "imaginario"
-                score = self.alfa_beta_max(imaginary_board, alfa, beta, max_depth)
+            for move in self.move_ordering.order(self.available_moves, 0):  # para cada movimento disponivel
+                undo = self.board.make_move(move, self.my_color)
+                self.node_expands_counter += 1
+                score = self.alfa_beta_min(self.board, alfa, beta, max_depth - 1)
+                self.board.unmake_move(undo)
 
-                #score += self.move_eval(imaginary_board, move)
                 if score > v:
                     v = score
                     best_move = move
+                alfa = max(alfa, v)
 
         self.show_move_result(best_move)
 
         return best_move
 
+    def next_move_pvs(self, max_depth):
+        # no fim do jogo a posição é resolvida de forma exata
+        endgame_move = self.next_move_endgame()
+        if endgame_move is not None:
+            self.show_move_result(endgame_move)
+            return endgame_move
+
+        # busca negamax PVS com aprofundamento iterativo limitado pelo tempo
+        search = PVSEngine(self.board, self.my_color, transposition_table=self.transposition_table,
+                           move_ordering=self.move_ordering, time_manager=self.time_manager)
+        best_move = search.search(max_depth)
+
+        self.node_expands_counter = search.nodes
+        self.pruning_counter = search.prunings
+        print(search.stats())
+
+        self.show_move_result(best_move)
+
+        return best_move
+
+    def next_move_parallel(self, max_depth):
+        # no fim do jogo a posição é resolvida de forma exata
+        endgame_move = self.next_move_endgame()
+        if endgame_move is not None:
+            self.show_move_result(endgame_move)
+            return endgame_move
+
+        # movimentos da raiz divididos entre processos, até acabar o tempo (ou o stop do servidor)
+        search = ParallelRootSearch(self.board, self.my_color, time_manager=self.time_manager, pool=self.worker_pool)
+        best_move = search.search(max_depth)
+
+        self.node_expands_counter = search.nodes
+        print("Parallel depth: %d, workers: %d" % (search.completed_depth, search.workers))
+
+        self.show_move_result(best_move)
+
+        return best_move
+
+    def next_move_book(self):
+        # na abertura a jogada vem do livro, sem gastar tempo de busca
+        opening_book = book.default_book()
+        if opening_book is None:
+            return None
+
+        move = opening_book.best_move(self.board, self.my_color)
+        if move is not None:
+            print("Book move: " + str(move))
+        return move
+
+    def next_move_endgame(self):
+        empties = self.board.piece_count[self.board.EMPTY]
+        if len(self.available_moves) < 1 or empties > EndgameSolver.WIN_LOSS_DRAW_EMPTIES:
+            return None
+
+        # o resolvedor usa no máximo metade do tempo, se não terminar a busca normal assume
+        solver = EndgameSolver(self.time_manager.portion(0.5))
+        try:
+            score, move = solver.solve_board(self.board, self.my_color, exact=empties <= EndgameSolver.EXACT_EMPTIES)
+        except SearchTimeout:
+            return None
+        finally:
+            self.node_expands_counter += solver.nodes
+
+        print("Endgame solved, score: " + str(score))
+        return move
+
+    @profiler.timed('search')
     def alfa_beta_max(self, a_board, alfa, beta, max_depth):
-        if (len(a_board.legal_moves(self.my_color)) > 0) \
-                and (max_depth > 0) \
+        if (max_depth > 0) \
+                and (len(a_board.legal_moves(self.my_color)) > 0) \
                 and (perf_counter_ns() - self.start_time) < self.max_time:
             depth = max_depth - 1
-            for move in a_board.legal_moves(self.my_color):
-                imaginary_board = board.from_string(str(a_board))
-                imaginary_board.process_move(move, self.my_color)
+            ply = self.root_depth - max_depth
+            for move in self.move_ordering.order(a_board.legal_moves(self.my_color), ply):
+                undo = a_board.make_move(move, self.my_color)  # joga no proprio tabuleiro e desfaz depois
 
                 self.node_expands_counter += 1
-                v = self.alfa_beta_min(imaginary_board, alfa, beta, depth)
+                v = self.alfa_beta_min(a_board, alfa, beta, depth)
+                a_board.unmake_move(undo)
                 alfa = max(v, alfa)
                 if beta < alfa:
                     self.pruning_counter += 1
+                    self.move_ordering.record_cutoff(move, ply, max_depth)
                     return alfa
             return alfa
         else:
             score = self.__get_board_score(a_board)
             return score
 
+    @profiler.timed('search')
     def alfa_beta_min(self, a_board, alfa, beta, max_depth):
-        if (len(a_board.legal_moves(self.opponent_color)) > 0) \
-                and (max_depth > 0) \
+        if (max_depth > 0) \
+                and (len(a_board.legal_moves(self.opponent_color)) > 0) \
                 and (perf_counter_ns() - self.start_time) < self.max_time:
             depth = max_depth - 1
-            for move in a_board.legal_moves(self.opponent_color):
-                imaginary_board = board.from_string(str(a_board))
-                imaginary_board.process_move(move, self.opponent_color)
+            ply = self.root_depth - max_depth
+            for move in self.move_ordering.order(a_board.legal_moves(self.opponent_color), ply):
+                undo = a_board.make_move(move, self.opponent_color)  # joga no proprio tabuleiro e desfaz depois
 
                 self.node_expands_counter += 1
-                v = self.alfa_beta_max(imaginary_board, alfa, beta, depth)
+                v = self.alfa_beta_max(a_board, alfa, beta, depth)
+                a_board.unmake_move(undo)
 
                 beta = min(v, beta)
                 if alfa >= beta:
                     self.pruning_counter += 1
+                    self.move_ordering.record_cutoff(move, ply, max_depth)
                     return beta
             return beta
         else:
@@ -148,13 +255,79 @@ class AlphaBeta:
         return 0
 
 
-if __name__ == '__main__':
+def next_move(patrick):
+    book_move = patrick.next_move_book()
+    if book_move is not None:
+        return patrick.show_move_result(book_move)
+
+    if patrick.mode == AlphaBeta.PVS:
+        return patrick.next_move_pvs(60)
+    if patrick.mode == AlphaBeta.PARALLEL:
+        return patrick.next_move_parallel(60)
+    return patrick.next_move_alfa_beta(2)
+
+
+# processos do modo parallel do choose_move, iniciados na primeira jogada e reaproveitados
+_choose_move_pool = None
+
+
+def choose_move(a_board, color, time_left, mode=AlphaBeta.ALFA_BETA):
+    """
+    In-process player interface (see match.py)
+    :param a_board: board of the current position (common.board.Board or common.bitboard.BitBoard)
+    :param color: 'black' or 'white'
+    :param time_left: seconds available for the move
+    :param mode: one of AlphaBeta.MODES
+    :return: (int, int)
+    """
+    # o tempo da jogada é o delay: mesma margem de segurança das jogadas pelo servidor
+    budget = move_budget(time_left, time_left, a_board.piece_count[a_board.EMPTY])
+
+    global _choose_move_pool
+    if mode == AlphaBeta.PARALLEL and _choose_move_pool is None:
+        _choose_move_pool = WorkerPool()
+    return next_move(AlphaBeta(board.from_string(str(a_board)), color, mode, TimeManager(budget),
+                               worker_pool=_choose_move_pool if mode == AlphaBeta.PARALLEL else None))
+
+
+def engine_mode(mode):
+    # o processo fica vivo durante a partida e a tabela de transposição é mantida entre jogadas,
+    # assim como os processos do modo parallel
+    transposition_table = TranspositionTable()
+    worker_pool = WorkerPool() if mode == AlphaBeta.PARALLEL else None
+
+    def search_move(a_board, color, time_manager):
+        return next_move(AlphaBeta(a_board, color, mode, time_manager, transposition_table, worker_pool))
+
+    # a resposta esperada do oponente é a melhor jogada guardada na tabela,
+    # que só o modo pvs preenche: nos outros modos o jogador não pondera
+    def predict_reply(a_board, color):
+        return transposition_table.best_move(a_board.hash)
+
+    try:
+        engine.serve(search_move, predict_reply if mode == AlphaBeta.PVS else None)
+    finally:
+        if worker_pool is not None:
+            worker_pool.close()
+
+
+if __name__ == '__main__' and sys.argv[1:2] == ['engine']:
+    modes = [arg for arg in sys.argv[2:] if arg in AlphaBeta.MODES]
+    engine_mode(modes[-1] if modes else AlphaBeta.ALFA_BETA)
+elif __name__ == '__main__':
     b = board.from_file(sys.argv[1])
     f = open('move.txt', 'w')
-    patrick = AlphaBeta(b, sys.argv[2])
+    modes = [arg for arg in sys.argv[3:] if arg in AlphaBeta.MODES]
+
+    # o servidor passa o relógio do jogador e o incremento depois da cor
+    clock = [float(arg) for arg in sys.argv[3:] if arg not in AlphaBeta.MODES]
+    time_manager = None
+    if len(clock) >= 2:
+        time_manager = TimeManager(move_budget(clock[0], clock[1], b.piece_count[b.EMPTY]))
+    patrick = AlphaBeta(b, sys.argv[2], modes[-1] if modes else AlphaBeta.ALFA_BETA, time_manager)
 
     with MonitorPerformance():
-        movement = patrick.next_move_alfa_beta(2)
+        movement = next_move(patrick)
 
     f.write('%d,%d' % movement)
 
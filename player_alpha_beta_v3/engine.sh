@@ -0,0 +1,2 @@
+#!/bin/bash
+python alpha_beta.py engine pvs
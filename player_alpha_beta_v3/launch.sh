@@ -1,2 +1,2 @@
 #!/bin/bash
-python alpha_beta.py $1 $2
+python alpha_beta.py $1 $2 $3 $4
@@ -1,14 +0,0 @@
-from time import perf_counter_ns
-
-
-class MonitorPerformance:
-    def __init__(self):
-        self.start_time = None
-        self.end_time = None
-
-    def __enter__(self):
-        self.start_time = perf_counter_ns()
-
-    def __exit__(self, type, value, tb):
-        self.end_time = perf_counter_ns()
-        print("{:.2f}".format((self.end_time - self.start_time) * 10**-9) + "s")
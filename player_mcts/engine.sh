@@ -0,0 +1,2 @@
+#!/bin/bash
+python monte_carlo.py engine
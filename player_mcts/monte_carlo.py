@@ -0,0 +1,91 @@
+import sys
+
+from common import bitboard as board
+from common import engine
+from common.mcts import MCTS, NodePool, RootParallelMCTS
+from common.profiler import MonitorPerformance
+from common.time_manager import TimeManager, move_budget
+
+# opções do jogador
+RAVE = 'rave'
+PARALLEL = 'parallel'
+OPTIONS = [RAVE, PARALLEL]
+
+# tempo da jogada quando o servidor não passa o relógio
+DEFAULT_TIME = 4.7 * 10 ** 9
+
+# nós da árvore das jogadas do choose_move, alocados na primeira jogada e reaproveitados
+_choose_move_pool = None
+
+
+def next_move(a_board, color, time_manager, options, pool=None):
+    my_color = a_board.WHITE if color == 'white' else a_board.BLACK
+
+    if PARALLEL in options:
+        # uma árvore por processo, as visitas da raiz são somadas no fim
+        remaining_time = max(0, time_manager.max_time - time_manager.elapsed()) * 10 ** -9
+        search = RootParallelMCTS(a_board, my_color, max_time=remaining_time, rave=RAVE in options)
+    else:
+        search = MCTS(a_board, my_color, time_manager, RAVE in options, pool)
+
+    move = search.search()
+    print(search.stats())
+    print("Selected move:  " + str(move))
+    return move, search
+
+
+def choose_move(a_board, color, time_left, *options):
+    """
+    In-process player interface (see match.py)
+    :param a_board: board of the current position (common.board.Board or common.bitboard.BitBoard)
+    :param color: 'black' or 'white'
+    :param time_left: seconds available for the move
+    :param options: RAVE and/or PARALLEL
+    :return: (int, int)
+    """
+    global _choose_move_pool
+    if _choose_move_pool is None:
+        _choose_move_pool = NodePool()
+
+    # o tempo da jogada é o delay: mesma margem de segurança das jogadas pelo servidor
+    budget = move_budget(time_left, time_left, a_board.piece_count[a_board.EMPTY])
+    move, search = next_move(board.from_string(str(a_board)), color, TimeManager(budget), options, _choose_move_pool)
+    return move
+
+
+def engine_mode(options):
+    # o processo fica vivo durante a partida e os nós da árvore são alocados uma vez só
+    pool = NodePool()
+    last_search = {}
+
+    def search_move(a_board, color, time_manager):
+        move, last_search['search'] = next_move(a_board, color, time_manager, options, pool)
+        return move
+
+    # a resposta esperada do oponente é a mais visitada depois da jogada escolhida
+    def predict_reply(a_board, color):
+        search = last_search.get('search')
+        return search.predicted_reply() if isinstance(search, MCTS) else None
+
+    engine.serve(search_move, predict_reply)
+
+
+if __name__ == '__main__' and sys.argv[1:2] == ['engine']:
+    engine_mode([arg for arg in sys.argv[2:] if arg in OPTIONS])
+elif __name__ == '__main__':
+    b = board.from_file(sys.argv[1])
+    f = open('move.txt', 'w')
+    options = [arg for arg in sys.argv[3:] if arg in OPTIONS]
+
+    # o servidor passa o relógio do jogador e o incremento depois da cor
+    clock = [float(arg) for arg in sys.argv[3:] if arg not in OPTIONS]
+    budget = DEFAULT_TIME
+    if len(clock) >= 2:
+        budget = move_budget(clock[0], clock[1], b.piece_count[b.EMPTY])
+
+    with MonitorPerformance():
+        movement, search = next_move(b, sys.argv[2], TimeManager(budget), options)
+
+    f.write('%d,%d' % movement)
+
+    f.close()
@@ -1,7 +1,8 @@
 import sys
 
-from common import board
-from player_min_max.monitor_performance import MonitorPerformance
+from common import bitboard as board
+from common import profiler
+from common.profiler import MonitorPerformance
 
 
 class MinMax:
@@ -11,7 +12,9 @@ class MinMax:
         self.board = board
 
         self.available_moves = board.legal_moves(self.my_color)
+        self.node_expands_counter = 0
 
+    @profiler.timed('evaluation')
     def __get_board_score(self, board):
         scores = [board.piece_count[self.my_color], board.piece_count[self.opponent_color]]
         score = scores[0] - scores[1]
@@ -23,9 +26,8 @@ class MinMax:
 
         if len(self.available_moves) > 0:  # se existe algum movimento possivel
             for i, move in enumerate(self.available_moves):  # para cada movimento disponivel
-                with MonitorPerformance(False,"evaluating move " + str(i) + "/" + str(len(self.available_moves))):
-                    imaginary_board = board.from_string(str(self.board))  # cria um tabuleiro "imaginario"
-                    score = self.min_max_max(imaginary_board, max_depth)
+                with MonitorPerformance(False, "evaluating move " + str(i) + "/" + str(len(self.available_moves)), "root move"):
+                    score = self.min_max_max(self.board, max_depth)
 
                     if v < score:
                         v = score
@@ -42,22 +44,25 @@ class MinMax:
 
         print("Score before movement: " + str(before_move))
         print("Score after movement:  " + str(after_move))
+        print("Node expand count:  " + str(self.node_expands_counter))
 
         return selected_move
 
+    @profiler.timed('search')
     def min_max_max(self, a_board, max_depth):
         # se existe algum movimento possivel
-        if (len(a_board.legal_moves(self.my_color)) > 0) and (max_depth > 0):
+        if (max_depth > 0) and (len(a_board.legal_moves(self.my_color)) > 0):
             depth = max_depth - 1
 
             v = float('-inf')
 
             for move in a_board.legal_moves(self.my_color):  # para cada movimento disponivel
-                imaginary_board = board.from_string(str(a_board))
-                imaginary_board.process_move(move, self.my_color)  # executa o movimento
-                #imaginary_board.print_board()
+                undo = a_board.make_move(move, self.my_color)  # executa o movimento
+                self.node_expands_counter += 1
+                #a_board.print_board()
 
-                score = self.min_max_min(imaginary_board, depth)
+                score = self.min_max_min(a_board, depth)
+                a_board.unmake_move(undo)  # desfaz o movimento
                 v = max(v, score)
 
             return v
@@ -65,19 +70,21 @@ class MinMax:
             score = self.__get_board_score(a_board)
             return score
 
+    @profiler.timed('search')
     def min_max_min(self, a_board, max_depth):
         # se existe algum movimento possivel do oponente
-        if (len(a_board.legal_moves(self.opponent_color)) > 0) and (max_depth > 0):
+        if (max_depth > 0) and (len(a_board.legal_moves(self.opponent_color)) > 0):
             depth = max_depth - 1
 
             v = float('+inf')
 
             for opponent_move in a_board.legal_moves(self.opponent_color):  # para cada movimento disponivel do oponente
-                imaginary_board = board.from_string(str(a_board))
-                imaginary_board.process_move(opponent_move, self.opponent_color)  # executa o movimento
-                #imaginary_board.print_board()
+                undo = a_board.make_move(opponent_move, self.opponent_color)  # executa o movimento
+                self.node_expands_counter += 1
+                #a_board.print_board()
 
-                score = self.min_max_max(imaginary_board, depth)
+                score = self.min_max_max(a_board, depth)
+                a_board.unmake_move(undo)  # desfaz o movimento
                 v = min(v, score)
 
             return v
@@ -86,6 +93,17 @@ class MinMax:
             return score
 
 
+def choose_move(a_board, color, time_left):
+    """
+    In-process player interface (see match.py)
+    :param a_board: board of the current position (common.board.Board or common.bitboard.BitBoard)
+    :param color: 'black' or 'white'
+    :param time_left: seconds available for the move (the search has a fixed depth)
+    :return: (int, int)
+    """
+    return MinMax(board.from_string(str(a_board)), color).next_move_min_max(2)
+
+
 if __name__ == '__main__':
     b = board.from_file(sys.argv[1])
     f = open('move.txt', 'w')
@@ -15,6 +15,17 @@ def make_move(the_board, color):
     return random.choice(legal_moves) if len(legal_moves) > 0 else (-1, -1)
 
 
+def choose_move(a_board, color, time_left):
+    """
+    In-process player interface (see match.py)
+    :param a_board: board of the current position
+    :param color: 'black' or 'white'
+    :param time_left: seconds available for the move (not needed here)
+    :return: (int, int)
+    """
+    return make_move(a_board, color)
+
+
 if __name__ == '__main__':
     b = board.from_file(sys.argv[1])
     f = open('move.txt', 'w')
@@ -10,23 +10,69 @@ import xml.etree.ElementTree as ET
 import xml.dom.minidom
 
 from common import board
+from common.engine import EngineProcess
+
+
+class Clock(object):
+    """
+    Game clock of a player: a total time plus an increment credited at the start of each move.
+    Without a game clock each move simply gets the increment, the time left unspent is not kept
+    """
+
+    def __init__(self, total, increment, per_move=False):
+        """
+        :param total: seconds for the whole game
+        :param increment: seconds added at each move
+        :param per_move: True when there is no game clock and every move gets exactly the increment
+        """
+        self.remaining = total
+        self.increment = increment
+        self.per_move = per_move
+        self.move_start = None
+
+    def next_move_time(self):
+        """
+        Seconds the player will have for its next move, once start_move credits the increment
+        :return: float
+        """
+        return self.increment if self.per_move else self.remaining + self.increment
+
+    def start_move(self):
+        """
+        Credits the increment and starts counting the time of a move
+        :return: float seconds the player has for the move
+        """
+        self.remaining = self.next_move_time()
+        self.move_start = time.monotonic()
+        return self.remaining
+
+    def stop_move(self):
+        """
+        Stops counting and charges the time of the move
+        :return: float seconds used by the move
+        """
+        used = time.monotonic() - self.move_start
+        self.remaining = max(0.0, self.remaining - used)
+        return used
 
 
 class Server(object):
     """
     Othello server, implements a simple file-based playing protocol
-
+    and a line protocol for players that stay alive during the match (see common.engine)
     """
 
     # server file names
     START_SCRIPT = 'launch.sh'
+    ENGINE_SCRIPT = 'engine.sh'
     STATE_FILE = 'state.txt'
     MOVE_FILE = 'move.txt'
 
     # HISTORY_FILE = 'history.txt'
     # STDOUT_FILE = 'yourlog.txt'
 
-    def __init__(self, p1_dir, p2_dir, delay, stdout, history, output):
+    def __init__(self, p1_dir, p2_dir, delay, stdout, history, output, ponder=False, game_time=None, increment=0.0,
+                 verbose=True):
         self.basedir = os.path.abspath('.')
 
         self.player_dirs = [p1_dir, p2_dir]
@@ -40,8 +86,18 @@ class Server(object):
 
         self.delay = delay
         self.redir_stdout = stdout
+        self.ponder = ponder  # lets engine players think on the opponent's time
+        self.verbose = verbose  # prints the board and the regular messages of every move
+
+        # with no game time, each move gets 'delay' seconds
+        self.game_time = game_time
+        if game_time is None:
+            self.clocks = [Clock(0.0, delay, per_move=True), Clock(0.0, delay, per_move=True)]
+        else:
+            self.clocks = [Clock(game_time, increment), Clock(game_time, increment)]
 
         self.result = None
+        self.engines = [None, None]  # EngineProcess of the players that have an engine script
 
         # start and finish times of match
         self.start = None
@@ -50,39 +106,136 @@ class Server(object):
     def __del__(self):
         self.history_file.close()
 
+    def start_engines(self):
+        """
+        Starts the players that have an engine script, the others are launched once per move
+        :return:
+        """
+        for idx, player_dir in enumerate(self.player_dirs):
+            path = os.path.join(self.basedir, player_dir)
+            if not os.path.exists(os.path.join(path, self.ENGINE_SCRIPT)):
+                continue
+
+            stderr = open(self.redir_stdout, 'a') if self.redir_stdout is not None else None
+            engine = EngineProcess(['bash', self.ENGINE_SCRIPT], path, stderr)
+            if engine.wait_ready():
+                print('Player %d started as an engine.' % (idx + 1))
+                self.engines[idx] = engine
+            else:
+                print('Player %d engine did not start, will launch it once per move.' % (idx + 1))
+                engine.close()
+
+    def stop_engines(self):
+        """
+        Stops the players started as engines
+        :return:
+        """
+        for idx, engine in enumerate(self.engines):
+            if engine is not None:
+                engine.close()
+                self.engines[idx] = None
+
     def run(self):
         self.start = time.localtime()
+        self.start_engines()
+        try:
+            return self.play()
+        finally:
+            self.stop_engines()
+
+    def request_move_from_file(self, player, time_left):
+        """
+        Runs the player's launch script on the state file and reads the move file it writes.
+        The script gets the time on the player's clock and the increment after the color
+        :param player: index of the player
+        :param time_left: seconds the player has for the move
+        :return: str with the contents of the move file or None if there is no move file
+        """
+        player_dir = self.player_dirs[player]
+        os.chdir(os.path.join(self.basedir, player_dir))
+
+        # puts file in player dir
+        path_to_state = self.STATE_FILE
+        state_file = open(path_to_state, 'w')
+
+        state_file.write(str(self.board))
+        state_file.close()
+
+        # a move left from an earlier call must not be taken for this one
+        if os.path.exists(self.MOVE_FILE):
+            os.remove(self.MOVE_FILE)
+
+        # starts player process
+        stdout = open(self.redir_stdout, 'a') if self.redir_stdout is not None else sys.stdout
+        player_process = subprocess.Popen(
+            ['./launch.sh', self.STATE_FILE, self.color_names[player],
+             '%.3f' % time_left, '%.3f' % self.clocks[player].increment],
+            stdout=stdout,
+            preexec_fn=os.setsid
+        )
+
+        # waits until the player finishes or its time is over
+        self.log('Waiting for next move of Player %d...' % (player + 1))
+        try:
+            player_process.wait(time_left)
+        except subprocess.TimeoutExpired:
+            # kills the whole process group (launch.sh and whatever it started)
+            print('Player %d ran out of time, its process was killed.' % (player + 1))
+            os.killpg(os.getpgid(player_process.pid), signal.SIGKILL)
+            player_process.wait()
+
+        self.log('Will read player\'s move.')
+
+        move_path = self.MOVE_FILE
+        if not os.path.exists(move_path):
+            return None
+        return open(move_path).read()
+
+    def start_pondering(self, player):
+        """
+        Lets an engine player search, during its opponent's turn, the position
+        after the reply it predicted (if it predicted a legal one)
+        :param player: index of the player that has just moved
+        :return:
+        """
+        engine = self.engines[player]
+        if engine.ponder_move is None:
+            return
+
+        try:
+            x, y = (int(c) for c in engine.ponder_move.split(','))
+        except ValueError:
+            return
+
+        # the clock of the player, when its move starts, is known already
+        clock = self.clocks[player]
+        predicted = board.from_string(str(self.board))
+        if predicted.process_move((x, y), self.board.opponent(self.player_color[player])):
+            engine.start_pondering(str(predicted), self.color_names[player],
+                                   clock.next_move_time(), clock.increment)
+
+    def play(self):
         player = 0
 
         illegal_count = [0, 0]  # counts the number of illegal move attempts
 
         while True:  # runs until endgame
-
-            # checks whether players have available moves
-            no_moves_current = len(self.board.legal_moves(self.player_color[player])) == 0
-            no_moves_opponent = len(self.board.legal_moves(self.board.opponent(self.player_color[player]))) == 0
-
-            # calculates scores
-            p1_score = sum([1 for char in str(self.board) if char == self.board.BLACK])
-            p2_score = sum([1 for char in str(self.board) if char == self.board.WHITE])
+            color = self.player_color[player]
 
             # disqualify player if he attempts illegal moves 5 times in a row
             if illegal_count[player] >= 5:
                 print('Player %d DISQUALIFIED! Too many illegal move attempts.' % (player + 1))
                 print('End of game reached!')
-                print('Player 1 (black): %d' % p1_score)
-                print('Player 2 (white): %d' % p2_score)
+                self.print_scores()
 
                 self.result = 1 - player
                 self.finish = time.localtime()
                 return self.result
 
             # checks whether both players don't have available moves (end of game)
-            if no_moves_current and no_moves_opponent:
-
+            if self.board.is_endgame():
                 print('End of game reached! Scores:')
-                print('Player 1 (black): %d' % p1_score)
-                print('Player 2 (white): %d' % p2_score)
+                p1_score, p2_score = self.print_scores()
 
                 if p1_score > p2_score:
                     print('Player 1 wins!')
@@ -96,46 +249,30 @@ class Server(object):
                 return self.result
 
             # if current player has no moves, toggle player and continue
-            if no_moves_current:
-                print('Player %d has no legal moves and will not play this turn.' % (player + 1))
+            # (the legal moves stay cached in the board and check the player's move later)
+            if not self.board.legal_moves(color):
+                self.log('Player %d has no legal moves and will not play this turn.' % (player + 1))
                 illegal_count[player] = 0
                 player = 1 - player
                 continue
 
-            player_dir = self.player_dirs[player]
-            os.chdir(os.path.join(self.basedir, player_dir))
-
-            # puts file in player dir
-            path_to_state = self.STATE_FILE
-            state_file = open(path_to_state, 'w')
-
-            state_file.write(str(self.board))
-            state_file.close()
-
-            # starts player process
-            stdout = open(self.redir_stdout, 'a') if self.redir_stdout is not None else sys.stdout
-            player_process = subprocess.Popen(
-                ['./launch.sh', self.STATE_FILE, self.color_names[player]],
-                stdout=stdout,
-                preexec_fn=os.setsid
-            )
-
-            #  waits 'delay' seconds for the move to complete
-            print('Waiting for next move of Player %d...' % (player + 1))
-            a = player_process.wait(self.delay)
-            #time.sleep(self.delay)
-
-            # kills player process, collects and processes move
-            # os.killpg(os.getpgid(player_process.pid), signal.SIGKILL)
-            player_process.terminate()
+            clock = self.clocks[player]
+            time_left = clock.start_move()
+            if self.engines[player] is not None:
+                self.log('Waiting for next move of Player %d...' % (player + 1))
+                move_string = self.engines[player].request_move(
+                    str(self.board), self.color_names[player], time_left, clock.increment)
+            else:
+                move_string = self.request_move_from_file(player, time_left)
+            used = clock.stop_move()
 
-            print('Will read player\'s move.')
+            if self.game_time is not None:
+                self.log('Player %d used %.2fs, %.2fs left on its clock.' % (player + 1, used, clock.remaining))
 
-            move_path = self.MOVE_FILE
-            if os.path.exists(move_path):
+            if move_string is not None:
                 # reads move
                 try:
-                    x, y = (int(c) for c in open(move_path).read().strip().split(','))
+                    x, y = (int(c) for c in move_string.strip().split(','))
                 except ValueError:
                     print("Error while reading Player %d move." % (player + 1))
                     print("Possibly it has not performed a move or its format is not correct.")
@@ -145,12 +282,14 @@ class Server(object):
                     continue
 
                 # saves move in history
-                self.history_file.write('%d,%d,%s\n' % (x, y, self.player_color[player]))
-                self.history.append(((x, y), self.player_color[player]))
+                self.history_file.write('%d,%d,%s\n' % (x, y, color))
+                self.history.append(((x, y), color))
 
-                if self.board.process_move((x, y), self.player_color[player]):
+                if self.board.process_move((x, y), color):
                     illegal_count[player] = 0
-                    print('Player %d move %d,%d accepted.' % (player + 1, x, y))
+                    self.log('Player %d move %d,%d accepted.' % (player + 1, x, y))
+                    if self.ponder and self.engines[player] is not None:
+                        self.start_pondering(player)
 
                 else:
                     illegal_count[player] += 1
@@ -159,13 +298,34 @@ class Server(object):
             else:
                 print('Player %d has not made a move and lost its turn.' % (player + 1))
 
-            round_score = self.board.piece_count[self.player_color[0]] - self.board.piece_count[self.board.opponent(self.player_color[0])]
-            print('Current board: Player [BLACK] score = ' + str(round_score))
-            print(self.board.decorated_str())
+            if self.verbose:
+                round_score = self.board.piece_count[self.player_color[0]] - self.board.piece_count[self.player_color[1]]
+                print('Current board: Player [BLACK] score = ' + str(round_score))
+                print(self.board.decorated_str())
 
             # toggle player for next move
             player = 1 - player
 
+    def print_scores(self):
+        """
+        Prints the discs of each player
+        :return: (int, int) discs of player 1 and player 2
+        """
+        p1_score = self.board.piece_count[self.player_color[0]]
+        p2_score = self.board.piece_count[self.player_color[1]]
+        print('Player 1 (black): %d' % p1_score)
+        print('Player 2 (white): %d' % p2_score)
+        return p1_score, p2_score
+
+    def log(self, message):
+        """
+        Prints a message about the regular course of the game (omitted in quiet mode)
+        :param message:
+        :return:
+        """
+        if self.verbose:
+            print(message)
+
     def write_output(self):
         """
         Writes a xml file with detailed match data
@@ -217,6 +377,19 @@ if __name__ == '__main__':
                         default=5.0,
                         help='Time allocated for players to make a move.')
 
+    parser.add_argument('-t', '--time', type=float, metavar='game-time', dest='game_time',
+                        default=None,
+                        help='Time of each player for the whole game (replaces the delay of each move).')
+    parser.add_argument('-i', '--increment', type=float, metavar='increment',
+                        default=0.0,
+                        help='Time added to the clock of a player at each move (with --time).')
+
+    parser.add_argument('-p', '--ponder', action='store_true',
+                        help='Lets engine players think on the opponent\'s time.')
+
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Prints only the problems and the result, not the board after every move.')
+
     parser.add_argument('-r', '--redir-stdout', dest='redir_stdout', type=str,
                         default=None, metavar='stdout-file',
                         help='File to redirect players output')
@@ -232,6 +405,7 @@ if __name__ == '__main__':
     args = parser.parse_args()
     p1, p2 = args.players
 
-    s = Server(p1, p2, args.delay, args.redir_stdout, args.history, args.output)
+    s = Server(p1, p2, args.delay, args.redir_stdout, args.history, args.output, args.ponder,
+               args.game_time, args.increment, not args.quiet)
     s.run()
     s.write_output()
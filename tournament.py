@@ -0,0 +1,261 @@
+#!/usr/bin/python
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import itertools
+import multiprocessing
+import xml.etree.ElementTree as ET
+import xml.dom.minidom
+
+from server import Server
+
+
+class Tournament(object):
+    """
+    Runs many matches of server.Server at the same time, one per worker process.
+    Each match plays in its own scratch directory, with copies of both player
+    directories, so the state and move files of concurrent matches don't mix
+    """
+
+    ROUND_ROBIN = 'round-robin'
+    GAUNTLET = 'gauntlet'
+
+    # files of the player directories that are not copied to the scratch directories
+    IGNORED_FILES = ('__pycache__', '*.pyc', Server.STATE_FILE, Server.MOVE_FILE)
+
+    def __init__(self, player_dirs, games, workers, mode=ROUND_ROBIN, delay=5.0, ponder=False, keep_dir=None,
+                 game_time=None, increment=0.0):
+        """
+        :param player_dirs: list of player directories
+        :param games: number of games of each pairing (colors alternate between them)
+        :param workers: number of matches played at the same time
+        :param mode: ROUND_ROBIN (everyone plays everyone) or GAUNTLET (the first player plays the others)
+        :param delay: time allocated for each move
+        :param ponder: lets engine players think on the opponent's time
+        :param keep_dir: directory where the log, history and results of each game are kept (None discards them)
+        :param game_time: time of each player for the whole game (None gives 'delay' to each move)
+        :param increment: time added to the clock of a player at each move (with game_time)
+        """
+        self.player_dirs = player_dirs
+        self.games = games
+        self.workers = workers
+        self.mode = mode
+        self.delay = delay
+        self.ponder = ponder
+        self.keep_dir = keep_dir
+        self.game_time = game_time
+        self.increment = increment
+
+        self.results = []  # a dict per game, in the order of pairings()
+
+    def pairings(self):
+        """
+        Returns the games to be played
+        :return: list of (black player dir, white player dir)
+        """
+        if self.mode == self.GAUNTLET:
+            pairs = [(self.player_dirs[0], opponent) for opponent in self.player_dirs[1:]]
+        else:
+            pairs = list(itertools.combinations(self.player_dirs, 2))
+
+        games = []
+        for first, second in pairs:
+            for game in range(self.games):
+                games.append((first, second) if game % 2 == 0 else (second, first))
+        return games
+
+    def run(self):
+        """
+        Plays all the games
+        :return: list of dict with the result of each game
+        """
+        clock = (self.delay, self.game_time, self.increment)
+        tasks = [(idx, black, white, clock, self.ponder, self.keep_dir)
+                 for idx, (black, white) in enumerate(self.pairings())]
+
+        # a fresh process per game, as the server changes the working directory
+        pool = multiprocessing.Pool(self.workers, maxtasksperchild=1)
+        try:
+            for result in pool.imap_unordered(play_game, tasks):
+                print('Game %d: %s (black) %d x %d %s (white)%s' % (
+                    result['game'] + 1, result['black'], result['black_score'], result['white_score'],
+                    result['white'], ' ERROR: ' + result['error'] if result['error'] else ''))
+                self.results.append(result)
+        finally:
+            pool.close()
+            pool.join()
+
+        self.results.sort(key=lambda r: r['game'])
+        return self.results
+
+    def standings(self):
+        """
+        Aggregates the results by player, sorted by points (1 per win, 0.5 per draw)
+        then by disc difference
+        :return: list of dict
+        """
+        table = {}
+        for player_dir in self.player_dirs:
+            table[player_dir] = {'player': player_dir, 'games': 0, 'wins': 0, 'draws': 0, 'losses': 0,
+                                 'errors': 0, 'points': 0.0, 'discs': 0}
+
+        for result in self.results:
+            sides = [(result['black'], result['black_score'] - result['white_score'], 0),
+                     (result['white'], result['white_score'] - result['black_score'], 1)]
+            for player_dir, discs, idx in sides:
+                row = table[player_dir]
+                row['games'] += 1
+                if result['error']:
+                    row['errors'] += 1
+                    continue
+
+                row['discs'] += discs
+                if result['winner'] == idx:
+                    row['wins'] += 1
+                    row['points'] += 1
+                elif result['winner'] == 2:
+                    row['draws'] += 1
+                    row['points'] += 0.5
+                else:
+                    row['losses'] += 1
+
+        return sorted(table.values(), key=lambda row: (-row['points'], -row['discs']))
+
+    def print_report(self):
+        """
+        Prints the standings
+        :return:
+        """
+        print('%-4s %-30s %6s %5s %6s %7s %7s %7s' % (
+            'Rank', 'Player', 'Games', 'Wins', 'Draws', 'Losses', 'Points', 'Discs'))
+        for rank, row in enumerate(self.standings()):
+            print('%-4d %-30s %6d %5d %6d %7d %7.1f %+7d%s' % (
+                rank + 1, row['player'], row['games'], row['wins'], row['draws'], row['losses'],
+                row['points'], row['discs'], ' (%d errors)' % row['errors'] if row['errors'] else ''))
+
+    def write_output(self, output_file):
+        """
+        Writes a xml file with the standings and the result of each game
+        :param output_file:
+        :return:
+        """
+        root = ET.Element('othello-tournament')
+        root.set('mode', self.mode)
+        root.set('games-per-pairing', str(self.games))
+        root.set('delay', str(self.delay))
+
+        standings = ET.SubElement(root, 'standings')
+        for rank, row in enumerate(self.standings()):
+            elem = ET.SubElement(standings, 'player')
+            elem.set('rank', str(rank + 1))
+            elem.set('directory', row['player'])
+            for key in ('games', 'wins', 'draws', 'losses', 'errors', 'points', 'discs'):
+                elem.set(key, str(row[key]))
+
+        games = ET.SubElement(root, 'games')
+        for result in self.results:
+            elem = ET.SubElement(games, 'game')
+            elem.set('black', result['black'])
+            elem.set('white', result['white'])
+            elem.set('result', ['black', 'white', 'draw'][result['winner']] if not result['error'] else 'error')
+            elem.set('black-score', str(result['black_score']))
+            elem.set('white-score', str(result['white_score']))
+            elem.set('duration', '%.1f' % result['duration'])
+
+        ugly_xml = ET.tostring(root).decode('utf-8')
+        pretty_xml = xml.dom.minidom.parseString(ugly_xml).toprettyxml()
+        with open(output_file, 'w') as f:
+            f.write(pretty_xml)
+
+
+def play_game(task):
+    """
+    Plays a game in a scratch directory, with copies of both players (runs in a worker process)
+    :param task: (game index, black player dir, white player dir, (delay, game time, increment),
+                  ponder, dir to keep the game files or None)
+    :return: dict with the result of the game
+    """
+    idx, black, white, (delay, game_time, increment), ponder, keep_dir = task
+    result = {'game': idx, 'black': black, 'white': white, 'winner': None,
+              'black_score': 0, 'white_score': 0, 'duration': 0.0, 'error': None}
+
+    scratch = tempfile.mkdtemp(prefix='othello-game-%d-' % idx)
+    try:
+        # the same player may play both sides, so each side gets its own copy
+        ignored = shutil.ignore_patterns(*Tournament.IGNORED_FILES)
+        player_dirs = [os.path.join(scratch, 'black'), os.path.join(scratch, 'white')]
+        shutil.copytree(os.path.abspath(black), player_dirs[0], ignore=ignored)
+        shutil.copytree(os.path.abspath(white), player_dirs[1], ignore=ignored)
+
+        log_path = os.path.join(scratch, 'log.txt')
+        history_path = os.path.join(scratch, 'history.txt')
+        output_path = os.path.join(scratch, 'results.xml')
+
+        start = time.time()
+        with open(log_path, 'w') as log, contextlib.redirect_stdout(log):
+            # the board of every move is only worth printing to a log that is kept
+            server = Server(player_dirs[0], player_dirs[1], delay, log_path, history_path, output_path, ponder,
+                            game_time, increment, verbose=keep_dir is not None)
+            result['winner'] = server.run()
+            server.write_output()
+            server.history_file.close()
+        result['duration'] = time.time() - start
+        result['black_score'] = server.board.piece_count[server.board.BLACK]
+        result['white_score'] = server.board.piece_count[server.board.WHITE]
+
+    except Exception as e:
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+
+    finally:
+        if keep_dir is not None:
+            game_dir = os.path.join(keep_dir, 'game%03d' % (idx + 1))
+            shutil.rmtree(game_dir, ignore_errors=True)
+            os.makedirs(game_dir)
+            for name in ('log.txt', 'history.txt', 'results.xml'):
+                if os.path.exists(os.path.join(scratch, name)):
+                    shutil.copy(os.path.join(scratch, name), game_dir)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Othello tournament, plays many server matches at the same time.')
+    parser.add_argument('players', metavar='player', type=str, nargs='+',
+                        help='Path to player directory')
+    parser.add_argument('-g', '--games', type=int, default=2,
+                        help='Games of each pairing, colors alternate between them.')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help='Number of games played at the same time.')
+    parser.add_argument('-m', '--mode', choices=[Tournament.ROUND_ROBIN, Tournament.GAUNTLET],
+                        default=Tournament.ROUND_ROBIN,
+                        help='round-robin: everyone plays everyone; gauntlet: the first player plays the others.')
+    parser.add_argument('-d', '--delay', type=float, metavar='delay', default=5.0,
+                        help='Time allocated for players to make a move.')
+    parser.add_argument('-t', '--time', type=float, metavar='game-time', dest='game_time', default=None,
+                        help='Time of each player for the whole game (replaces the delay of each move).')
+    parser.add_argument('-i', '--increment', type=float, metavar='increment', default=0.0,
+                        help='Time added to the clock of a player at each move (with --time).')
+    parser.add_argument('-p', '--ponder', action='store_true',
+                        help='Lets engine players think on the opponent\'s time.')
+    parser.add_argument('-k', '--keep-games', type=str, dest='keep_dir', default=None, metavar='dir',
+                        help='Directory to keep the log, history and results of each game.')
+    parser.add_argument('-o', '--output-file', type=str, dest='output', default='tournament.xml',
+                        metavar='output-file', help='File to save the standings and the games.')
+
+    args = parser.parse_args()
+    if len(args.players) < 2:
+        parser.error('a tournament needs at least two players')
+
+    # the server changes the working directory of the worker, so the kept files need an absolute path
+    keep_dir = os.path.abspath(args.keep_dir) if args.keep_dir is not None else None
+
+    t = Tournament(args.players, args.games, args.workers, args.mode, args.delay, args.ponder, keep_dir,
+                   args.game_time, args.increment)
+    t.run()
+    t.print_report()
+    t.write_output(args.output)